@@ -3,6 +3,7 @@
 SSL="${SSL-no}"
 SSL_CRTFILE="${SSL_CRTFILE-/tmp/server-cert.pem}"
 SSL_KEYFILE="${SSL_KEYFILE-/tmp/server-cert.key}"
+WORKERS="${WORKERS-1}"
 
 if [[ -z "${PORT}" ]]; then
   if [[ "${SSL}" == "yes" ]]; then
@@ -12,13 +13,23 @@ if [[ -z "${PORT}" ]]; then
   fi
 fi
 
+SSL_ARGS=()
 if [[ "${SSL}" == "yes" ]]; then
 
   if [ ! -f "${SSL_CRTFILE}" ] && [ ! -f "${SSL_KEYFILE}" ]; then
     openssl req -x509 -sha256 -nodes -days 365 -newkey rsa:2048 -keyout "${SSL_KEYFILE}" -out "${SSL_CRTFILE}"  -subj "/C=GB/O=nhs/OU=local/CN=localhost"
   fi
 
-  exec uvicorn mesh_sandbox.api:app --host "0.0.0.0" --port "${PORT}" --workers 1 --ssl-certfile "${SSL_CRTFILE}" --ssl-keyfile "${SSL_KEYFILE}"
-else
-  exec uvicorn mesh_sandbox.api:app --host "0.0.0.0" --port "${PORT}" --workers 1
-fi
\ No newline at end of file
+  SSL_ARGS=(--ssl-certfile "${SSL_CRTFILE}" --ssl-keyfile "${SSL_KEYFILE}")
+fi
+
+if [[ "${WORKERS}" -gt 1 ]]; then
+  # multiple workers need a store shared between processes, e.g. STORE_MODE=sqlite
+  GUNICORN_SSL_ARGS=()
+  if [[ "${SSL}" == "yes" ]]; then
+    GUNICORN_SSL_ARGS=(--certfile "${SSL_CRTFILE}" --keyfile "${SSL_KEYFILE}")
+  fi
+  exec gunicorn mesh_sandbox.api:app --worker-class uvicorn.workers.UvicornWorker --bind "0.0.0.0:${PORT}" --workers "${WORKERS}" "${GUNICORN_SSL_ARGS[@]}"
+fi
+
+exec uvicorn mesh_sandbox.api:app --host "0.0.0.0" --port "${PORT}" --workers 1 "${SSL_ARGS[@]}"
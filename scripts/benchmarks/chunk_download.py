@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+measures server memory while a large message is downloaded by several clients at once
+
+    poetry run python scripts/benchmarks/chunk_download.py --mb 100 --downloads 8 --store-mode file
+
+with the file store each download is sent straight from the chunk file, so peak RSS should stay close to the
+baseline whatever the payload size, compare with --store-mode memory where every chunk is held in memory
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from time import perf_counter, sleep
+
+import httpx
+
+_SENDER = "X26ABC1"
+_RECIPIENT = "X26ABC2"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _start_server(store_mode: str, port: int, data_dir: str) -> subprocess.Popen:
+    env = dict(os.environ, STORE_MODE=store_mode, AUTH_MODE="none", MAILBOXES_DATA_DIR=data_dir)
+    cmd = [sys.executable, "-m", "uvicorn", "mesh_sandbox.api:app", "--port", str(port), "--log-level", "warning"]
+    # request logging goes to stderr, which would swamp the results
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+async def _download(client: httpx.AsyncClient, message_id: str) -> int:
+    received = 0
+    async with client.stream(
+        "GET", f"/messageexchange/{_RECIPIENT}/inbox/{message_id}", headers={"authorization": "x"}
+    ) as res:
+        assert res.status_code == 200, res.status_code
+        async for part in res.aiter_raw():
+            received += len(part)
+    return received
+
+
+async def _sample_rss(pid: int, stop: asyncio.Event) -> float:
+    peak = 0.0
+    while not stop.is_set():
+        peak = max(peak, _rss_mb(pid))
+        await asyncio.sleep(0.01)
+    return peak
+
+
+async def _run(base_url: str, pid: int, payload: bytes, downloads: int):
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        res = await client.post(
+            f"/messageexchange/{_SENDER}/outbox",
+            headers={"mex-from": _SENDER, "mex-to": _RECIPIENT, "mex-workflowid": "BENCH", "authorization": "x"},
+            content=payload,
+        )
+        assert res.status_code == 202, res.text
+        message_id = res.json()["messageID"]
+        del payload
+
+        await asyncio.sleep(0.5)
+        baseline = _rss_mb(pid)
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample_rss(pid, stop))
+        start = perf_counter()
+        received = await asyncio.gather(*[_download(client, message_id) for _ in range(downloads)])
+        elapsed = perf_counter() - start
+        stop.set()
+        peak = await sampler
+
+    total_mb = sum(received) / 1024 / 1024
+    print(
+        f"downloads={downloads:<3} received={total_mb:8.1f}MB in {elapsed:6.2f}s ({total_mb / elapsed:8.1f}MB/s) "
+        f"rss baseline={baseline:7.1f}MB peak={peak:7.1f}MB growth={peak - baseline:7.1f}MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mb", type=int, default=100, help="message size")
+    parser.add_argument("--downloads", type=int, default=8, help="concurrent downloads")
+    parser.add_argument("--store-mode", default="file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        port = _free_port()
+        server = _start_server(args.store_mode, port, data_dir)
+        try:
+            asyncio.run(_run(f"http://127.0.0.1:{port}", server.pid, os.urandom(args.mb * 1024 * 1024), args.downloads))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+measures inbox listing latency on a FileStore while large chunks are written concurrently
+
+    STORE_MODE=file poetry run python scripts/benchmarks/file_store_io.py --chunk-mb 100 --writers 4
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+from time import perf_counter
+from uuid import uuid4
+
+from mesh_sandbox.common import EnvConfig
+from mesh_sandbox.common.messaging import Messaging
+from mesh_sandbox.models.message import Message, MessageParty, MessageStatus
+from mesh_sandbox.store.file_store import FileStore
+
+_SENDER = "X26ABC1"
+_RECIPIENT = "X26ABC2"
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def _poll_inbox(messaging: Messaging, stop: asyncio.Event, interval: float) -> list[float]:
+    """
+    latency includes any delay in the poll being scheduled, which is where blocking filesystem calls show up
+    """
+    timings = []
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(interval)
+        await messaging.get_accepted_inbox_messages(_RECIPIENT)
+        timings.append(perf_counter() - start - interval)
+    return timings
+
+
+async def _write_chunks(store: FileStore, chunk: bytes, chunks: int):
+    message = Message(
+        message_id=uuid4().hex.upper(),
+        sender=MessageParty(mailbox_id=_SENDER),
+        recipient=MessageParty(mailbox_id=_RECIPIENT),
+        total_chunks=chunks,
+    )
+    for chunk_no in range(chunks):
+        await store.save_chunk(message, chunk_no + 1, chunk)
+
+
+async def _run(store: FileStore, chunk: bytes, writers: int, chunks: int, interval: float) -> list[float]:
+    messaging = Messaging(store)
+    stop = asyncio.Event()
+    poller = asyncio.create_task(_poll_inbox(messaging, stop, interval))
+    await asyncio.sleep(0.5)
+    if writers:
+        await asyncio.gather(*[_write_chunks(store, chunk, chunks) for _ in range(writers)])
+    else:
+        await asyncio.sleep(2)
+    stop.set()
+    return await poller
+
+
+def _report(label: str, timings: list[float]):
+    print(
+        f"{label:<12} samples={len(timings):<6} "
+        f"p50={_percentile(timings, 50) * 1000:8.2f}ms "
+        f"p99={_percentile(timings, 99) * 1000:8.2f}ms "
+        f"max={max(timings, default=0) * 1000:8.2f}ms "
+        f"mean={statistics.fmean(timings) * 1000 if timings else 0:8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-mb", type=int, default=100)
+    parser.add_argument("--chunks", type=int, default=2, help="chunks written per writer")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="FILE_STORE_THREADS")
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between inbox polls")
+    args = parser.parse_args()
+
+    chunk = os.urandom(args.chunk_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["MAILBOXES_DATA_DIR"] = data_dir
+        os.environ["FILE_STORE_THREADS"] = str(args.threads)
+        store = FileStore(EnvConfig(), logging.getLogger("mesh-sandbox"))
+        for _ in range(1000):
+            message = Message(
+                message_id=uuid4().hex.upper(),
+                sender=MessageParty(mailbox_id=_SENDER),
+                recipient=MessageParty(mailbox_id=_RECIPIENT),
+            )
+            assert message.status == MessageStatus.ACCEPTED
+            store.inboxes[_RECIPIENT].append(message)
+
+        _report("idle", asyncio.run(_run(store, chunk, 0, args.chunks, args.interval)))
+        _report("writing", asyncio.run(_run(store, chunk, args.writers, args.chunks, args.interval)))
+
+
+if __name__ == "__main__":
+    main()
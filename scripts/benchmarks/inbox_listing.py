@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+compares listing the first page of an inbox by filtering the whole inbox against the accepted inbox index
+
+    poetry run python scripts/benchmarks/inbox_listing.py --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta
+from time import perf_counter
+from uuid import uuid4
+
+from mesh_sandbox.common import EnvConfig
+from mesh_sandbox.models.message import Message, MessageEvent, MessageParty, MessageStatus
+from mesh_sandbox.store.base import Store
+from mesh_sandbox.store.memory_store import MemoryStore
+from mesh_sandbox.store.sqlite_store import SqliteStore
+
+_SENDER = "X26ABC1"
+_RECIPIENT = "X26ABC2"
+_PAGE_SIZE = 500
+
+
+async def _fill(store: Store, size: int):
+    start = datetime.utcnow() - timedelta(days=1)
+    for ix in range(size):
+        created = start + timedelta(milliseconds=ix)
+        # every tenth message has already been acknowledged
+        status = MessageStatus.ACKNOWLEDGED if ix % 10 == 0 else MessageStatus.ACCEPTED
+        message = Message(
+            message_id=uuid4().hex.upper(),
+            sender=MessageParty(mailbox_id=_SENDER),
+            recipient=MessageParty(mailbox_id=_RECIPIENT),
+            created_timestamp=created,
+            events=[MessageEvent(status=status, timestamp=created)],
+        )
+        await store.save_message(message)
+        await store.add_to_inbox(message)
+
+
+async def _time(func, repeat: int) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (perf_counter() - start) / repeat
+
+
+async def _run(store: Store, size: int, repeat: int) -> tuple[float, float]:
+    await _fill(store, size)
+
+    async def _scan():
+        messages = await store.get_inbox_messages(_RECIPIENT, lambda msg: msg.status == MessageStatus.ACCEPTED)
+        return messages[: _PAGE_SIZE + 1]
+
+    async def _indexed():
+        return await store.get_accepted_inbox_messages(_RECIPIENT, limit=_PAGE_SIZE + 1)
+
+    assert [msg.message_id for msg in await _scan()] == [msg.message_id for msg in await _indexed()]
+    return await _time(_scan, repeat), await _time(_indexed, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--stores", nargs="+", default=["memory", "sqlite"], choices=["memory", "sqlite"])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for store_mode in args.stores:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as data_dir:
+                os.environ["MAILBOXES_DATA_DIR"] = data_dir
+                store_type = MemoryStore if store_mode == "memory" else SqliteStore
+                store = store_type(EnvConfig(), logging.getLogger("mesh-sandbox"))
+                scan, indexed = asyncio.run(_run(store, size, args.repeat))
+            print(
+                f"{store_mode:<7} messages={size:<7} "
+                f"full scan={scan * 1000:9.2f}ms first page={indexed * 1000:9.2f}ms speedup={scan / indexed:7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+reports the memory held per message in a MemoryStore, for messages created by the api and loaded from json
+
+    poetry run python scripts/benchmarks/message_memory.py --count 100000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import tracemalloc
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from mesh_sandbox.common import EnvConfig
+from mesh_sandbox.models.message import (
+    Message,
+    MessageEvent,
+    MessageMetadata,
+    MessageParty,
+    MessageStatus,
+    MessageType,
+)
+from mesh_sandbox.store.memory_store import MemoryStore
+from mesh_sandbox.store.serialisation import deserialise_model, serialise_model
+
+_MAILBOXES = ["X26ABC1", "X26ABC2", "X26ABC3"]
+
+
+def _party(mailbox_id: str) -> MessageParty:
+    return MessageParty(mailbox_id=mailbox_id, mailbox_name=f"{mailbox_id} name", org_code="X26", ods_code="X26")
+
+
+def _message(ix: int) -> Message:
+    created = datetime(2023, 1, 1) + timedelta(seconds=ix)
+    return Message(
+        message_id=uuid4().hex.upper(),
+        sender=_party(_MAILBOXES[ix % len(_MAILBOXES)]),
+        recipient=_party(_MAILBOXES[(ix + 1) % len(_MAILBOXES)]),
+        events=[
+            MessageEvent(status=MessageStatus.ACKNOWLEDGED, timestamp=created + timedelta(minutes=5)),
+            MessageEvent(status=MessageStatus.ACCEPTED, timestamp=created),
+        ],
+        metadata=MessageMetadata(file_name=f"{ix}.dat", local_id=f"local{ix}", content_type="application/octet-stream"),
+        workflow_id=f"WORKFLOW_{ix % 10}",
+        message_type=MessageType.DATA,
+        file_size=1024,
+        created_timestamp=created,
+    )
+
+
+async def _fill(store: MemoryStore, messages: list[Message]):
+    for message in messages:
+        await store.save_message(message)
+        await store.add_to_outbox(message)
+        await store.add_to_inbox(message)
+
+
+def _measure(label: str, count: int, create) -> float:
+    store = MemoryStore(EnvConfig(), logging.getLogger("bench"))
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = create(count)
+    asyncio.run(_fill(store, messages))
+    del messages
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    per_message = used / count
+    print(f"{label:<10} messages={count:<8} total={used / 1024 / 1024:8.1f}MB per message={per_message:8.0f} bytes")
+    return per_message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    _measure("created", args.count, lambda count: [_message(ix) for ix in range(count)])
+
+    # as the file store loads messages, from json rather than sharing the strings of the literals above
+    serialised = [json.dumps(serialise_model(_message(ix))) for ix in range(args.count)]
+    _measure(
+        "from json",
+        args.count,
+        lambda count: [deserialise_model(json.loads(data), Message) for data in serialised[:count]],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+drives send / list inbox load against gunicorn with 1, 2 and 4 uvicorn workers sharing a sqlite store
+
+    poetry run python scripts/benchmarks/multi_worker_load.py --workers 1 2 4 --clients 32 --seconds 10
+
+throughput should scale with workers up to the number of cores available
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter, sleep
+from uuid import uuid4
+
+import httpx
+
+_SENDER = "X26ABC1"
+_RECIPIENT = "X26ABC2"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _start_server(workers: int, port: int, data_dir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        STORE_MODE="sqlite",
+        AUTH_MODE="none",
+        MAILBOXES_DATA_DIR=data_dir,
+        WORKERS=str(workers),
+    )
+    cmd = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "mesh_sandbox.api:app",
+        "--worker-class",
+        "uvicorn.workers.UvicornWorker",
+        "--workers",
+        str(workers),
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--log-level",
+        "warning",
+    ]
+    # request logging goes to stderr, which would swamp the results
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+async def _client(client: httpx.AsyncClient, deadline: float, timings: list[float]):
+    while perf_counter() < deadline:
+        start = perf_counter()
+        res = await client.post(
+            f"/messageexchange/{_SENDER}/outbox",
+            headers={"mex-from": _SENDER, "mex-to": _RECIPIENT, "mex-workflowid": "BENCH", "authorization": "x"},
+            content=uuid4().bytes,
+        )
+        assert res.status_code == 202, res.text
+        res = await client.get(f"/messageexchange/{_RECIPIENT}/inbox", headers={"authorization": "x"})
+        assert res.status_code == 200, res.text
+        timings.append(perf_counter() - start)
+
+
+async def _drive(base_url: str, clients: int, seconds: float) -> list[float]:
+    timings: list[float] = []
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = perf_counter() + seconds
+        await asyncio.gather(*[_client(client, deadline, timings) for _ in range(clients)])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as data_dir:
+            port = _free_port()
+            server = _start_server(workers, port, data_dir)
+            try:
+                timings = asyncio.run(_drive(f"http://127.0.0.1:{port}", args.clients, args.seconds))
+            finally:
+                server.terminate()
+                server.wait()
+
+        print(
+            f"workers={workers:<3} send+list/s={len(timings) / args.seconds:8.1f} "
+            f"p50={_percentile(timings, 50) * 1000:8.2f}ms "
+            f"p99={_percentile(timings, 99) * 1000:8.2f}ms "
+            f"mean={statistics.fmean(timings) * 1000 if timings else 0:8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
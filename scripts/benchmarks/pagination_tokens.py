@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+compares the cost of encoding / decoding continue_from tokens as signed tokens with the fernet tokens used previously
+
+    poetry run python scripts/benchmarks/pagination_tokens.py --count 50000
+"""
+import argparse
+import base64
+import json
+from time import perf_counter
+from typing import Any, Callable
+
+from cryptography.fernet import Fernet
+from mesh_sandbox.common.pagination import PaginationTokens
+
+_POSITION = {"message_id": "20230101120000000000_ABCDEF", "last_index": 12345}
+
+
+class _FernetTokens:
+    """the previous continue_from implementation"""
+
+    def __init__(self, secret: str):
+        self._encoder = Fernet(base64.urlsafe_b64encode(PaginationTokens.derive_key(secret)))
+
+    def encode_dict(self, data: dict) -> str:
+        return self._encoder.encrypt(json.dumps(data).encode("utf-8")).decode()
+
+    def decode_dict(self, token: str) -> dict:
+        return json.loads(self._encoder.decrypt(token.encode("utf-8")).decode())
+
+
+def _rate(func: Callable[[Any], Any], arg: Any, count: int) -> float:
+    start = perf_counter()
+    for _ in range(count):
+        func(arg)
+    return count / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=50000, help="tokens encoded / decoded per run")
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs is reported")
+    args = parser.parse_args()
+
+    implementations = {
+        "fernet": _FernetTokens("TestKey"),
+        "signed": PaginationTokens([PaginationTokens.derive_key("TestKey")]),
+        # the worst case during a key rotation, tokens signed with the previous key are checked against both keys
+        "signed rotated": PaginationTokens(
+            [PaginationTokens.derive_key("NewKey"), PaginationTokens.derive_key("TestKey")]
+        ),
+    }
+    signed_token = implementations["signed"].encode_dict(_POSITION)
+
+    for name, tokens in implementations.items():
+        token = tokens.encode_dict(_POSITION) if name == "fernet" else signed_token
+        assert tokens.decode_dict(token) == _POSITION
+        encode = max(_rate(tokens.encode_dict, _POSITION, args.count) for _ in range(args.repeat))
+        decode = max(_rate(tokens.decode_dict, token, args.count) for _ in range(args.repeat))
+        print(f"{name:<16} encode={encode:>12,.0f}/s decode={decode:>12,.0f}/s token length={len(token)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+micro-benchmarks serialise_model / deserialise_model throughput for each of the persisted model types
+
+    poetry run python scripts/benchmarks/serialisation.py --count 20000
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+from functools import partial
+from time import perf_counter
+from typing import Any, Callable
+from uuid import uuid4
+
+from mesh_sandbox.models.mailbox import Mailbox
+from mesh_sandbox.models.message import Message, MessageEvent, MessageMetadata, MessageParty, MessageStatus
+from mesh_sandbox.models.workflow import Workflow
+from mesh_sandbox.store.serialisation import deserialise_model, serialise_model
+
+
+def _party(mailbox_id: str) -> MessageParty:
+    return MessageParty(mailbox_id=mailbox_id, mailbox_name=f"{mailbox_id} name", org_code="X26", ods_code="X26")
+
+
+def _message(ix: int) -> Message:
+    created = datetime(2023, 1, 1) + timedelta(seconds=ix)
+    return Message(
+        message_id=uuid4().hex.upper(),
+        sender=_party("X26ABC1"),
+        recipient=_party("X26ABC2"),
+        events=[
+            MessageEvent(status=MessageStatus.ACKNOWLEDGED, timestamp=created + timedelta(minutes=5)),
+            MessageEvent(status=MessageStatus.ACCEPTED, timestamp=created),
+        ],
+        metadata=MessageMetadata(subject="subject", file_name="file.dat", local_id=f"local{ix}", checksum="md5:1"),
+        workflow_id="TEST_WORKFLOW",
+        message_type="DATA",
+        file_size=1024,
+        chunk_sizes={1: 1024},
+        created_timestamp=created,
+    )
+
+
+_SAMPLES: dict[str, Callable[[int], Any]] = {
+    "Message": _message,
+    "MessageEvent": lambda ix: MessageEvent(status=MessageStatus.ACCEPTED, code=str(ix), timestamp=datetime.utcnow()),
+    "MessageParty": lambda ix: _party(f"X26ABC{ix}"),
+    "MessageMetadata": lambda ix: MessageMetadata(subject=f"subject {ix}", local_id=f"local{ix}", encrypted=True),
+    "Mailbox": lambda ix: Mailbox(mailbox_id=f"X26ABC{ix}", mailbox_name="name", ods_code="X26", password="password"),
+    "Workflow": lambda ix: Workflow(workflow_id=f"WORKFLOW{ix}", senders=["X26ABC1"], receivers=["X26ABC2"]),
+}
+
+
+def _rate(func: Callable[[Any], Any], items: list[Any]) -> float:
+    start = perf_counter()
+    for item in items:
+        func(item)
+    return len(items) / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=20000, help="objects encoded / decoded per type")
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs is reported")
+    args = parser.parse_args()
+
+    for name, create in _SAMPLES.items():
+        models = [create(ix) for ix in range(args.count)]
+        model_type = type(models[0])
+        # decode what was read back from json, as the stores do
+        serialised = [json.loads(json.dumps(serialise_model(model))) for model in models]
+
+        encode = max(_rate(serialise_model, models) for _ in range(args.repeat))
+        decode = max(_rate(partial(deserialise_model, model_type=model_type), serialised) for _ in range(args.repeat))
+        print(f"{name:<16} encode={encode:>12,.0f}/s decode={decode:>12,.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
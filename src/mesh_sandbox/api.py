@@ -1,11 +1,13 @@
+import asyncio
 from typing import cast
 
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.exceptions import RequestValidationError
 
-from .common import logger
+from .common import MULTI_WORKER_STORE_MODES, logger
 from .common.exceptions import MessagingException
-from .dependencies import get_env_config
+from .common.pagination import InvalidPaginationToken
+from .dependencies import get_env_config, get_logger, get_messaging, get_store
 from .routers import (
     admin,
     handshake,
@@ -16,6 +18,8 @@ from .routers import (
     tracking,
     update,
 )
+from .store.expiry import run_expiry_sweeper
+from .store.metered_store import run_store_stats_logger
 from .views.error import get_error_response, get_validation_error_response
 
 app = FastAPI(
@@ -40,7 +44,43 @@ app = FastAPI(
 async def startup():
     config = get_env_config()
     # pylint: disable=logging-fstring-interpolation
-    logger.info(f"startup auth_mode: {config.auth_mode} store_mode: {config.store_mode}")
+    logger.info(f"startup auth_mode: {config.auth_mode} store_mode: {config.store_mode} workers: {config.workers}")
+    if config.workers > 1 and config.store_mode not in MULTI_WORKER_STORE_MODES:
+        raise ValueError(
+            f"store_mode {config.store_mode} keeps state in process and cannot be used with {config.workers} workers, "
+            f"use one of: {', '.join(MULTI_WORKER_STORE_MODES)}"
+        )
+    if config.auth_reject_replays and config.workers > 1:
+        raise ValueError(
+            f"auth_reject_replays keeps the nonces seen in process and cannot be used with {config.workers} workers"
+        )
+    if config.auth_reject_replays and config.auth_nonce_index_size < 1:
+        raise ValueError("auth_reject_replays needs an auth_nonce_index_size of at least 1")
+
+    app.state.expiry_sweeper = None
+    store = get_store()
+    if config.expiry_sweep_seconds > 0 and not store.readonly:
+        app.state.expiry_sweeper = asyncio.create_task(
+            run_expiry_sweeper(store, config.expiry_sweep_seconds, get_logger())
+        )
+
+    app.state.store_stats_logger = None
+    store_stats = get_messaging().store_stats
+    if store_stats and config.store_stats_log_seconds > 0:
+        app.state.store_stats_logger = asyncio.create_task(
+            run_store_stats_logger(store_stats, config.store_stats_log_seconds, get_logger())
+        )
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task_name in ("expiry_sweeper", "store_stats_logger"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
+
+    await get_messaging().plugins.close()
+    await get_store().close()
 
 
 @app.exception_handler(Exception)
@@ -66,6 +106,11 @@ async def http_exception_handler(request: Request, exception: HTTPException):
     return get_error_response(request, exception.status_code, exception.detail, headers=cast(dict, exception.headers))
 
 
+@app.exception_handler(InvalidPaginationToken)
+async def invalid_pagination_token_handler(request: Request, exception: InvalidPaginationToken):
+    return get_error_response(request, exception.status_code, str(exception))
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     return get_validation_error_response(request, exc)
@@ -0,0 +1,381 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import statistics
+import tempfile
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import perf_counter
+from typing import Optional
+from uuid import uuid4
+
+import httpx
+
+from .common import MESH_AUTH_SCHEME, EnvConfig, generate_cipher_text
+from .common.constants import Headers
+from .dependencies import get_logger
+
+_ACCEPT_V2 = "application/vnd.mesh.v2+json"
+
+# every chunk but the last of a chunked message is a partial content response
+_DOWNLOADED = (200, 206)
+
+# operations in the order they are reported
+OPERATIONS = ("send", "send_chunk", "list_inbox", "download", "download_chunk", "acknowledge", "end_to_end")
+
+
+def generate_auth_token(
+    mailbox_id: str,
+    mailbox_password: str = "password",
+    secret_key: str = "TestKey",
+    timestamp: Optional[datetime] = None,
+    nonce: Optional[str] = None,
+    nonce_count: str = "1",
+) -> str:
+    """a client authorization header, the defaults match the canned mailboxes and the sandbox's default SHARED_KEY"""
+    nonce = nonce or uuid4().hex
+    timestamp_string = (timestamp or datetime.now()).strftime("%Y%m%d%H%M")
+    public_auth_data = f"{mailbox_id}:{nonce}:{nonce_count}:{timestamp_string}"
+    cipher_text = generate_cipher_text(secret_key, mailbox_id, mailbox_password, timestamp_string, nonce, nonce_count)
+    return f"{MESH_AUTH_SCHEME} {public_auth_data}:{cipher_text}"
+
+
+@dataclass
+class BenchOptions:
+    senders: int = 2
+    receivers: int = 2
+    sender_mailboxes: list[str] = field(default_factory=lambda: ["X26ABC1"])
+    receiver_mailboxes: list[str] = field(default_factory=lambda: ["X26ABC2"])
+    workflow_id: str = "TEST_WORKFLOW"
+    message_bytes: int = 10 * 1024
+    chunks: int = 1
+    gzip: bool = False
+    poll_seconds: float = 0.1
+    seconds: float = 10
+    messages: int = 0
+    drain_seconds: float = 30
+    password: str = "password"
+    shared_key: str = ""
+
+
+class OperationTimings:
+    def __init__(self):
+        self.samples: list[float] = []
+        self.errors = 0
+
+    def percentile(self, percent: float) -> float:
+        """nearest rank percentile"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))]
+
+
+@dataclass
+class BenchResults:
+    seconds: float = 0.0
+    sent: int = 0
+    acknowledged: int = 0
+    payload_bytes: int = 0
+    operations: dict[str, OperationTimings] = field(
+        default_factory=lambda: {op: OperationTimings() for op in OPERATIONS}
+    )
+
+    def summary(self) -> dict:
+        seconds = self.seconds or 1
+        return {
+            "seconds": round(self.seconds, 3),
+            "sent": self.sent,
+            "acknowledged": self.acknowledged,
+            "messages_per_second": round(self.acknowledged / seconds, 1),
+            "payload_mb_per_second": round(self.payload_bytes / seconds / 1024 / 1024, 3),
+            "operations": {
+                name: {
+                    "count": len(timings.samples),
+                    "errors": timings.errors,
+                    "per_second": round(len(timings.samples) / seconds, 1),
+                    "mean_ms": round(1000 * statistics.fmean(timings.samples), 3) if timings.samples else 0.0,
+                    "p50_ms": round(1000 * timings.percentile(50), 3),
+                    "p95_ms": round(1000 * timings.percentile(95), 3),
+                    "p99_ms": round(1000 * timings.percentile(99), 3),
+                    "max_ms": round(1000 * max(timings.samples, default=0.0), 3),
+                }
+                for name, timings in self.operations.items()
+                if timings.samples or timings.errors
+            },
+        }
+
+    def report(self) -> str:
+        summary = self.summary()
+        lines = [
+            f"{summary['acknowledged']} of {summary['sent']} messages delivered in {summary['seconds']}s, "
+            f"{summary['messages_per_second']} messages/s, {summary['payload_mb_per_second']} MB/s",
+            f"{'operation':<16}{'count':>8}{'errors':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'max ms':>10}",
+        ]
+        for name, op in summary["operations"].items():
+            lines.append(
+                f"{name:<16}{op['count']:>8}{op['errors']:>8}{op['per_second']:>10}{op['p50_ms']:>10}"
+                f"{op['p95_ms']:>10}{op['p99_ms']:>10}{op['max_ms']:>10}"
+            )
+        return "\n".join(lines)
+
+
+class Bench:
+    """
+    drives send / poll / download / acknowledge load against a sandbox. each sender sends messages to the receiver
+    mailboxes in turn, receivers polling the same mailbox split its messages between them, and only messages sent by
+    this run are downloaded, so a remote sandbox can already hold other messages
+    """
+
+    def __init__(self, client: httpx.AsyncClient, options: BenchOptions):
+        self.client = client
+        self.options = options
+        self.results = BenchResults()
+        self._sent_at: dict[str, float] = {}
+        self._senders_done = asyncio.Event()
+        self._shared_key = options.shared_key or EnvConfig().shared_key
+
+    def _headers(self, mailbox_id: str, **headers: str) -> dict[str, str]:
+        return {
+            Headers.Authorization: generate_auth_token(mailbox_id, self.options.password, self._shared_key),
+            Headers.Accept: _ACCEPT_V2,
+            **headers,
+        }
+
+    async def _timed(
+        self, operation: str, method: str, url: str, expect: tuple[int, ...], **kwargs
+    ) -> Optional[httpx.Response]:
+        start = perf_counter()
+        try:
+            res = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.results.operations[operation].errors += 1
+            return None
+        if res.status_code not in expect:
+            self.results.operations[operation].errors += 1
+            return None
+        self.results.operations[operation].samples.append(perf_counter() - start)
+        return res
+
+    def _chunks(self) -> list[bytes]:
+        # hex is compressible, roughly in half, so gzip has something to do
+        chunk_bytes = max(1, self.options.message_bytes // self.options.chunks)
+        chunks = [os.urandom((chunk_bytes + 1) // 2).hex()[:chunk_bytes].encode() for _ in range(self.options.chunks)]
+        if self.options.gzip:
+            return [gzip.compress(chunk, compresslevel=1) for chunk in chunks]
+        return chunks
+
+    async def _send(self, sender: str, recipient: str):
+        chunks = self._chunks()
+        total = len(chunks)
+        extra: dict[str, str] = {Headers.Mex_Chunk_Range: f"1:{total}"}
+        if self.options.gzip:
+            extra[Headers.Content_Encoding] = "gzip"
+            extra[Headers.Mex_Content_Compressed] = "Y"
+
+        start = perf_counter()
+        res = await self._timed(
+            "send",
+            "POST",
+            f"/messageexchange/{sender}/outbox",
+            (202,),
+            headers=self._headers(
+                sender,
+                **{
+                    Headers.Mex_From: sender,
+                    Headers.Mex_To: recipient,
+                    Headers.Mex_WorkflowID: self.options.workflow_id,
+                },
+                **extra,
+            ),
+            content=chunks[0],
+        )
+        if res is None:
+            return
+        message_id = res.json()["message_id"]
+
+        for chunk_number in range(2, total + 1):
+            extra[Headers.Mex_Chunk_Range] = f"{chunk_number}:{total}"
+            res = await self._timed(
+                "send_chunk",
+                "POST",
+                f"/messageexchange/{sender}/outbox/{message_id}/{chunk_number}",
+                (202,),
+                headers=self._headers(sender, **extra),
+                content=chunks[chunk_number - 1],
+            )
+            if res is None:
+                return
+
+        self._sent_at[message_id] = start
+        self.results.sent += 1
+
+    async def _sender(self, index: int, deadline: float):
+        sender = self.options.sender_mailboxes[index % len(self.options.sender_mailboxes)]
+        recipients = self.options.receiver_mailboxes
+        sent = 0
+        while perf_counter() < deadline and (not self.options.messages or sent < self.options.messages):
+            await self._send(sender, recipients[(index + sent) % len(recipients)])
+            sent += 1
+
+    async def _receive(self, mailbox_id: str, message_id: str):
+        accept_encoding = {Headers.Accept_Encoding: "gzip"} if self.options.gzip else {}
+        res = await self._timed(
+            "download",
+            "GET",
+            f"/messageexchange/{mailbox_id}/inbox/{message_id}",
+            _DOWNLOADED,
+            headers=self._headers(mailbox_id, **accept_encoding),
+        )
+        if res is None:
+            return
+        received = len(res.content)
+        total = int(res.headers.get(Headers.Mex_Total_Chunks) or 1)
+        for chunk_number in range(2, total + 1):
+            res = await self._timed(
+                "download_chunk",
+                "GET",
+                f"/messageexchange/{mailbox_id}/inbox/{message_id}/{chunk_number}",
+                _DOWNLOADED,
+                headers=self._headers(mailbox_id, **accept_encoding),
+            )
+            if res is None:
+                return
+            received += len(res.content)
+
+        res = await self._timed(
+            "acknowledge",
+            "PUT",
+            f"/messageexchange/{mailbox_id}/inbox/{message_id}/status/acknowledged",
+            (200,),
+            headers=self._headers(mailbox_id),
+        )
+        if res is None:
+            return
+        self.results.operations["end_to_end"].samples.append(perf_counter() - self._sent_at.pop(message_id))
+        self.results.acknowledged += 1
+        self.results.payload_bytes += received
+
+    def _pending(self) -> bool:
+        return not self._senders_done.is_set() or bool(self._sent_at)
+
+    async def _receiver(self, index: int, drain_deadline: list[float]):
+        mailboxes = self.options.receiver_mailboxes
+        mailbox_id = mailboxes[index % len(mailboxes)]
+        # receivers polling the same mailbox each take the messages hashing to their slot
+        sharing = [i for i in range(self.options.receivers) if mailboxes[i % len(mailboxes)] == mailbox_id]
+        slot = sharing.index(index)
+
+        while self._pending() and perf_counter() < drain_deadline[0]:
+            res = await self._timed(
+                "list_inbox", "GET", f"/messageexchange/{mailbox_id}/inbox", (200,), headers=self._headers(mailbox_id)
+            )
+            mine = [
+                message_id
+                for message_id in (res.json()["messages"] if res is not None else [])
+                if message_id in self._sent_at and zlib.crc32(message_id.encode()) % len(sharing) == slot
+            ]
+            for message_id in mine:
+                await self._receive(mailbox_id, message_id)
+            if not mine:
+                await asyncio.sleep(self.options.poll_seconds)
+
+    async def run(self) -> BenchResults:
+        start = perf_counter()
+        # receivers stop once everything sent is acknowledged, or drain_seconds after the senders finish
+        drain_deadline = [float("inf")]
+        receivers = [
+            asyncio.create_task(self._receiver(index, drain_deadline)) for index in range(self.options.receivers)
+        ]
+        await asyncio.gather(
+            *(self._sender(index, start + self.options.seconds) for index in range(self.options.senders))
+        )
+        self._senders_done.set()
+        drain_deadline[0] = perf_counter() + self.options.drain_seconds
+        await asyncio.gather(*receivers)
+        self.results.seconds = perf_counter() - start
+        return self.results
+
+
+async def _run_in_process(options: BenchOptions, store_mode: str) -> BenchResults:
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ.update(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=data_dir)
+        from .api import app  # pylint: disable=import-outside-toplevel
+
+        # request and message logging to stderr would swamp the results
+        get_logger().setLevel(logging.WARNING)
+
+        await app.router.startup()
+        try:
+            transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+            async with httpx.AsyncClient(transport=transport, base_url="http://mesh-sandbox", timeout=60) as client:
+                return await Bench(client, options).run()
+        finally:
+            await app.router.shutdown()
+
+
+async def _run_remote(options: BenchOptions, url: str, verify: bool) -> BenchResults:
+    limits = httpx.Limits(max_connections=options.senders + options.receivers)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60, verify=verify) as client:
+        return await Bench(client, options).run()
+
+
+def main():
+    """
+    load tests a sandbox with simulated sending and receiving mailboxes, e.g.
+    python -m mesh_sandbox.bench --senders 8 --receivers 4 --message-bytes 1048576 --chunks 2 --gzip
+    python -m mesh_sandbox.bench --url http://localhost:8700 --seconds 60
+    """
+    defaults = BenchOptions()
+    parser = argparse.ArgumentParser(description="mesh sandbox load generator")
+    parser.add_argument("--url", default="", help="sandbox to load, by default the sandbox is run in process")
+    parser.add_argument("--store-mode", default="memory", help="store mode when run in process")
+    parser.add_argument("--no-verify", action="store_true", help="skip tls certificate verification")
+    parser.add_argument("--senders", type=int, default=defaults.senders, help="concurrent senders")
+    parser.add_argument("--receivers", type=int, default=defaults.receivers, help="concurrent receivers")
+    parser.add_argument("--sender-mailboxes", nargs="+", default=defaults.sender_mailboxes)
+    parser.add_argument("--receiver-mailboxes", nargs="+", default=defaults.receiver_mailboxes)
+    parser.add_argument("--workflow-id", default=defaults.workflow_id)
+    parser.add_argument("--message-bytes", type=int, default=defaults.message_bytes, help="uncompressed message size")
+    parser.add_argument("--chunks", type=int, default=defaults.chunks, help="chunks per message")
+    parser.add_argument("--gzip", action="store_true", help="send gzip compressed chunks, and accept gzip")
+    parser.add_argument("--poll-seconds", type=float, default=defaults.poll_seconds, help="wait after an empty poll")
+    parser.add_argument("--seconds", type=float, default=defaults.seconds, help="how long to send for")
+    parser.add_argument("--messages", type=int, default=defaults.messages, help="stop after this many per sender")
+    parser.add_argument("--drain-seconds", type=float, default=defaults.drain_seconds)
+    parser.add_argument("--password", default=defaults.password, help="mailbox password")
+    parser.add_argument("--shared-key", default="", help="defaults to SHARED_KEY")
+    parser.add_argument("--json", action="store_true", help="print the results as json")
+    args = parser.parse_args()
+
+    options = BenchOptions(
+        senders=args.senders,
+        receivers=args.receivers,
+        sender_mailboxes=args.sender_mailboxes,
+        receiver_mailboxes=args.receiver_mailboxes,
+        workflow_id=args.workflow_id,
+        message_bytes=args.message_bytes,
+        chunks=max(1, args.chunks),
+        gzip=args.gzip,
+        poll_seconds=args.poll_seconds,
+        seconds=args.seconds,
+        messages=args.messages,
+        drain_seconds=args.drain_seconds,
+        password=args.password,
+        shared_key=args.shared_key,
+    )
+    if args.url:
+        results = asyncio.run(_run_remote(options, args.url, not args.no_verify))
+    else:
+        results = asyncio.run(_run_in_process(options, args.store_mode))
+
+    print(json.dumps(results.summary(), indent=2) if args.json else results.report())
+
+
+if __name__ == "__main__":
+    main()
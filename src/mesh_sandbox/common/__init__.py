@@ -9,6 +9,8 @@ from typing import Any, Callable, Final, Optional, TypeVar
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel  # pylint: disable=no-name-in-module
 
+from .structured_logging import JsonFormatter, start_queue_logging
+
 APP_JSON = "application/json"
 APP_V1_JSON = "application/vnd.mesh.v1+json"
 APP_V2_JSON = "application/vnd.mesh.v2+json"
@@ -52,9 +54,32 @@ class EnvConfig:
     auth_mode: str = field(default="no_auth")
     store_mode: str = field(default="canned")
     shared_key: str = field(default="Banana")
+    pagination_key: str = field(default="")
+    pagination_previous_key: str = field(default="")
     mailboxes_dir: str = field(default="/tmp/mesh_store")
     message_expiry_days: int = field(default=30)
     inbox_expiry_days: int = field(default=5)
+    expiry_sweep_seconds: float = field(default=60)
+    workers: int = field(default=1)
+    file_store_threads: int = field(default=4)
+    file_store_fsync: str = field(default="batched")
+    sqlite_path: str = field(default="")
+    sqlite_store_threads: int = field(default=4)
+    sqlite_inline_chunk_bytes: int = field(default=1024 * 1024)
+    gzip_cache_bytes: int = field(default=0)
+    log_sample_rate: float = field(default=1.0)
+    log_route_sample_rates: str = field(default="")
+    log_request_begin: bool = field(default=True)
+    plugin_workers: int = field(default=2)
+    plugin_queue_size: int = field(default=1000)
+    plugin_queue_policy: str = field(default="drop_newest")
+    plugin_timeout_seconds: float = field(default=30)
+    auth_cache_size: int = field(default=10000)
+    auth_cache_seconds: float = field(default=300)
+    auth_reject_replays: bool = field(default=False)
+    auth_nonce_index_size: int = field(default=100000)
+    store_instrumentation: bool = field(default=False)
+    store_stats_log_seconds: float = field(default=300)
 
     def __post_init__(self):
         self.env = os.environ.get("ENV", self.env)
@@ -62,10 +87,42 @@ class EnvConfig:
         self.auth_mode = os.environ.get("AUTH_MODE", self.auth_mode)
         self.store_mode = os.environ.get("STORE_MODE", self.store_mode)
         self.shared_key = os.environ.get("SHARED_KEY", self.shared_key)
+        self.pagination_key = os.environ.get("PAGINATION_KEY", self.pagination_key)
+        self.pagination_previous_key = os.environ.get("PAGINATION_PREVIOUS_KEY", self.pagination_previous_key)
         self.mailboxes_dir = os.environ.get("MAILBOXES_DATA_DIR", os.environ.get("FILE_STORE_DIR", self.mailboxes_dir))
         self.message_expiry_days = int(os.environ.get("MESSAGE_EXPIRY_DAYS", self.message_expiry_days))
         self.inbox_expiry_days = int(os.environ.get("INBOX_EXPIRY_DAYS", self.inbox_expiry_days))
-
+        self.expiry_sweep_seconds = float(os.environ.get("EXPIRY_SWEEP_SECONDS", self.expiry_sweep_seconds))
+        self.workers = int(os.environ.get("WORKERS", self.workers))
+        self.file_store_threads = int(os.environ.get("FILE_STORE_THREADS", self.file_store_threads))
+        self.file_store_fsync = os.environ.get("FILE_STORE_FSYNC", self.file_store_fsync)
+        self.sqlite_path = os.environ.get("SQLITE_PATH", self.sqlite_path) or os.path.join(
+            self.mailboxes_dir, "mesh_sandbox.sqlite"
+        )
+        self.sqlite_store_threads = int(os.environ.get("SQLITE_STORE_THREADS", self.sqlite_store_threads))
+        self.sqlite_inline_chunk_bytes = int(
+            os.environ.get("SQLITE_INLINE_CHUNK_BYTES", self.sqlite_inline_chunk_bytes)
+        )
+        self.gzip_cache_bytes = int(os.environ.get("GZIP_CACHE_BYTES", self.gzip_cache_bytes))
+        self.log_sample_rate = float(os.environ.get("LOG_SAMPLE_RATE", self.log_sample_rate))
+        self.log_route_sample_rates = os.environ.get("LOG_ROUTE_SAMPLE_RATES", self.log_route_sample_rates)
+        self.log_request_begin = bool(strtobool(os.environ.get("LOG_REQUEST_BEGIN", self.log_request_begin)))
+        self.plugin_workers = int(os.environ.get("PLUGIN_WORKERS", self.plugin_workers))
+        self.plugin_queue_size = int(os.environ.get("PLUGIN_QUEUE_SIZE", self.plugin_queue_size))
+        self.plugin_queue_policy = os.environ.get("PLUGIN_QUEUE_POLICY", self.plugin_queue_policy)
+        self.plugin_timeout_seconds = float(os.environ.get("PLUGIN_TIMEOUT_SECONDS", self.plugin_timeout_seconds))
+        self.auth_cache_size = int(os.environ.get("AUTH_CACHE_SIZE", self.auth_cache_size))
+        self.auth_cache_seconds = float(os.environ.get("AUTH_CACHE_SECONDS", self.auth_cache_seconds))
+        self.auth_reject_replays = bool(strtobool(os.environ.get("AUTH_REJECT_REPLAYS", self.auth_reject_replays)))
+        self.auth_nonce_index_size = int(os.environ.get("AUTH_NONCE_INDEX_SIZE", self.auth_nonce_index_size))
+        self.store_instrumentation = bool(
+            strtobool(os.environ.get("STORE_INSTRUMENTATION", self.store_instrumentation))
+        )
+        self.store_stats_log_seconds = float(os.environ.get("STORE_STATS_LOG_SECONDS", self.store_stats_log_seconds))
+
+
+# stores that keep authoritative state in the process cannot be shared between workers
+MULTI_WORKER_STORE_MODES: Final[tuple[str, ...]] = ("canned", "sqlite")
 
 T = TypeVar("T")
 
@@ -84,20 +141,25 @@ class LogConfig(BaseModel):
     LOGGER_NAME: str = "mesh-sandbox"
     LOG_FORMAT: str = "%(levelprefix)s | %(asctime)s | %(message)s"
     LOG_LEVEL: str = "DEBUG"
+    # json (one object per line, with the request fields) or text
+    LOG_FORMATTER: str = os.environ.get("LOG_FORMATTER", "json")
 
     # Logging config
     version: int = 1
     disable_existing_loggers: bool = False
     formatters: dict = {
-        "default": {
+        "text": {
             "()": "uvicorn.logging.DefaultFormatter",
             "fmt": LOG_FORMAT,
             "datefmt": "%Y-%m-%d %H:%M:%S",
         },
+        "json": {
+            "()": JsonFormatter,
+        },
     }
     handlers: dict = {
         "default": {
-            "formatter": "default",
+            "formatter": "text" if LOG_FORMATTER == "text" else "json",
             "class": "logging.StreamHandler",
             "stream": "ext://sys.stderr",
         },
@@ -109,3 +171,4 @@ class LogConfig(BaseModel):
 
 logging.config.dictConfig(LogConfig().dict())
 logger = logging.getLogger("mesh-sandbox")
+log_listener = start_queue_logging(logger)
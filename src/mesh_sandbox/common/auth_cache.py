@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Callable, Optional
+
+
+class NonceIndexFull(Exception):
+    pass
+
+
+class TtlSet:
+    """
+    bounded set of keys that expire ttl_seconds after they were added, the oldest keys are evicted once full
+    (or, with evict off, no more keys are added until some expire).
+    keys are only ever added, so insertion order is expiry order
+    """
+
+    def __init__(
+        self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = monotonic, evict: bool = True
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict = evict
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, expires = next(iter(self._entries.items()))
+            if expires > now:
+                return
+            del self._entries[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        if not self.max_entries:
+            return False
+        self._expire(self._clock())
+        return key in self._entries
+
+    def add(self, key: Hashable) -> bool:
+        """true if the key was added, false if the set is disabled or full with evict off"""
+        if not self.max_entries:
+            return False
+        now = self._clock()
+        self._expire(now)
+        self._entries.pop(key, None)
+        if not self.evict and len(self._entries) >= self.max_entries:
+            return False
+        self._entries[key] = now + self.ttl_seconds
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    def clear(self):
+        self._entries.clear()
+
+
+class AuthCache:
+    """
+    the authorization headers validated recently, keyed on every part of the token and the mailbox password, so a
+    client reusing a token (e.g. across a burst of chunk downloads) skips recomputing the hmac.
+    with replay rejection on, each (mailbox, nonce, nonce count) is only accepted once within the ttl, the nonces are
+    held in a separate index of up to max_nonces which never evicts a nonce before it expires, a request that would
+    need one evicted raises NonceIndexFull instead. the index is per process.
+    as a nonce is forgotten once it expires, tokens are only current for the ttl after their timestamp, give or take
+    token_slack_seconds (token timestamps are to the minute, and client clocks drift), and nonces are held long
+    enough that a token is no longer current by the time its nonce expires
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        reject_replays: bool = False,
+        max_nonces: int = 0,
+        clock: Callable[[], float] = monotonic,
+        token_slack_seconds: float = 0,
+    ):
+        self.reject_replays = reject_replays
+        self.hits = 0
+        self.misses = 0
+        self.replays = 0
+        self.nonces_full = 0
+        self.stale = 0
+        self._token_slack = timedelta(seconds=token_slack_seconds)
+        self._token_ttl = timedelta(seconds=ttl_seconds) + self._token_slack
+        self._validated = TtlSet(max_entries, ttl_seconds, clock)
+        self._nonces = TtlSet(
+            max_nonces if reject_replays else 0, ttl_seconds + 2 * token_slack_seconds, clock, evict=False
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self._validated)
+
+    @property
+    def nonces(self) -> int:
+        return len(self._nonces)
+
+    @property
+    def max_nonces(self) -> int:
+        return self._nonces.max_entries
+
+    def is_validated(self, key: Hashable) -> bool:
+        if not self._validated.max_entries:
+            return False
+        if key in self._validated:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def validated(self, key: Hashable):
+        self._validated.add(key)
+
+    def is_current(self, token_timestamp: Optional[datetime], now: datetime) -> bool:
+        """with replay rejection on, false if the token is too old (or too far ahead) to be checked for replays"""
+        if not self.reject_replays:
+            return True
+        if token_timestamp and now - self._token_ttl < token_timestamp <= now + self._token_slack:
+            return True
+        self.stale += 1
+        return False
+
+    def is_replay(self, mailbox_id: str, nonce: str, nonce_count: str) -> bool:
+        """records the nonce use, true if it was already used, raises NonceIndexFull if it cannot be recorded"""
+        if not self.reject_replays:
+            return False
+        key = (mailbox_id, nonce.lower(), int(nonce_count))
+        if key in self._nonces:
+            self.replays += 1
+            return True
+        if not self._nonces.add(key):
+            self.nonces_full += 1
+            raise NonceIndexFull(f"{self._nonces.max_entries} unexpired nonces held")
+        return False
+
+    def clear(self):
+        self._validated.clear()
+        self._nonces.clear()
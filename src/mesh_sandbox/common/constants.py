@@ -70,6 +70,7 @@ ERROR_INACTIVE_MAILBOX: Final = "Request Received from Inactive Mailbox"
 ERROR_MAILBOX_TOKEN_MISMATCH: Final = "Mailbox id does not match token"
 ERROR_INVALID_AUTH_TOKEN: Final = "Invalid Authentication Token"
 ERROR_DUPLICATED_AUTH_TOKEN: Final = "Error Duplicated Authentication Token"
+ERROR_NONCE_INDEX_FULL: Final = "Too many recent authentication nonces, retry later"
 ERROR_CONTENT_ENCODING_CHANGED: Final = "cannot change content encoding"
 ERROR_NOT_ENABLED_FOR_ONS_WORKFLOWID: Final = "ONS Civil Registration Workflow ID not enabled via MESH"
 ERROR_INVALID_CHECKSUM = "Invalid checksum"
@@ -1,5 +1,12 @@
 from urllib.parse import urlencode
 
+import anyio
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from ..models.message import Message
+from ..store.message_index import PositionKey, inbox_position, message_position
+
 DEFAULT_MAX_RESULTS = 500
 
 
@@ -13,3 +20,49 @@ def get_handler_uri(
 
     base_uri: str = "/messageexchange/" + url_template.format(*path_queries)
     return base_uri if not query else f"{base_uri}?{query}"
+
+
+# the field carrying the timestamp part of the position in a continue_from key, for each kind of position
+CURSOR_TIMESTAMP_FIELDS: dict[PositionKey, str] = {
+    message_position: "created_timestamp",
+    inbox_position: "accepted_timestamp",
+}
+
+
+def get_cursor_key(message: Message, position: PositionKey = message_position) -> dict[str, str]:
+    """continue_from key for the page ending with message, carries its position so the next page can seek to it"""
+    timestamp, message_id = position(message)
+    return {"message_id": message_id, CURSOR_TIMESTAMP_FIELDS[position]: timestamp.isoformat()}
+
+
+class ChunkFileResponse(FileResponse):
+    """
+    sends a chunk file without reading it into memory, handing the file to the server to sendfile when it supports
+    the asgi zerocopy extension and otherwise streaming it in FileResponse.chunk_size reads
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            self.send_header_only
+            or self.stat_result is None
+            or "http.response.zerocopy" not in scope.get("extensions", {})
+        ):
+            await super().__call__(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            await send(
+                {
+                    "type": "http.response.zerocopy",
+                    "file": file,
+                    "count": self.stat_result.st_size,
+                    "more_body": False,
+                }
+            )
+        finally:
+            file.close()
+
+        if self.background is not None:
+            await self.background()
@@ -4,18 +4,29 @@ import inspect
 import pkgutil
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from collections.abc import AsyncIterator
+from datetime import datetime
 from functools import wraps
 from types import ModuleType
-from typing import Any, Callable, ClassVar, Literal, NamedTuple, Optional, TypeVar, cast
+from typing import Any, Callable, ClassVar, Literal, NamedTuple, Optional, TypeVar, Union, cast
 
 from fastapi import HTTPException, status
 from starlette.background import BackgroundTasks
 
 from .. import plugins as plugins_ns
-from ..models.mailbox import Mailbox
+from ..models.mailbox import InboxCounters, Mailbox
 from ..models.message import Message, MessageEvent, MessageStatus, MessageType
-from ..store.base import Store
+from ..store.base import Store, StoreGauges
+from ..store.chunk_stream import ChunkFile, ChunkStream
+from ..store.expiry import ExpiryStats
+from ..store.message_index import MessagePosition, PositionKey, message_position
+from ..store.metered_store import StoreInstrumentation, metered
+from ..store.workflow_index import WorkflowFilter
 from . import constants, generate_cipher_text
+from .auth_cache import AuthCache, NonceIndexFull
+from .handler_helpers import CURSOR_TIMESTAMP_FIELDS
+from .metrics import get_metrics
+from .plugin_engine import PluginEngine
 
 
 class _SandboxPlugin(ABC):
@@ -41,15 +52,14 @@ class _SandboxPlugin(ABC):
         ]
     ] = []
 
+    # seconds the plugin may take over after_* / *_error events, None uses PLUGIN_TIMEOUT_SECONDS
+    timeout: ClassVar[Optional[float]] = None
+
     @abstractmethod
     async def on_event(self, event: str, event_args: dict[str, Any], exception: Optional[Exception] = None):
         pass
 
 
-def _accepted_messages(msg: Message) -> bool:
-    return msg.status == MessageStatus.ACCEPTED
-
-
 T_co = TypeVar("T_co", covariant=True)
 
 
@@ -81,6 +91,16 @@ class AuthoriseHeaderParts(NamedTuple):
 
 _DEFAULT_PARTS_IF_MISSING = ["" for _ in range(5)]
 MESH_AUTH_SCHEME = "NHSMESH"
+# token timestamps are to the minute, allow for that and some client clock drift when checking tokens are current
+AUTH_TOKEN_SLACK_SECONDS = 60
+
+
+def _token_timestamp(timestamp: str) -> Optional[datetime]:
+    """the token timestamp, yyyymmddHHMM in the client's local time"""
+    try:
+        return datetime.strptime(timestamp, "%Y%m%d%H%M")
+    except ValueError:
+        return None
 
 
 def try_parse_authorisation_token(auth_token: str) -> Optional[AuthoriseHeaderParts]:
@@ -114,11 +134,26 @@ def try_parse_authorisation_token(auth_token: str) -> Optional[AuthoriseHeaderPa
 
 class Messaging:
     def __init__(self, store: Store, plugins_module: ModuleType = plugins_ns):
-        self.store = store
         self.logger = store.logger
         self.config = store.config
+        self.store_stats = StoreInstrumentation() if self.config.store_instrumentation else None
+        self.store = metered(store, self.store_stats)
         self._plugin_registry: dict[str, list[type[_SandboxPlugin]]] = defaultdict(list)
         self._plugin_instances: dict[str, list[_SandboxPlugin]] = {}
+        self.plugins = PluginEngine(
+            self._run_queued_event,
+            self.logger,
+            workers=self.config.plugin_workers,
+            queue_size=self.config.plugin_queue_size,
+            drop_policy=self.config.plugin_queue_policy,
+        )
+        self.auth_cache = AuthCache(
+            self.config.auth_cache_size,
+            self.config.auth_cache_seconds,
+            self.config.auth_reject_replays,
+            self.config.auth_nonce_index_size,
+            token_slack_seconds=AUTH_TOKEN_SLACK_SECONDS,
+        )
         self._find_plugins(plugins_module)
 
     class _TriggersEvent:
@@ -135,7 +170,11 @@ class Messaging:
                     raise ValueError(f"only call {func} with kwargs")
                 messaging = cast(Messaging, args[0])
 
-                kwargs_for_event = kwargs.copy()
+                # an upload streamed into the store can only be read once, so plugins get b"" in its place,
+                # the size stored is in message.chunk_sizes once the chunk is saved
+                kwargs_for_event = {
+                    key: b"" if isinstance(value, AsyncIterator) else value for key, value in kwargs.items()
+                }
                 background_tasks = kwargs_for_event.pop("background_tasks", None)
 
                 await messaging.on_event(f"before_{self.event_name}", kwargs_for_event)
@@ -143,11 +182,11 @@ class Messaging:
                 try:
                     result = await func(*args, **kwargs)
                     if background_tasks:
-                        background_tasks.add_task(messaging.on_event, f"after_{self.event_name}", kwargs_for_event)
+                        await messaging.queue_event(f"after_{self.event_name}", kwargs_for_event)
                     return result
                 except Exception as err:
                     if background_tasks:
-                        background_tasks.add_task(messaging.on_event, f"{self.event_name}_error", kwargs_for_event, err)
+                        await messaging.queue_event(f"{self.event_name}_error", kwargs_for_event, err)
                     raise
 
             return _async_inner
@@ -218,32 +257,64 @@ class Messaging:
         created = plugin_type()
         return created
 
-    async def on_event(self, event: str, event_args: dict[str, Any], exception: Optional[Exception] = None):
+    async def _get_plugins(self, event: str) -> list[_SandboxPlugin]:
         instances = self._plugin_instances.get(event, [])
         if not instances:
             registered = self._plugin_registry.get(event, [])
             if not registered:
-                return
+                return []
 
             instances = await asyncio.gather(*[self._construct(plugin_type) for plugin_type in registered])
             self._plugin_instances[event] = instances
 
-        if exception:
-            await asyncio.gather(*[plugin.on_event(event, event_args, exception) for plugin in instances])
-        else:
-            await asyncio.gather(*[plugin.on_event(event, event_args) for plugin in instances])
+        return instances
+
+    async def _run_plugins(self, event: str, event_args: dict[str, Any], exception: Optional[Exception], queued: bool):
+        instances = await self._get_plugins(event)
+        await asyncio.gather(
+            *[
+                self.plugins.call(
+                    type(plugin).__name__,
+                    plugin.on_event(event, event_args, exception) if exception else plugin.on_event(event, event_args),
+                    timeout=(getattr(plugin, "timeout", None) or self.config.plugin_timeout_seconds)
+                    if queued
+                    else None,
+                    raise_errors=not queued,
+                )
+                for plugin in instances
+            ]
+        )
+
+    async def on_event(self, event: str, event_args: dict[str, Any], exception: Optional[Exception] = None):
+        """run the plugins for the event inline, plugin errors are raised to the caller"""
+        await self._run_plugins(event, event_args, exception, queued=False)
+
+    async def _run_queued_event(self, event: str, event_args: dict[str, Any], exception: Optional[Exception]):
+        await self._run_plugins(event, event_args, exception, queued=True)
+
+    async def queue_event(self, event: str, event_args: dict[str, Any], exception: Optional[Exception] = None):
+        """queue the event for the plugin workers, events with no plugins registered are not queued"""
+        if not self._plugin_registry.get(event):
+            return
+        await self.plugins.submit(event, event_args, exception)
 
     @property
     def readonly(self) -> bool:
         return self.store.readonly
 
     @_TriggersEvent(event_name="send_message")
-    async def send_message(self, message: Message, body: bytes, background_tasks: BackgroundTasks) -> Message:
+    async def send_message(
+        self, message: Message, body: Union[bytes, ChunkStream], background_tasks: BackgroundTasks
+    ) -> Message:
+        file_size = len(body) if isinstance(body, bytes) else 0
         if message.total_chunks > 0:
-            await self.save_chunk(message=message, chunk_number=1, chunk=body, background_tasks=background_tasks)
+            file_size = (
+                await self.save_chunk(message=message, chunk_number=1, chunk=body, background_tasks=background_tasks)
+                or file_size
+            )
 
         if message.total_chunks == 1 or message.message_type == MessageType.REPORT:
-            await self.accept_message(message=message, file_size=len(body), background_tasks=background_tasks)
+            await self.accept_message(message=message, file_size=file_size, background_tasks=background_tasks)
         else:
             await self.save_message(message=message, background_tasks=background_tasks)
 
@@ -284,9 +355,25 @@ class Messaging:
     @_TriggersEvent(event_name="save_chunk")
     @_IfNotReadonly()
     async def save_chunk(
-        self, message: Message, chunk_number: int, chunk: bytes, background_tasks: BackgroundTasks
-    ):  # pylint: disable=unused-argument
-        return await self.store.save_chunk(message=message, chunk_number=chunk_number, chunk=chunk)
+        self, message: Message, chunk_number: int, chunk: Union[bytes, ChunkStream], background_tasks: BackgroundTasks
+    ) -> int:  # pylint: disable=unused-argument
+        """saves a chunk, either the whole chunk or a stream written to the store as it arrives, returns its size"""
+        if isinstance(chunk, bytes):
+            await self.store.save_chunk(message=message, chunk_number=chunk_number, chunk=chunk)
+            size = len(chunk)
+        else:
+            size = await self.store.save_chunk_stream(message=message, chunk_number=chunk_number, stream=chunk)
+
+        message.chunk_sizes[chunk_number] = size
+        metrics = get_metrics()
+        metrics.chunks.inc(("upload",))
+        metrics.chunk_bytes.inc(("upload",), size)
+        return size
+
+    @_IfNotReadonly()
+    async def save_chunk_sizes(self, message: Message):
+        """persists the upload progress of a chunked message, without the plugin events of a full save"""
+        await self.store.save_chunk_sizes(message)
 
     @_TriggersEvent(event_name="save_message")
     @_IfNotReadonly()
@@ -306,6 +393,9 @@ class Messaging:
     async def get_chunk(self, message: Message, chunk_number: int) -> Optional[bytes]:
         return await self.store.get_chunk(message=message, chunk_number=chunk_number)
 
+    async def get_chunk_file(self, message: Message, chunk_number: int) -> Optional[ChunkFile]:
+        return await self.store.get_chunk_file(message=message, chunk_number=chunk_number)
+
     async def get_mailbox(self, mailbox_id: str, accessed: bool = False) -> Optional[Mailbox]:
         return await self.store.get_mailbox(mailbox_id=mailbox_id, accessed=accessed)
 
@@ -320,6 +410,9 @@ class Messaging:
     async def get_outbox(self, mailbox_id: str) -> list[Message]:
         return await self.store.get_outbox(mailbox_id=mailbox_id)
 
+    async def is_in_outbox(self, mailbox_id: str, message_id: str) -> bool:
+        return await self.store.is_in_outbox(mailbox_id=mailbox_id, message_id=message_id)
+
     async def get_by_local_id(self, mailbox_id: str, local_id: str) -> list[Message]:
         return await self.store.get_by_local_id(mailbox_id=mailbox_id, local_id=local_id)
 
@@ -329,8 +422,80 @@ class Messaging:
     async def lookup_by_workflow_id(self, workflow_id: str) -> list[Mailbox]:
         return await self.store.lookup_by_workflow_id(workflow_id=workflow_id)
 
-    async def get_accepted_inbox_messages(self, mailbox_id: str) -> list[Message]:
-        return await self.get_inbox_messages(mailbox_id, _accepted_messages)
+    async def get_accepted_inbox_messages(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        workflow_filter: Optional[WorkflowFilter] = None,
+    ) -> list[Message]:
+        return await self.store.get_accepted_inbox_messages(
+            mailbox_id=mailbox_id, predicate=predicate, limit=limit, after=after, workflow_filter=workflow_filter
+        )
+
+    async def get_inbox_range(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        newest_first: bool = False,
+        since: Optional[datetime] = None,
+    ) -> list[Message]:
+        return await self.store.get_inbox_range(
+            mailbox_id=mailbox_id,
+            predicate=predicate,
+            limit=limit,
+            after=after,
+            newest_first=newest_first,
+            since=since,
+        )
+
+    async def get_outbox_range(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        since: Optional[datetime] = None,
+    ) -> list[Message]:
+        return await self.store.get_outbox_range(
+            mailbox_id=mailbox_id, predicate=predicate, limit=limit, after=after, since=since
+        )
+
+    async def get_cursor_position(
+        self, last_key: Optional[dict], position: PositionKey = message_position
+    ) -> Optional[MessagePosition]:
+        """
+        resolves a continue_from key to a position in the given order ((created_timestamp, message_id) by default),
+        keys without that position (v1 message ids and older v2 tokens) are resolved by looking up the message
+        """
+        if not last_key or not last_key.get("message_id"):
+            return None
+
+        message_id = cast(str, last_key["message_id"])
+        timestamp = last_key.get(CURSOR_TIMESTAMP_FIELDS[position])
+        if timestamp:
+            return datetime.fromisoformat(timestamp), message_id
+
+        message = await self.get_message(message_id)
+        return position(message) if message else None
+
+    async def get_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        return await self.store.get_inbox_counters(mailbox_id=mailbox_id)
+
+    async def scan_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        return await self.store.scan_inbox_counters(mailbox_id=mailbox_id)
+
+    async def expire_messages(self, now: Optional[datetime] = None) -> ExpiryStats:
+        return await self.store.expire_messages(now=now)
+
+    async def get_expiry_stats(self) -> ExpiryStats:
+        return await self.store.get_expiry_stats()
+
+    async def get_store_gauges(self) -> StoreGauges:
+        return await self.store.get_gauges()
 
     async def _validate_auth_token(self, mailbox_id: str, authorization: str) -> Optional[Mailbox]:
         if self.config.auth_mode == "none":
@@ -360,18 +525,41 @@ class Messaging:
         if not mailbox:
             return None
 
-        cipher_text = generate_cipher_text(
-            self.config.shared_key,
-            header_parts.mailbox_id,
-            mailbox.password,
-            header_parts.timestamp,
+        cache_key = (
+            mailbox_id,
             header_parts.nonce,
             header_parts.nonce_count,
+            header_parts.timestamp,
+            header_parts.cipher_text.lower(),
+            mailbox.password,
         )
+        if not self.auth_cache.is_validated(cache_key):
+            cipher_text = generate_cipher_text(
+                self.config.shared_key,
+                header_parts.mailbox_id,
+                mailbox.password,
+                header_parts.timestamp,
+                header_parts.nonce,
+                header_parts.nonce_count,
+            )
+
+            if header_parts.cipher_text.lower() != cipher_text.lower():
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=constants.ERROR_INVALID_AUTH_TOKEN)
+
+            self.auth_cache.validated(cache_key)
 
-        if header_parts.cipher_text.lower() != cipher_text.lower():
+        if not self.auth_cache.is_current(_token_timestamp(header_parts.timestamp), datetime.now()):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=constants.ERROR_INVALID_AUTH_TOKEN)
 
+        try:
+            replayed = self.auth_cache.is_replay(mailbox_id, header_parts.nonce, header_parts.nonce_count)
+        except NonceIndexFull as err:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=constants.ERROR_NONCE_INDEX_FULL
+            ) from err
+        if replayed:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=constants.ERROR_DUPLICATED_AUTH_TOKEN)
+
         return mailbox
 
     async def authorise_mailbox(self, mailbox_id: str, authorization: str) -> Optional[Mailbox]:
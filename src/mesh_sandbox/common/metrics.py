@@ -0,0 +1,164 @@
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from functools import lru_cache
+from typing import Final, NamedTuple, Union
+
+LATENCY_BUCKETS: Final[tuple[float, ...]] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class _HistogramValues:
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self, num_buckets: int):
+        self.buckets = [0] * num_buckets
+        self.count = 0
+        self.total = 0.0
+
+
+class Histogram:
+    """cumulative bucket counts are only worked out when rendered, an observation increments a single bucket"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.bounds = tuple(buckets)
+        self._values: dict[Labels, _HistogramValues] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        values = self._values.get(labels)
+        if values is None:
+            values = self._values[labels] = _HistogramValues(len(self.bounds) + 1)
+        values.buckets[bisect_left(self.bounds, value)] += 1
+        values.count += 1
+        values.total += value
+
+    def count(self, labels: Labels = ()) -> int:
+        values = self._values.get(labels)
+        return values.count if values else 0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, values in self._values.items():
+            cumulative = 0
+            for bound, bucket in zip((*self.bounds, float("inf")), values.buckets):
+                cumulative += bucket
+                le = _labels(self.label_names, labels, f'le="{_number(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(values.total)}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {values.count}"
+
+
+class Gauge(NamedTuple):
+    """a gauge read when the metrics are rendered, rather than maintained as things change"""
+
+    name: str
+    documentation: str
+    samples: dict[Labels, float]
+    label_names: tuple[str, ...] = ()
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.samples.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class Metrics:
+    """in process metrics, rendered in the prometheus text exposition format"""
+
+    # starlette appends the charset to text media types
+    content_type: Final[str] = "text/plain; version=0.0.4"
+
+    def __init__(self):
+        self.requests = Counter("mesh_requests_total", "requests handled", ("route", "status"))
+        self.request_seconds = Histogram("mesh_request_duration_seconds", "request handling time", ("route", "status"))
+        self.store_seconds = Histogram(
+            "mesh_store_operation_duration_seconds", "time taken by store operations", ("operation",)
+        )
+        self.chunks = Counter("mesh_chunks_total", "message chunks uploaded / downloaded", ("direction",))
+        self.chunk_bytes = Counter(
+            "mesh_chunk_bytes_total", "message chunk bytes uploaded / sent to clients", ("direction",)
+        )
+        self.plugin_seconds = Histogram("mesh_plugin_duration_seconds", "plugin on_event time", ("plugin",))
+
+    def render(self, gauges: Iterable[Gauge] = ()) -> str:
+        metrics: list[Union[Counter, Histogram, Gauge]] = [
+            self.requests,
+            self.request_seconds,
+            self.store_seconds,
+            self.chunks,
+            self.chunk_bytes,
+            self.plugin_seconds,
+            *gauges,
+        ]
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache
+def get_metrics() -> Metrics:
+    return Metrics()
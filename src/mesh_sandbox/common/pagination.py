@@ -0,0 +1,65 @@
+import base64
+import binascii
+import hmac
+import json
+from collections.abc import Sequence
+from hashlib import sha256
+from typing import Final
+
+# signatures are truncated to this many bytes, 128 bits is ample to stop a client forging a position
+SIGNATURE_BYTES: Final[int] = 16
+
+
+class InvalidPaginationToken(ValueError):
+    status_code: Final[int] = 400
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class PaginationTokens:
+    """
+    continue_from tokens, the url safe base64 of the compact json position and a truncated hmac-sha256 of it.
+    tokens are signed rather than encrypted, the position (message id / index) is not a secret, it just must not be
+    forged. tokens are signed with the first key, and accepted if signed with any of the keys, so a previous key can
+    be kept while tokens handed out before a key rotation are still in use
+    """
+
+    def __init__(self, keys: Sequence[bytes]):
+        if not keys:
+            raise ValueError("at least one pagination token key is required")
+        self._keys = list(keys)
+
+    @staticmethod
+    def derive_key(secret: str) -> bytes:
+        """stable key derived from configuration, so tokens are valid across workers and restarts"""
+        return sha256(f"mesh-sandbox-continue-from:{secret}".encode()).digest()
+
+    @staticmethod
+    def _sign(key: bytes, payload: bytes) -> bytes:
+        return hmac.new(key, payload, sha256).digest()[:SIGNATURE_BYTES]
+
+    def encode_dict(self, data: dict) -> str:
+        payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(self._keys[0], payload))}"
+
+    def decode_dict(self, token: str) -> dict:
+        encoded_payload, _, encoded_signature = token.partition(".")
+        try:
+            payload = _b64decode(encoded_payload)
+            signature = _b64decode(encoded_signature)
+        except (binascii.Error, ValueError) as err:
+            raise InvalidPaginationToken("malformed continue_from token") from err
+
+        if not any(hmac.compare_digest(signature, self._sign(key, payload)) for key in self._keys):
+            raise InvalidPaginationToken("continue_from token signature does not match")
+
+        data = json.loads(payload)
+        if not isinstance(data, dict):
+            raise InvalidPaginationToken("malformed continue_from token")
+        return data
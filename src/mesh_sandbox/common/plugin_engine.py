@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from collections.abc import Awaitable
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Callable, Final, NamedTuple, Optional
+
+from .metrics import get_metrics
+
+DROP_POLICIES: Final[tuple[str, ...]] = ("drop_newest", "drop_oldest", "block")
+
+
+@dataclass
+class PluginStats:
+    """per plugin counters, timeouts and failures are also counted in calls"""
+
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+
+
+@dataclass
+class PluginQueueStats:
+    queued: int = 0
+    dropped: int = 0
+    pending: int = 0
+
+
+class _QueuedEvent(NamedTuple):
+    event: str
+    event_args: dict[str, Any]
+    exception: Optional[Exception]
+
+
+class PluginEngine:
+    """
+    runs the plugins for after_* / *_error events on worker tasks fed from a bounded queue, so a slow plugin does not
+    hold up the response. when the queue is full the drop policy applies: drop_newest discards the new event,
+    drop_oldest discards the oldest queued event and block waits for space (pushing back on the caller).
+    before_* events are still awaited inline by Messaging, as plugins may change the message before it is saved
+    """
+
+    def __init__(
+        self,
+        run_event: Callable[[str, dict[str, Any], Optional[Exception]], Awaitable[Any]],
+        logger: logging.Logger,
+        workers: int = 2,
+        queue_size: int = 1000,
+        drop_policy: str = "drop_newest",
+    ):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"unknown plugin drop policy {drop_policy}, use one of: {', '.join(DROP_POLICIES)}")
+
+        self._run_event = run_event
+        self.logger = logger
+        self.workers = max(workers, 1)
+        self.queue_size = max(queue_size, 1)
+        self.drop_policy = drop_policy
+        self.stats: dict[str, PluginStats] = {}
+        self.queue_stats = PluginQueueStats()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue[_QueuedEvent]] = None
+        self._worker_tasks: list[asyncio.Task] = []
+
+    def plugin_stats(self, plugin_name: str) -> PluginStats:
+        stats = self.stats.get(plugin_name)
+        if stats is None:
+            stats = self.stats[plugin_name] = PluginStats()
+        return stats
+
+    async def call(
+        self,
+        plugin_name: str,
+        on_event: Awaitable[Any],
+        timeout: Optional[float] = None,
+        raise_errors: bool = True,
+    ):
+        """await a plugin's on_event, recording its latency and any failure"""
+        stats = self.plugin_stats(plugin_name)
+        start = perf_counter()
+        try:
+            await asyncio.wait_for(on_event, timeout) if timeout else await on_event
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            stats.failures += 1
+            if raise_errors:
+                raise
+            self.logger.warning(f"plugin: {plugin_name} timed out after {timeout}s")
+        except Exception:  # pylint: disable=broad-except
+            stats.failures += 1
+            if raise_errors:
+                raise
+            self.logger.exception(f"plugin: {plugin_name} failed")
+        finally:
+            elapsed = perf_counter() - start
+            stats.record(elapsed)
+            get_metrics().plugin_seconds.observe(elapsed, (plugin_name,))
+
+    def _ensure_started(self) -> "asyncio.Queue[_QueuedEvent]":
+        loop = asyncio.get_running_loop()
+        if self._queue is not None and self._loop is loop:
+            return self._queue
+
+        # first use, or the previous loop has gone (e.g. between test clients), events queued on it are abandoned
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker_tasks = [
+            loop.create_task(self._worker(self._queue), name=f"plugin-worker-{ix}") for ix in range(self.workers)
+        ]
+        return self._queue
+
+    async def submit(self, event: str, event_args: dict[str, Any], exception: Optional[Exception] = None):
+        queue = self._ensure_started()
+        item = _QueuedEvent(event, event_args, exception)
+
+        if queue.full():
+            if self.drop_policy == "drop_newest":
+                self._dropped(item)
+                return
+            if self.drop_policy == "drop_oldest":
+                self._dropped(queue.get_nowait())
+                queue.task_done()
+
+        await queue.put(item)
+        self.queue_stats.queued += 1
+
+    def _dropped(self, item: _QueuedEvent):
+        self.queue_stats.dropped += 1
+        self.logger.warning(f"plugin queue full, dropped event {item.event}")
+
+    async def _worker(self, queue: "asyncio.Queue[_QueuedEvent]"):
+        while True:
+            item = await queue.get()
+            try:
+                await self._run_event(item.event, item.event_args, item.exception)
+            except Exception:  # pylint: disable=broad-except
+                self.logger.exception(f"failed to run plugins for {item.event}")
+            finally:
+                queue.task_done()
+
+    def get_queue_stats(self) -> PluginQueueStats:
+        self.queue_stats.pending = self._queue.qsize() if self._queue is not None else 0
+        return self.queue_stats
+
+    async def join(self):
+        """wait for the events queued so far to be processed"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self, timeout: float = 5.0):
+        """give queued events up to timeout seconds to finish, then stop the workers"""
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(
+                f"plugin queue not drained after {timeout}s, {self._queue and self._queue.qsize()} lost"
+            )
+
+        for task in self._worker_tasks:
+            task.cancel()
+        if self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+        self._loop = None
@@ -0,0 +1,91 @@
+import atexit
+import json
+import logging
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Any, Final, Optional
+
+# record attributes (passed as logging extra) included in the json output when set
+STRUCTURED_FIELDS: Final[tuple[str, ...]] = (
+    "event",
+    "route",
+    "method",
+    "path",
+    "mailbox_id",
+    "message_id",
+    "status",
+    "duration_ms",
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """one json object per line, with the STRUCTURED_FIELDS set on the record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class PassThroughQueueHandler(QueueHandler):
+    """
+    enqueues the record as it is, QueueHandler.prepare formats it on the calling thread and folds the exception into
+    the message, leaving the listener's formatter no exc_info (or args) to work with
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def start_queue_logging(logger: logging.Logger) -> QueueListener:
+    """
+    moves the logger's handlers behind a queue, so logging from a request only enqueues the record and the
+    formatting and writing to stderr happens on the listener thread
+    """
+    queue: SimpleQueue = SimpleQueue()
+    listener = QueueListener(queue, *logger.handlers, respect_handler_level=True)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(PassThroughQueueHandler(queue))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class RequestLogSampler:
+    """
+    decides which requests have their begin / end lines logged, sample_rate applies to routes without a rate in
+    route_rates. the end line of a request that fails is always logged
+    """
+
+    def __init__(self, sample_rate: float = 1.0, route_rates: Optional[dict[str, float]] = None, begin: bool = True):
+        self.sample_rate = sample_rate
+        self.route_rates = route_rates or {}
+        self.begin = begin
+
+    @staticmethod
+    def parse_route_rates(route_rates: str) -> dict[str, float]:
+        """route_name=rate pairs separated by commas, e.g. get_message_chunk=0.01,handshake=0.1"""
+        parsed: dict[str, float] = {}
+        for pair in route_rates.split(","):
+            if not pair.strip():
+                continue
+            route, _, rate = pair.partition("=")
+            parsed[route.strip()] = float(rate)
+        return parsed
+
+    def sampled(self, route: str) -> bool:
+        rate = self.route_rates.get(route, self.sample_rate)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
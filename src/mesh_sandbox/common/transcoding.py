@@ -0,0 +1,135 @@
+import zlib
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from typing import IO, Callable, Optional, Union
+
+import anyio
+
+# chunks are transcoded in pieces of this size, each piece on a worker thread, so a large chunk neither blocks the
+# event loop nor has to be held in memory alongside its transcoded copy
+TRANSCODE_PIECE_BYTES = 256 * 1024
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+GzipCacheKey = tuple[str, int]
+
+
+class _GzipDecompressor:
+    """incremental equivalent of gzip.decompress, including concatenated gzip members"""
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(_GZIP_WBITS)
+        self._in_member = False
+
+    def decompress(self, data: bytes) -> bytes:
+        parts = []
+        while data:
+            self._in_member = True
+            parts.append(self._decompressor.decompress(data))
+            if not self._decompressor.eof:
+                break
+            data = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(_GZIP_WBITS)
+            self._in_member = False
+        return b"".join(parts)
+
+    def flush(self) -> bytes:
+        if self._in_member:
+            raise EOFError("compressed chunk ended before the end-of-stream marker was reached")
+        return b""
+
+
+async def iter_chunk_pieces(chunk: Union[bytes, str]) -> AsyncIterator[bytes]:
+    """the chunk (bytes, or the path of the chunk file) in TRANSCODE_PIECE_BYTES pieces"""
+    if isinstance(chunk, bytes):
+        for offset in range(0, len(chunk), TRANSCODE_PIECE_BYTES):
+            yield chunk[offset : offset + TRANSCODE_PIECE_BYTES]
+        return
+
+    f: IO[bytes] = await anyio.to_thread.run_sync(open, chunk, "rb")
+    try:
+        while piece := await anyio.to_thread.run_sync(f.read, TRANSCODE_PIECE_BYTES):
+            yield piece
+    finally:
+        f.close()
+
+
+async def transcode_gzip(pieces: AsyncIterator[bytes], compress: bool) -> AsyncIterator[bytes]:
+    """gzip compresses (at gzip.compress' default level) or decompresses the pieces as they are read"""
+    transcode: Callable[[bytes], bytes]
+    flush: Callable[[], bytes]
+    if compress:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, _GZIP_WBITS)
+        transcode, flush = compressor.compress, compressor.flush
+    else:
+        decompressor = _GzipDecompressor()
+        transcode, flush = decompressor.decompress, decompressor.flush
+
+    async for piece in pieces:
+        transcoded = await anyio.to_thread.run_sync(transcode, piece)
+        if transcoded:
+            yield transcoded
+
+    tail = await anyio.to_thread.run_sync(flush)
+    if tail:
+        yield tail
+
+
+class GzipCache:
+    """
+    bounded lru cache of gzip compressed chunks keyed by (message id, chunk number), so a popular uncompressed
+    chunk is only compressed once. chunks are immutable once a message is accepted, so entries are never stale
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[GzipCacheKey, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: GzipCacheKey) -> Optional[bytes]:
+        if not self.max_bytes:
+            return None
+
+        compressed = self._entries.get(key)
+        if compressed is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return compressed
+
+    def put(self, key: GzipCacheKey, compressed: bytes):
+        if len(compressed) > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+
+        self._entries[key] = compressed
+        self.size += len(compressed)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    async def fill(self, key: GzipCacheKey, pieces: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """passes the compressed pieces through, caching the whole chunk once complete if it fits"""
+        collected: Optional[list[bytes]] = [] if self.max_bytes else None
+        size = 0
+        async for piece in pieces:
+            if collected is not None:
+                size += len(piece)
+                if size > self.max_bytes:
+                    collected = None
+                else:
+                    collected.append(piece)
+            yield piece
+
+        if collected is not None:
+            self.put(key, b"".join(collected))
@@ -11,7 +11,15 @@ from fastapi.testclient import TestClient
 from uvicorn import Config, Server  # type: ignore[import]
 
 from .api import app
-from .dependencies import get_env_config, get_messaging, get_store
+from .common.metrics import get_metrics
+from .dependencies import (
+    get_env_config,
+    get_gzip_cache,
+    get_messaging,
+    get_pagination_tokens,
+    get_request_log_sampler,
+    get_store,
+)
 from .tests.helpers import temp_env_vars
 
 
@@ -20,6 +28,10 @@ def setup():
     get_store.cache_clear()
     get_env_config.cache_clear()
     get_messaging.cache_clear()
+    get_pagination_tokens.cache_clear()
+    get_request_log_sampler.cache_clear()
+    get_gzip_cache.cache_clear()
+    get_metrics.cache_clear()
 
     with temp_env_vars(
         ENV="local",
@@ -7,12 +7,15 @@ from fastapi import Depends, Header, HTTPException, Path, Query, Request
 
 from .common import EnvConfig
 from .common.constants import Headers
-from .common.fernet import FernetHelper
 from .common.messaging import Messaging
+from .common.pagination import PaginationTokens
+from .common.structured_logging import RequestLogSampler
+from .common.transcoding import GzipCache
 from .store.base import Store
 from .store.canned_store import CannedStore
 from .store.file_store import FileStore
 from .store.memory_store import MemoryStore
+from .store.sqlite_store import SqliteStore
 
 _ACCEPTABLE_ACCEPTS = re.compile(r"^application/vnd\.mesh\.v(\d+)\+json$")
 
@@ -116,6 +119,16 @@ def get_logger() -> logging.Logger:
     return logging.getLogger("mesh-sandbox")
 
 
+@lru_cache
+def get_request_log_sampler() -> RequestLogSampler:
+    config = get_env_config()
+    return RequestLogSampler(
+        config.log_sample_rate,
+        RequestLogSampler.parse_route_rates(config.log_route_sample_rates),
+        begin=config.log_request_begin,
+    )
+
+
 @lru_cache
 def get_store() -> Store:
     logger = get_logger()
@@ -129,6 +142,9 @@ def get_store() -> Store:
     if config.store_mode == "file":
         return FileStore(config, logger)
 
+    if config.store_mode == "sqlite":
+        return SqliteStore(config, logger)
+
     raise ValueError(f"unrecognised store mode {config.store_mode}")
 
 
@@ -138,8 +154,15 @@ def get_messaging() -> Messaging:
 
 
 @lru_cache
-def get_fernet() -> FernetHelper:
-    return FernetHelper()
+def get_pagination_tokens() -> PaginationTokens:
+    config = get_env_config()
+    secrets = [config.pagination_key or config.shared_key, config.pagination_previous_key]
+    return PaginationTokens([PaginationTokens.derive_key(secret) for secret in secrets if secret])
+
+
+@lru_cache
+def get_gzip_cache() -> GzipCache:
+    return GzipCache(get_env_config().gzip_cache_bytes)
 
 
 async def authorised_mailbox(
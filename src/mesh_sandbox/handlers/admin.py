@@ -4,7 +4,9 @@ from uuid import uuid4
 from fastapi import BackgroundTasks, Depends, HTTPException, status
 
 from ..common.messaging import Messaging
-from ..dependencies import get_messaging
+from ..common.metrics import Gauge, get_metrics
+from ..common.transcoding import GzipCache
+from ..dependencies import get_gzip_cache, get_messaging
 from ..models.mailbox import Mailbox
 from ..models.message import (
     Message,
@@ -16,15 +18,21 @@ from ..models.message import (
 )
 from ..views.admin import (
     AddMessageEventRequest,
+    AuthCacheDetails,
     CreateReportRequest,
+    ExpiryDetails,
+    InboxCountersDetails,
     MailboxDetails,
     MessageDetails,
+    PluginDetails,
+    StoreStatsDetails,
 )
 
 
 class AdminHandler:
-    def __init__(self, messaging: Messaging = Depends(get_messaging)):
+    def __init__(self, messaging: Messaging = Depends(get_messaging), gzip_cache: GzipCache = Depends(get_gzip_cache)):
         self.messaging = messaging
+        self.gzip_cache = gzip_cache
 
     async def reset(self, mailbox_id: Optional[str] = None):
         if self.messaging.readonly:
@@ -118,6 +126,68 @@ class AdminHandler:
 
         return MailboxDetails.from_mailbox(mailbox)
 
+    async def get_inbox_counters(self, mailbox_id: str, verify: bool = False) -> InboxCountersDetails:
+        mailbox: Optional[Mailbox] = await self.messaging.get_mailbox(mailbox_id)
+        if not mailbox:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+        counters = await self.messaging.get_inbox_counters(mailbox.mailbox_id)
+        scanned = await self.messaging.scan_inbox_counters(mailbox.mailbox_id) if verify else None
+        return InboxCountersDetails.from_counters(counters, scanned)
+
+    async def get_expiry_stats(self) -> ExpiryDetails:
+        return ExpiryDetails.from_stats(await self.messaging.get_expiry_stats())
+
+    async def expire_messages(self) -> ExpiryDetails:
+        if self.messaging.readonly:
+            raise HTTPException(
+                status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
+                detail="expiry not supported for current store mode",
+            )
+        return ExpiryDetails.from_stats(await self.messaging.expire_messages())
+
+    async def get_plugin_stats(self) -> PluginDetails:
+        engine = self.messaging.plugins
+        return PluginDetails.from_stats(engine.get_queue_stats(), engine.drop_policy, engine.stats)
+
+    async def get_auth_cache_stats(self) -> AuthCacheDetails:
+        return AuthCacheDetails.from_cache(self.messaging.auth_cache)
+
+    async def get_store_stats(self) -> StoreStatsDetails:
+        return StoreStatsDetails.from_stats(self.messaging.store_stats)
+
+    async def get_metrics(self) -> str:
+        store = await self.messaging.get_store_gauges()
+        gauges = [
+            Gauge("mesh_messages", "messages held by the store", {(): store.messages}),
+            Gauge(
+                "mesh_inbox_messages",
+                "messages in mailbox inboxes by status",
+                {
+                    ("accepted",): store.inbox.accepted,
+                    ("acknowledged",): store.inbox.acknowledged,
+                    ("uploading",): store.inbox.uploading,
+                },
+                ("status",),
+            ),
+            Gauge("mesh_inbox_bytes", "size of the accepted messages in mailbox inboxes", {(): store.inbox.bytes}),
+            Gauge(
+                "mesh_chunk_bytes_in_memory", "message chunk bytes held in memory", {(): store.chunk_bytes_in_memory}
+            ),
+            Gauge("mesh_gzip_cache_bytes", "compressed chunk bytes cached", {(): self.gzip_cache.size}),
+            Gauge(
+                "mesh_plugin_queue_pending",
+                "plugin events waiting for a worker",
+                {(): self.messaging.plugins.get_queue_stats().pending},
+            ),
+            Gauge(
+                "mesh_auth_cache_entries",
+                "validated authorization headers cached",
+                {(): self.messaging.auth_cache.size},
+            ),
+        ]
+        return get_metrics().render(gauges)
+
     async def get_message_details(self, message_id: str) -> MessageDetails:
         message: Optional[Message] = await self.messaging.get_message(message_id)
         if not message:
@@ -1,21 +1,25 @@
-import gzip
+from collections.abc import AsyncIterator
 from datetime import datetime, tzinfo
-from typing import Any, Callable, Optional, cast
+from typing import Any, Optional, cast
 
 from dateutil.parser import isoparse
 from dateutil.relativedelta import relativedelta
 from dateutil.tz import tzutc
 from fastapi import BackgroundTasks, Depends, HTTPException, Response, status
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
-from ..common import MESH_MEDIA_TYPES, constants, exclude_none_json_encoder, index_of
+from ..common import MESH_MEDIA_TYPES, constants, exclude_none_json_encoder
 from ..common.constants import Headers
-from ..common.fernet import FernetHelper
-from ..common.handler_helpers import get_handler_uri
+from ..common.handler_helpers import ChunkFileResponse, get_cursor_key, get_handler_uri
 from ..common.messaging import Messaging
-from ..dependencies import get_fernet, get_messaging
+from ..common.metrics import get_metrics
+from ..common.pagination import PaginationTokens
+from ..common.transcoding import GzipCache, iter_chunk_pieces, transcode_gzip
+from ..dependencies import get_gzip_cache, get_messaging, get_pagination_tokens
 from ..models.mailbox import Mailbox
 from ..models.message import Message, MessageDeliveryStatus, MessageStatus, MessageType
+from ..store.message_index import inbox_position, message_position
+from ..store.workflow_index import WorkflowFilter
 from ..views.inbox import InboxV1, InboxV2, get_rich_inbox_view
 
 HTTP_DATETIME_FORMAT = "%a, %d %b %Y %H:%M:%S %Z"
@@ -30,15 +34,32 @@ def to_http_datetime(maybe_naive_dt: datetime, as_timezone: Optional[tzinfo] = N
     return maybe_naive_dt.strftime(HTTP_DATETIME_FORMAT)
 
 
+def _count_download(size: int):
+    metrics = get_metrics()
+    metrics.chunks.inc(("download",))
+    metrics.chunk_bytes.inc(("download",), size)
+
+
+async def _counted_download(pieces: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """counts a transcoded chunk once it has been sent, as its size is only known then"""
+    size = 0
+    async for piece in pieces:
+        size += len(piece)
+        yield piece
+    _count_download(size)
+
+
 class InboxHandler:
     def __init__(
         self,
         messaging: Messaging = Depends(get_messaging),
-        fernet: FernetHelper = Depends(get_fernet),
+        pagination: PaginationTokens = Depends(get_pagination_tokens),
+        gzip_cache: GzipCache = Depends(get_gzip_cache),
     ):
         self.messaging = messaging
 
-        self.fernet = fernet
+        self.pagination = pagination
+        self.gzip_cache = gzip_cache
 
     @staticmethod
     def _get_status_headers(message: Message) -> dict[str, Optional[str]]:
@@ -178,22 +199,14 @@ class InboxHandler:
 
         status_code = status.HTTP_200_OK if chunk_number >= message.total_chunks else status.HTTP_206_PARTIAL_CONTENT
 
-        chunk = await self.messaging.get_chunk(message, chunk_number)
-
-        if chunk is None:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=constants.ERROR_MESSAGE_DOES_NOT_EXIST)
-
-        headers[Headers.Content_Length] = str(len(chunk))
         content_encoding = headers.get(Headers.Content_Encoding, "")
-        if content_encoding == "gzip" and "gzip" not in accept_encoding:
+        decompress = content_encoding == "gzip" and "gzip" not in accept_encoding
+        compress = accepts_api_version > 1 and not content_encoding and "gzip" in accept_encoding
+        if decompress:
             headers.pop(Headers.Content_Encoding)
-            chunk = gzip.decompress(chunk)
 
-        if accepts_api_version > 1 and not content_encoding and "gzip" in accept_encoding:
+        if compress:
             headers[Headers.Content_Encoding] = "gzip"
-            chunk = gzip.compress(chunk)
-
-        headers[Headers.Content_Length] = str(len(chunk))
 
         if headers.get(Headers.Content_Encoding) == "gzip":
             headers[Headers.Mex_Content_Compressed] = "Y"
@@ -202,11 +215,42 @@ class InboxHandler:
         if accepts_api_version > 1 and message.total_chunks < 2 and message.metadata.content_type:
             media_type = message.metadata.content_type
 
-        return Response(
-            status_code=status_code,
-            content=chunk,
-            headers=headers,
-            media_type=media_type,
+        cache_key = (message.message_id, chunk_number)
+        cached = self.gzip_cache.get(cache_key) if compress else None
+        if cached is not None:
+            _count_download(len(cached))
+            headers[Headers.Content_Length] = str(len(cached))
+            return Response(status_code=status_code, content=cached, headers=headers, media_type=media_type)
+
+        chunk_file = await self.messaging.get_chunk_file(message, chunk_number)
+        if chunk_file and not (decompress or compress):
+            # sent as stored, straight from the file
+            _count_download(chunk_file.stat.st_size)
+            headers[Headers.Content_Length] = str(chunk_file.stat.st_size)
+            return ChunkFileResponse(
+                chunk_file.path,
+                status_code=status_code,
+                headers=headers,
+                media_type=media_type,
+                stat_result=chunk_file.stat,
+            )
+
+        chunk = None if chunk_file else await self.messaging.get_chunk(message, chunk_number)
+        if chunk_file is None and chunk is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=constants.ERROR_MESSAGE_DOES_NOT_EXIST)
+
+        if not (decompress or compress):
+            _count_download(len(chunk or b""))
+            headers[Headers.Content_Length] = str(len(chunk or b""))
+            return Response(status_code=status_code, content=chunk, headers=headers, media_type=media_type)
+
+        # the transcoded size is not known up front, so the response is sent chunked
+        body = transcode_gzip(iter_chunk_pieces(chunk_file.path if chunk_file else chunk or b""), compress=compress)
+        if compress:
+            body = self.gzip_cache.fill(cache_key, body)
+
+        return StreamingResponse(
+            _counted_download(body), status_code=status_code, headers=headers, media_type=media_type
         )
 
     async def acknowledge_message(
@@ -237,91 +281,36 @@ class InboxHandler:
         mailbox: Mailbox,
         max_results: int = DEFAULT_MAX_RESULTS,
         last_key: Optional[dict] = None,
-        message_filter: Optional[Callable[[Message], bool]] = None,
+        workflow_filter: Optional[WorkflowFilter] = None,
         rich: bool = False,
+        since: Optional[datetime] = None,
     ) -> tuple[list[Message], Optional[dict]]:
-        messages = (
-            sorted(
-                await self.messaging.get_inbox_messages(mailbox.mailbox_id),
-                key=lambda message: message.created_timestamp,
-                reverse=True,
+        # the rich listing is in created order, the accepted inbox in the order messages were accepted
+        position = message_position if rich else inbox_position
+        after = await self.messaging.get_cursor_position(last_key, position)
+        # read one more than max_results, the extra message tells us there is a next page
+        if rich:
+            messages = await self.messaging.get_inbox_range(
+                mailbox.mailbox_id,
+                limit=max_results + 1,
+                after=after,
+                newest_first=True,
+                since=since,
+            )
+        else:
+            messages = await self.messaging.get_accepted_inbox_messages(
+                mailbox.mailbox_id, limit=max_results + 1, after=after, workflow_filter=workflow_filter
             )
-            if rich
-            else await self.messaging.get_accepted_inbox_messages(mailbox.mailbox_id)
-        )
-
-        if message_filter:
-            messages = list(filter(message_filter, messages))
-
-        if last_key:
-            last_message_id = last_key["message_id"]
-            ix = index_of(messages, lambda msg: bool(msg.message_id == last_message_id))
-            if ix > -1:
-                messages = messages[ix + 1 :]
 
         last_key = None
 
         if len(messages) > max_results:
             messages = messages[:max_results]
             if messages:
-                last_key = {"message_id": messages[-1].message_id}
+                last_key = get_cursor_key(messages[-1], position)
 
         return messages, last_key
 
-    @staticmethod
-    def _get_workflow_filter(workflow_filter: Optional[str]) -> Optional[Callable[[Message], bool]]:  # noqa: C901
-        workflow_id_filter = (workflow_filter or "").strip()
-        if not workflow_id_filter:
-            return None
-
-        is_not = workflow_id_filter.startswith("!")
-        if is_not:
-            workflow_id_filter = workflow_id_filter[1:]
-
-        is_contains = workflow_id_filter.startswith("*")
-        if is_contains:
-            workflow_id_filter = workflow_id_filter[1:-1]
-
-        is_begins_with = workflow_id_filter.endswith("*")
-        if is_begins_with:
-            workflow_id_filter = workflow_id_filter[:-1]
-
-        if not is_not and not is_contains and not is_begins_with:
-
-            def _is_exact(message: Message) -> bool:
-                return message.workflow_id == workflow_id_filter
-
-            return _is_exact
-
-        if not is_contains and not is_begins_with:
-
-            def _is_not_exact(message: Message) -> bool:
-                return message.workflow_id != workflow_id_filter
-
-            return _is_not_exact
-
-        if is_begins_with:
-
-            def _begins_with(message: Message) -> bool:
-                return message.workflow_id.startswith(workflow_id_filter)
-
-            def _not_begins_with(message: Message) -> bool:
-                return not message.workflow_id.startswith(workflow_id_filter)
-
-            if is_not:
-                return _not_begins_with
-            return _begins_with
-
-        def _contains(message: Message) -> bool:
-            return workflow_id_filter in message.workflow_id
-
-        def _not_contains(message: Message) -> bool:
-            return workflow_id_filter not in message.workflow_id
-
-        if is_not:
-            return _not_contains
-        return _contains
-
     async def list_messages(
         self,
         mailbox: Mailbox,
@@ -336,11 +325,11 @@ class InboxHandler:
             if accepts_api_version < 2:
                 last_key = {"message_id": continue_from}
             else:
-                last_key = self.fernet.decode_dict(continue_from)
-
-        message_filter = self._get_workflow_filter(workflow_filter)
+                last_key = self.pagination.decode_dict(continue_from)
 
-        messages, last_key = await self._get_inbox_messages(mailbox, max_results, last_key, message_filter)
+        messages, last_key = await self._get_inbox_messages(
+            mailbox, max_results, last_key, WorkflowFilter.parse(workflow_filter)
+        )
 
         if accepts_api_version < 2:
             return JSONResponse(
@@ -364,7 +353,7 @@ class InboxHandler:
         }
 
         if last_key:
-            uri_query_args["continue_from"] = self.fernet.encode_dict(last_key)
+            uri_query_args["continue_from"] = self.pagination.encode_dict(last_key)
             links["next"] = get_handler_uri([mailbox.mailbox_id], "{0}/inbox", **uri_query_args)
 
         return JSONResponse(content=exclude_none_json_encoder(InboxV2(**result)), media_type=MESH_MEDIA_TYPES[2])
@@ -378,14 +367,11 @@ class InboxHandler:
     ) -> JSONResponse:
         last_key: Optional[dict] = None
         if continue_from:
-            last_key = self.fernet.decode_dict(continue_from)
+            last_key = self.pagination.decode_dict(continue_from)
 
         from_date = datetime.utcnow() + relativedelta(days=-30) if start_time is None else isoparse(start_time)
 
-        def message_filter(message: Message) -> bool:
-            return message.created_timestamp > from_date
-
-        messages, last_key = await self._get_inbox_messages(mailbox, max_results, last_key, message_filter, rich=True)
+        messages, last_key = await self._get_inbox_messages(mailbox, max_results, last_key, rich=True, since=from_date)
 
         url_template = "{0}/inbox/rich"
         links: dict[str, str] = {
@@ -399,6 +385,6 @@ class InboxHandler:
                 url_template=url_template,
                 start_time=from_date,
                 max_results=max_results,
-                continue_from=self.fernet.encode_dict(last_key),
+                continue_from=self.pagination.encode_dict(last_key),
             )
         return get_rich_inbox_view(messages, links)
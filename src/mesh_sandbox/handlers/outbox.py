@@ -9,13 +9,13 @@ from fastapi import BackgroundTasks, Depends, HTTPException, Request
 from fastapi import status as http_status
 from fastapi.responses import JSONResponse
 
-from ..common import constants, index_of, strtobool
+from ..common import constants, strtobool
 from ..common.exceptions import MessagingException
-from ..common.fernet import FernetHelper
-from ..common.handler_helpers import get_handler_uri
+from ..common.handler_helpers import get_cursor_key, get_handler_uri
 from ..common.messaging import Messaging
 from ..common.mex_headers import MexHeaders
-from ..dependencies import get_fernet, get_logger, get_messaging
+from ..common.pagination import PaginationTokens
+from ..dependencies import get_logger, get_messaging, get_pagination_tokens
 from ..models.mailbox import Mailbox
 from ..models.message import (
     Message,
@@ -25,6 +25,7 @@ from ..models.message import (
     MessageStatus,
     MessageType,
 )
+from ..store.chunk_stream import ChunkStream
 from ..views.outbox import (
     get_rich_outbox_view,
     send_message_response,
@@ -56,16 +57,36 @@ def get_chunk_range(chunk_range: str, request_chunk_no: int) -> tuple[Optional[s
     return None, chunk_no, total_chunks
 
 
+async def get_body_stream(request: Request) -> Optional[ChunkStream]:
+    """
+    the request body as a stream, so uploads are written to the store as they arrive rather than buffered,
+    None if the body is empty
+    """
+    stream = request.stream()
+    async for first in stream:
+        if first:
+            break
+    else:
+        return None
+
+    async def _body() -> ChunkStream:
+        yield first
+        async for part in stream:
+            yield part
+
+    return _body()
+
+
 class OutboxHandler:
     # pylint: disable=too-many-arguments
     def __init__(
         self,
         messaging: Messaging = Depends(get_messaging),
-        fernet: FernetHelper = Depends(get_fernet),
+        pagination: PaginationTokens = Depends(get_pagination_tokens),
         logger: logging.Logger = Depends(get_logger),
     ):
         self.messaging = messaging
-        self.fernet = fernet
+        self.pagination = pagination
         self.logger = logger
 
     async def send_message(
@@ -138,8 +159,8 @@ class OutboxHandler:
             ),
         )
 
-        body = await request.body()
-        if len(body) == 0:
+        body = await get_body_stream(request)
+        if body is None:
             raise HTTPException(status_code=http_status.HTTP_417_EXPECTATION_FAILED, detail="MissingDataFile")
 
         await self.messaging.send_message(message=message, body=body, background_tasks=background_tasks)
@@ -192,20 +213,22 @@ class OutboxHandler:
         if chunk_number > message.total_chunks or message.message_type != MessageType.DATA:
             raise MessagingException(status_code=http_status.HTTP_406_NOT_ACCEPTABLE, message_id=message_id)
 
-        if (content_encoding or "").strip() != message.metadata.content_encoding:
+        if (content_encoding or "").strip() != (message.metadata.content_encoding or ""):
             raise MessagingException(
                 status_code=http_status.HTTP_417_EXPECTATION_FAILED,
                 detail=constants.ERROR_CONTENT_ENCODING_CHANGED,
                 message_id=message_id,
             )
 
-        chunk = await request.body()
+        chunk = await get_body_stream(request)
 
         await self.messaging.save_chunk(
-            message=message, chunk_number=chunk_number, chunk=chunk, background_tasks=background_tasks
+            message=message, chunk_number=chunk_number, chunk=chunk or b"", background_tasks=background_tasks
         )
 
         if chunk_number < message.total_chunks:
+            # persist the chunk size, so upload progress can be tracked
+            await self.messaging.save_chunk_sizes(message=message)
             return upload_chunk_response(message, chunk_number, accepts_api_version)
 
         file_size = await self.messaging.get_file_size(message)
@@ -226,27 +249,22 @@ class OutboxHandler:
 
         last_key: Optional[dict] = None
         if continue_from:
-            last_key = self.fernet.decode_dict(continue_from)
-
-        messages: list[Message] = cast(list[Message], await self.messaging.get_outbox(mailbox.mailbox_id))
-
-        def message_filter(message: Message) -> bool:
-            return message.created_timestamp > from_date
-
-        messages = list(filter(message_filter, messages))
-
-        if last_key:
-            last_message_id = last_key["message_id"]
-            ix = index_of(messages, (lambda msg: bool(msg.message_id == last_message_id)))
-            if ix > -1:
-                messages = messages[ix + 1 :]
+            last_key = self.pagination.decode_dict(continue_from)
+
+        # read one more than max_results, the extra message tells us there is a next page
+        messages = await self.messaging.get_outbox_range(
+            mailbox.mailbox_id,
+            limit=max_results + 1,
+            after=await self.messaging.get_cursor_position(last_key),
+            since=from_date,
+        )
 
         last_key = None
 
         if len(messages) > max_results:
             messages = messages[:max_results]
             if messages:
-                last_key = {"message_id": messages[-1].message_id}
+                last_key = get_cursor_key(messages[-1])
 
         url_template = "{0}/outbox/rich"
         links: dict[str, str] = {
@@ -260,6 +278,6 @@ class OutboxHandler:
                 url_template=url_template,
                 start_time=from_date,
                 max_results=max_results,
-                continue_from=self.fernet.encode_dict(last_key),
+                continue_from=self.pagination.encode_dict(last_key),
             )
         return get_rich_outbox_view(messages, links)
@@ -26,8 +26,7 @@ class TrackingHandler:
             # intentionally not a 403 (matching spine)
             raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND)
 
-        sender_outbox = await self.messaging.get_outbox(sender_mailbox.mailbox_id)
-        if message.message_id not in [message.message_id for message in sender_outbox]:
+        if not await self.messaging.is_in_outbox(sender_mailbox.mailbox_id, message.message_id):
             raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND)
 
         model = create_tracking_response(message, accepts_api_version)
@@ -44,8 +43,7 @@ class TrackingHandler:
 
         message = messages[0]
 
-        sender_outbox = await self.messaging.get_outbox(sender_mailbox.mailbox_id)
-        if message.message_id not in [message.message_id for message in sender_outbox]:
+        if not await self.messaging.is_in_outbox(sender_mailbox.mailbox_id, message.message_id):
             raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND)
 
         model = create_tracking_response(message, 1)
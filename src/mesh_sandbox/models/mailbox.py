@@ -35,3 +35,17 @@ class Mailbox:
 
     def __post_init__(self):
         self.mailbox_id = self.mailbox_id.upper()
+
+
+@dataclass
+class InboxCounters:
+    accepted: int = 0
+    acknowledged: int = 0
+    uploading: int = 0
+    bytes: int = 0
+
+    def add(self, other: "InboxCounters", sign: int = 1):
+        self.accepted += sign * other.accepted
+        self.acknowledged += sign * other.acknowledged
+        self.uploading += sign * other.uploading
+        self.bytes += sign * other.bytes
@@ -1,10 +1,53 @@
+import sys
 from collections.abc import Generator
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Callable, Final, Optional
+from typing import Callable, Final, Optional, TypeVar, cast
+from weakref import WeakValueDictionary
 
 from dateutil.relativedelta import relativedelta
 
+T = TypeVar("T")
+
+
+def _slotted(weakref: bool = False) -> Callable[[type[T]], type[T]]:
+    """
+    recreates a dataclass with __slots__ for its fields (as @dataclass(slots=True) does from python 3.10),
+    so instances do not each carry a __dict__, apply above @dataclass.
+    frozen dataclasses get __getstate__ / __setstate__, as copy and pickle would otherwise restore the slots
+    through the __setattr__ that freezing disables
+    """
+
+    def wrap(cls: type[T]) -> type[T]:
+        field_names = tuple(field.name for field in fields(cls))  # type: ignore[arg-type]
+        namespace = {
+            key: value
+            for key, value in cls.__dict__.items()
+            if key not in field_names and key not in ("__dict__", "__weakref__")
+        }
+        namespace["__slots__"] = field_names + (("__weakref__",) if weakref else ())
+
+        if cls.__dataclass_params__.frozen:  # type: ignore[attr-defined]
+
+            def __getstate__(self) -> list:
+                return [getattr(self, name) for name in field_names]
+
+            def __setstate__(self, state: list):
+                for name, value in zip(field_names, state):
+                    object.__setattr__(self, name, value)
+
+            namespace["__getstate__"] = __getstate__
+            namespace["__setstate__"] = __setstate__
+
+        return cast(type[T], type(cls.__name__, cls.__bases__, namespace))
+
+    return wrap
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """values repeated across many messages (statuses, workflow ids, mailbox ids) share one string"""
+    return sys.intern(value) if isinstance(value, str) else value
+
 
 class MessageStatus:
     UPLOADING: Final[str] = "uploading"  # still uploading chunks
@@ -28,8 +71,9 @@ class MessageDeliveryStatus:
     ERROR = "ERROR"
 
 
+@_slotted()
 @dataclass
-class MessageMetadata:
+class MessageMetadata:  # pylint: disable=too-many-instance-attributes
     subject: Optional[str] = field(default=None)
     content_type: Optional[str] = field(default=None)
     content_encoding: Optional[str] = field(default=None)
@@ -42,10 +86,18 @@ class MessageMetadata:
     etag: Optional[str] = field(default=None)
     last_modified: Optional[str] = field(default=None)
 
+    def __post_init__(self):
+        self.content_type = _intern(self.content_type)
+        self.content_encoding = _intern(self.content_encoding)
 
-@dataclass
+
+@_slotted(weakref=True)
+@dataclass(frozen=True)
 class MessageParty:
-    """This will be either a sender or a recipient."""
+    """
+    This will be either a sender or a recipient.
+    parties are immutable, so messages to and from the same mailbox share one instance (see shared_party)
+    """
 
     mailbox_id: str = field(default="")
     mailbox_name: Optional[str] = field(default=None)
@@ -55,9 +107,26 @@ class MessageParty:
     billing_entity: Optional[str] = field(default=None)
 
     def __post_init__(self):
-        self.mailbox_id = (self.mailbox_id or "").strip().upper()
+        object.__setattr__(self, "mailbox_id", _intern((self.mailbox_id or "").strip().upper()))
+
+
+_shared_parties: WeakValueDictionary[tuple[Optional[str], ...], MessageParty] = WeakValueDictionary()
+
 
+def shared_party(party: MessageParty) -> MessageParty:
+    """the instance shared by messages for a party with these details"""
+    key = (
+        party.mailbox_id,
+        party.mailbox_name,
+        party.org_code,
+        party.ods_code,
+        party.org_name,
+        party.billing_entity,
+    )
+    return _shared_parties.setdefault(key, party)
 
+
+@_slotted()
 @dataclass
 class MessageEvent:
     status: str
@@ -67,6 +136,11 @@ class MessageEvent:
     timestamp: Optional[datetime] = field(default_factory=datetime.utcnow)
     linked_message_id: Optional[str] = field(default=None)
 
+    def __post_init__(self):
+        self.status = _intern(self.status)  # type: ignore[assignment]
+        self.code = _intern(self.code)
+        self.event = _intern(self.event)
+
 
 def default_message_expiry_time(relative_to: Optional[datetime] = None) -> datetime:
     relative_to = relative_to or datetime.utcnow()
@@ -78,6 +152,7 @@ def default_inbox_expiry_time(relative_to: Optional[datetime] = None) -> datetim
     return relative_to + relativedelta(days=5)
 
 
+@_slotted(weakref=True)
 @dataclass
 class Message:  # pylint: disable=too-many-public-methods,too-many-instance-attributes
     """Message definition"""
@@ -98,6 +173,8 @@ class Message:  # pylint: disable=too-many-public-methods,too-many-instance-attr
 
     total_chunks: int = field(default=1)
     file_size: int = field(default=0)
+    chunk_sizes: dict[int, int] = field(default_factory=dict, metadata={"omit_empty": True})
+    """ size of each chunk received so far, by chunk number, recorded as the chunks are saved """
 
     inbox_expiry_timestamp: Optional[datetime] = field(default_factory=default_inbox_expiry_time)
     last_modified: datetime = field(default_factory=datetime.utcnow)
@@ -115,6 +192,14 @@ class Message:  # pylint: disable=too-many-public-methods,too-many-instance-attr
     def last_event(self) -> MessageEvent:
         return self.events[0]
 
+    @property
+    def chunks_received(self) -> int:
+        return len(self.chunk_sizes)
+
+    @property
+    def bytes_received(self) -> int:
+        return sum(self.chunk_sizes.values())
+
     def status_timestamp(self, *statuses: str) -> Optional[datetime]:
         if not statuses:
             return self.last_event.timestamp
@@ -132,4 +217,8 @@ class Message:  # pylint: disable=too-many-public-methods,too-many-instance-attr
 
     def __post_init__(self):
         self.message_id = self.message_id.upper()
+        self.sender = shared_party(self.sender)
+        self.recipient = shared_party(self.recipient)
+        self.workflow_id = _intern(self.workflow_id)  # type: ignore[assignment]
+        self.message_type = _intern(self.message_type)
         self.events = self.events or [MessageEvent(status=MessageStatus.ACCEPTED, timestamp=self.created_timestamp)]
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, Path, Response, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Path, Query, Response, status
+from fastapi.responses import PlainTextResponse
 
+from ..common.metrics import Metrics
 from ..dependencies import (
     EnvConfig,
     get_env_config,
@@ -9,9 +11,14 @@ from ..dependencies import (
 from ..handlers.admin import AdminHandler
 from ..views.admin import (
     AddMessageEventRequest,
+    AuthCacheDetails,
     CreateReportRequest,
+    ExpiryDetails,
+    InboxCountersDetails,
     MailboxDetails,
     MessageDetails,
+    PluginDetails,
+    StoreStatsDetails,
 )
 from .request_logging import RequestLoggingRoute
 
@@ -142,6 +149,135 @@ async def get_mailbox_details(
     return mailbox
 
 
+@router.get(
+    "/admin/mailbox/{mailbox_id}/counters",
+    summary=f"Get the inbox counters for a mailbox, optionally verified against a full scan. {TESTING_ONLY}",
+    status_code=status.HTTP_200_OK,
+    response_model=InboxCountersDetails,
+    response_model_exclude_none=True,
+)
+@router.get(
+    "/messageexchange/admin/mailbox/{mailbox_id}/counters",
+    summary=f"Get the inbox counters for a mailbox, optionally verified against a full scan. {TESTING_ONLY}",
+    status_code=status.HTTP_200_OK,
+    response_model=InboxCountersDetails,
+    response_model_exclude_none=True,
+)
+async def get_inbox_counters(
+    mailbox_id: str = Depends(normalise_mailbox_id_path),
+    verify: bool = Query(default=False, description="compare the counters with a full scan of the inbox"),
+    handler: AdminHandler = Depends(AdminHandler),
+) -> InboxCountersDetails:
+    return await handler.get_inbox_counters(mailbox_id, verify)
+
+
+@router.get(
+    "/admin/expiry",
+    summary=f"Get the totals removed by the message expiry sweeper. {TESTING_ONLY}",
+    status_code=status.HTTP_200_OK,
+    response_model=ExpiryDetails,
+    response_model_exclude_none=True,
+)
+@router.get(
+    "/messageexchange/admin/expiry",
+    status_code=status.HTTP_200_OK,
+    include_in_schema=False,
+    response_model=ExpiryDetails,
+    response_model_exclude_none=True,
+)
+async def get_expiry_stats(
+    handler: AdminHandler = Depends(AdminHandler),
+) -> ExpiryDetails:
+    return await handler.get_expiry_stats()
+
+
+@router.post(
+    "/admin/expiry",
+    summary=f"Remove expired messages now rather than waiting for the next expiry sweep. {TESTING_ONLY}",
+    status_code=status.HTTP_200_OK,
+    response_model=ExpiryDetails,
+    response_model_exclude_none=True,
+)
+@router.post(
+    "/messageexchange/admin/expiry",
+    status_code=status.HTTP_200_OK,
+    include_in_schema=False,
+    response_model=ExpiryDetails,
+    response_model_exclude_none=True,
+)
+async def expire_messages(
+    handler: AdminHandler = Depends(AdminHandler),
+) -> ExpiryDetails:
+    return await handler.expire_messages()
+
+
+@router.get("/metrics", status_code=status.HTTP_200_OK, include_in_schema=False, response_class=PlainTextResponse)
+async def metrics(
+    handler: AdminHandler = Depends(AdminHandler),
+) -> PlainTextResponse:
+    return PlainTextResponse(await handler.get_metrics(), media_type=Metrics.content_type)
+
+
+@router.get(
+    "/admin/plugins",
+    summary=f"Get the plugin event queue depth and per plugin call timings. {TESTING_ONLY}",
+    status_code=status.HTTP_200_OK,
+    response_model=PluginDetails,
+    response_model_exclude_none=True,
+)
+@router.get(
+    "/messageexchange/admin/plugins",
+    status_code=status.HTTP_200_OK,
+    include_in_schema=False,
+    response_model=PluginDetails,
+    response_model_exclude_none=True,
+)
+async def get_plugin_stats(
+    handler: AdminHandler = Depends(AdminHandler),
+) -> PluginDetails:
+    return await handler.get_plugin_stats()
+
+
+@router.get(
+    "/admin/auth",
+    summary=f"Get the authorization cache hits, misses and replays rejected. {TESTING_ONLY}",
+    status_code=status.HTTP_200_OK,
+    response_model=AuthCacheDetails,
+    response_model_exclude_none=True,
+)
+@router.get(
+    "/messageexchange/admin/auth",
+    status_code=status.HTTP_200_OK,
+    include_in_schema=False,
+    response_model=AuthCacheDetails,
+    response_model_exclude_none=True,
+)
+async def get_auth_cache_stats(
+    handler: AdminHandler = Depends(AdminHandler),
+) -> AuthCacheDetails:
+    return await handler.get_auth_cache_stats()
+
+
+@router.get(
+    "/admin/store/stats",
+    summary=f"Get per operation store call counts, latencies, payload sizes and errors. {TESTING_ONLY}",
+    status_code=status.HTTP_200_OK,
+    response_model=StoreStatsDetails,
+    response_model_exclude_none=True,
+)
+@router.get(
+    "/messageexchange/admin/store/stats",
+    status_code=status.HTTP_200_OK,
+    include_in_schema=False,
+    response_model=StoreStatsDetails,
+    response_model_exclude_none=True,
+)
+async def get_store_stats(
+    handler: AdminHandler = Depends(AdminHandler),
+) -> StoreStatsDetails:
+    return await handler.get_store_stats()
+
+
 @router.get(
     "/admin/message/{message_id}",
     summary=f"Get message details matching id from message store. {TESTING_ONLY}",
@@ -1,15 +1,36 @@
-from time import time
-from typing import Callable
+from time import perf_counter
+from typing import Any, Callable
 
 from fastapi import HTTPException, Request, Response
 from fastapi.routing import APIRoute
 
 from ..common import logger
+from ..common.metrics import get_metrics
+from ..dependencies import get_request_log_sampler
+
+
+def _record_request(router_name: str, status_code: int, elapsed: float):
+    metrics = get_metrics()
+    labels = (router_name, str(status_code))
+    metrics.requests.inc(labels)
+    metrics.request_seconds.observe(elapsed, labels)
+
+
+def _request_fields(request: Request, router_name: str) -> dict[str, Any]:
+    return {
+        "route": router_name,
+        "method": request.method,
+        "path": request.url.path,
+        "mailbox_id": request.path_params.get("mailbox_id"),
+        "message_id": request.path_params.get("message_id"),
+    }
 
 
 class RequestLoggingRoute(APIRoute):
     """A FastAPI route that will add request info to logs from this level down.
-    It has access to the path params that aren't available in the middleware pre-request handling."""
+    It has access to the path params that aren't available in the middleware pre-request handling.
+    The begin / end lines carry the route, mailbox id, message id, status and duration as structured fields,
+    and are sampled per route (see RequestLogSampler), failed requests always log their end line."""
 
     def get_route_handler(self) -> Callable:
         original_route_handler = super().get_route_handler()
@@ -17,19 +38,60 @@ class RequestLoggingRoute(APIRoute):
 
         async def _request_logging_route_handler(request: Request) -> Response:
             request.state.router_name = router_name
-            # pylint: disable=logging-fstring-interpolation
-            logger.info(f"begin {router_name} {request.url}")
+            sampler = get_request_log_sampler()
+            sampled = sampler.sampled(router_name)
+            fields = _request_fields(request, router_name) if sampled else {}
+
+            if sampled and sampler.begin:
+                logger.info("begin %s %s", router_name, request.url, extra={**fields, "event": "begin"})
 
-            start = time()
+            start = perf_counter()
             try:
                 result = await original_route_handler(request)
-                logger.info(f"end {router_name} {request.url} {result.status_code} {round(time()-start, 5)}")
+                elapsed = perf_counter() - start
+                _record_request(router_name, result.status_code, elapsed)
+                if sampled:
+                    duration_ms = round(1000 * elapsed, 3)
+                    logger.info(
+                        "end %s %s %s %s",
+                        router_name,
+                        request.url,
+                        result.status_code,
+                        duration_ms,
+                        extra={**fields, "event": "end", "status": result.status_code, "duration_ms": duration_ms},
+                    )
                 return result
             except HTTPException as http_err:
-                logger.warning(f"end {router_name} {request.url} {http_err.status_code} {round(time()-start, 5)}")
+                elapsed = perf_counter() - start
+                _record_request(router_name, http_err.status_code, elapsed)
+                duration_ms = round(1000 * elapsed, 3)
+                logger.warning(
+                    "end %s %s %s %s",
+                    router_name,
+                    request.url,
+                    http_err.status_code,
+                    duration_ms,
+                    extra={
+                        **_request_fields(request, router_name),
+                        "event": "end",
+                        "status": http_err.status_code,
+                        "duration_ms": duration_ms,
+                    },
+                )
                 raise
             except Exception as err:
-                logger.exception(f"end {router_name} {request.url} {time()-start} {round(time()-start, 5)} - {err}")
+                elapsed = perf_counter() - start
+                # MessagingException / InvalidPaginationToken carry the status the exception handlers respond with
+                _record_request(router_name, getattr(err, "status_code", 500), elapsed)
+                duration_ms = round(1000 * elapsed, 3)
+                logger.exception(
+                    "end %s %s %s - %s",
+                    router_name,
+                    request.url,
+                    duration_ms,
+                    err,
+                    extra={**_request_fields(request, router_name), "event": "end", "duration_ms": duration_ms},
+                )
                 raise
 
         return _request_logging_route_handler
@@ -1,10 +1,25 @@
 import logging
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Callable, Optional
 
 from ..common import EnvConfig
-from ..models.mailbox import Mailbox
-from ..models.message import Message
+from ..models.mailbox import InboxCounters, Mailbox
+from ..models.message import Message, MessageStatus
+from .chunk_stream import ChunkFile, ChunkStream, read_chunk_stream
+from .expiry import ExpiryStats
+from .inbox_counters import message_contribution
+from .message_index import MessagePosition, all_of, inbox_position, order_messages, take_messages
+from .workflow_index import WorkflowFilter
+
+
+@dataclass
+class StoreGauges:
+    messages: int = 0
+    # totals of the per mailbox inbox counters
+    inbox: InboxCounters = field(default_factory=InboxCounters)
+    chunk_bytes_in_memory: int = 0
 
 
 class Store(ABC):
@@ -30,10 +45,30 @@ class Store(ABC):
     async def get_chunk(self, message: Message, chunk_number: int) -> Optional[bytes]:
         pass
 
+    async def get_chunk_file(self, message: Message, chunk_number: int) -> Optional[ChunkFile]:
+        """the chunk's file, if the store keeps it in one, so it can be sent without reading it into memory"""
+        return None
+
     @abstractmethod
     async def save_chunk(self, message: Message, chunk_number: int, chunk: bytes):
         pass
 
+    async def save_chunk_stream(self, message: Message, chunk_number: int, stream: ChunkStream) -> int:
+        """
+        save a chunk as it arrives, returns the chunk size.
+        stores that keep chunks in memory need the whole chunk anyway, so by default it is read then saved
+        """
+        chunk = await read_chunk_stream(stream)
+        await self.save_chunk(message, chunk_number, chunk)
+        return len(chunk)
+
+    async def save_chunk_sizes(self, message: Message):
+        """
+        persist the chunk sizes recorded so far for a message still being uploaded, stores override this to write
+        only the chunk sizes rather than the whole message
+        """
+        await self.save_message(message)
+
     @abstractmethod
     async def add_to_outbox(self, message: Message):
         pass
@@ -42,14 +77,17 @@ class Store(ABC):
     async def add_to_inbox(self, message: Message):
         pass
 
-    @abstractmethod
     async def get_file_size(self, message: Message) -> int:
-        pass
+        """the total size of the message chunks, recorded as each chunk was saved"""
+        return message.bytes_received
 
     @abstractmethod
     async def reset(self):
         pass
 
+    async def close(self):  # noqa: B027
+        """flush anything buffered to disk at shutdown"""
+
     @abstractmethod
     async def reset_mailbox(self, mailbox_id: str):
         pass
@@ -60,10 +98,82 @@ class Store(ABC):
     ) -> list[Message]:
         pass
 
+    async def get_accepted_inbox_messages(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        workflow_filter: Optional[WorkflowFilter] = None,
+    ) -> list[Message]:
+        """
+        accepted inbox messages in (accepted timestamp, message_id) order, starting after the cursor position,
+        optionally filtered by workflow id and predicate and limited to the first n
+        """
+        messages = await self.get_inbox_messages(mailbox_id, lambda msg: msg.status == MessageStatus.ACCEPTED)
+        if workflow_filter:
+            predicate = all_of(workflow_filter.matches, predicate)
+        return take_messages(order_messages(messages, after, position=inbox_position), predicate, limit)
+
+    async def get_inbox_range(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        newest_first: bool = False,
+        since: Optional[datetime] = None,
+    ) -> list[Message]:
+        """
+        inbox messages (any status) created after since in position order, starting after the cursor position
+        """
+        messages = await self.get_inbox_messages(mailbox_id)
+        return take_messages(order_messages(messages, after, newest_first, since), predicate, limit)
+
+    async def get_outbox_range(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        since: Optional[datetime] = None,
+    ) -> list[Message]:
+        """outbox messages created after since newest first, starting after (older than) the cursor position"""
+        messages = await self.get_outbox(mailbox_id)
+        return take_messages(order_messages(messages, after, newest_first=True, since=since), predicate, limit)
+
+    async def get_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        return await self.scan_inbox_counters(mailbox_id)
+
+    async def scan_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        """counts from a full scan of the inbox, used to verify the counters maintained by the store"""
+        counters = InboxCounters()
+        for message in await self.get_inbox_messages(mailbox_id):
+            counters.add(message_contribution(message, in_inbox=True))
+        return counters
+
+    async def expire_messages(self, now: Optional[datetime] = None) -> ExpiryStats:
+        """
+        remove messages past their message expiry and uncollected messages past their inbox expiry,
+        returns what this sweep reclaimed. stores that do not enforce expiry reclaim nothing
+        """
+        return ExpiryStats(last_sweep=now or datetime.utcnow())
+
+    async def get_expiry_stats(self) -> ExpiryStats:
+        """totals reclaimed by expire_messages since the store was initialised"""
+        return ExpiryStats()
+
+    async def get_gauges(self) -> StoreGauges:
+        """current message totals, for the metrics endpoint. stores that do not keep totals report nothing"""
+        return StoreGauges()
+
     @abstractmethod
     async def get_outbox(self, mailbox_id: str) -> list[Message]:
         pass
 
+    async def is_in_outbox(self, mailbox_id: str, message_id: str) -> bool:
+        return any(message.message_id == message_id for message in await self.get_outbox(mailbox_id))
+
     @abstractmethod
     async def get_by_local_id(self, mailbox_id: str, local_id: str) -> list[Message]:
         pass
@@ -10,15 +10,14 @@ from weakref import WeakValueDictionary
 from dateutil.relativedelta import relativedelta
 
 from ..common import EnvConfig
-from ..models.mailbox import Mailbox
+from ..models.mailbox import InboxCounters, Mailbox
 from ..models.message import Message, MessageStatus, MessageType
 from ..models.workflow import Workflow
-from .base import Store
+from .base import Store, StoreGauges
+from .inbox_counters import InboxCounterIndex, message_contribution
+from .message_index import MessagePosition, OrderedMessageIndex, all_of, inbox_position, naive_utc, take_messages
 from .serialisation import deserialise_model
-
-
-def _accepted_messages(msg: Message) -> bool:
-    return msg.status == MessageStatus.ACCEPTED
+from .workflow_index import WorkflowFilter, WorkflowIndex
 
 
 class CannedStore(Store):
@@ -45,11 +44,20 @@ class CannedStore(Store):
         self.endpoints = self._load_endpoints()
         self.messages = self._load_messages() if self.load_messages else {}
         self.chunks = self._load_chunks() if self.load_messages else defaultdict(list)
+        # kept up to date as chunks are saved and released, rather than summed over every chunk on each scrape
+        self.chunk_bytes_in_memory = sum(len(chunk or b"") for chunks in self.chunks.values() for chunk in chunks)
         self.inboxes: dict[str, list[Message]] = {mailbox.mailbox_id: [] for mailbox in self.mailboxes.values()}
         self.outboxes: dict[str, list[Message]] = {mailbox.mailbox_id: [] for mailbox in self.mailboxes.values()}
         self.local_ids: dict[str, dict[str, list[Message]]] = {
             mailbox.mailbox_id: defaultdict(list) for mailbox in self.mailboxes.values()
         }
+        self.inbox_counters = InboxCounterIndex()
+        # the accepted inbox is read in the order messages were accepted, so pages read with a cursor see every
+        # message accepted after the page was read, however long its upload took
+        self.accepted_inboxes: dict[str, OrderedMessageIndex] = defaultdict(lambda: OrderedMessageIndex(inbox_position))
+        self.accepted_workflows: dict[str, WorkflowIndex] = defaultdict(lambda: WorkflowIndex(inbox_position))
+        self.inbox_indexes: dict[str, OrderedMessageIndex] = defaultdict(OrderedMessageIndex)
+        self.outbox_indexes: dict[str, OrderedMessageIndex] = defaultdict(OrderedMessageIndex)
         self._fill_boxes()
         self.messages = cast(dict[str, Message], WeakValueDictionary(self.messages))
 
@@ -57,11 +65,13 @@ class CannedStore(Store):
         for message in self.messages.values():
             if message.sender.mailbox_id and message.sender.mailbox_id in self.mailboxes:
                 self.outboxes[message.sender.mailbox_id].append(message)
+                self.outbox_indexes[message.sender.mailbox_id].add(message)
 
-            if message.recipient.mailbox_id not in self.mailboxes:
+            if not self._in_inbox_on_load(message):
                 continue
 
             self.inboxes[message.recipient.mailbox_id].append(message)
+            self.inbox_indexes[message.recipient.mailbox_id].add(message)
 
         for inbox in self.inboxes.values():
             inbox.sort(key=lambda msg: msg.created_timestamp)
@@ -73,10 +83,30 @@ class CannedStore(Store):
                     continue
                 self.local_ids[mailbox_id][message.metadata.local_id].append(message)
 
+        for message in self.messages.values():
+            self._index_message(message, added_to_inbox=self._in_inbox_on_load(message))
+
         for mailbox in self.mailboxes.values():
-            mailbox.inbox_count = sum(
-                1 for message in self.inboxes[mailbox.mailbox_id] if message.status == MessageStatus.ACCEPTED
-            )
+            mailbox.inbox_count = self.inbox_counters.get(mailbox.mailbox_id).accepted
+
+    def _index_message(self, message: Message, added_to_inbox: bool = False):
+        """update the counters and indexes maintained for the message's recipient after a change to the message"""
+        self.inbox_counters.update(message, in_inbox=added_to_inbox)
+        accepted = self.accepted_inboxes[message.recipient.mailbox_id]
+        workflows = self.accepted_workflows[message.recipient.mailbox_id]
+        if message.status == MessageStatus.ACCEPTED and self.inbox_counters.in_inbox(message.message_id):
+            accepted.add(message)
+            workflows.add(message)
+        else:
+            accepted.discard(message.message_id)
+            workflows.discard(message)
+
+    def _reset_mailbox_indexes(self, mailbox_id: str):
+        self.inbox_counters.reset_mailbox(mailbox_id, self.messages)
+        self.accepted_inboxes[mailbox_id].clear()
+        self.accepted_workflows[mailbox_id].clear()
+        self.inbox_indexes[mailbox_id].clear()
+        self.outbox_indexes[mailbox_id].clear()
 
     def _load_endpoints(self) -> dict[str, list[Mailbox]]:
         canned_workflows = os.path.join(self._canned_data_dir, "workflows.jsonl")
@@ -122,6 +152,23 @@ class CannedStore(Store):
                 )
             }
 
+    def _message_expiry(self, message: Message) -> datetime:
+        return naive_utc(message.created_timestamp) + relativedelta(days=self.config.message_expiry_days)
+
+    def _is_expired(self, message: Message) -> bool:
+        if not self._filter_expired:
+            return False
+        return self._message_expiry(message) <= datetime.utcnow()
+
+    def _is_inbox_expired(self, message: Message, now: Optional[datetime] = None) -> bool:
+        """accepted messages not collected before their inbox expiry are no longer offered to the recipient"""
+        if not self._filter_expired or not message.inbox_expiry_timestamp or message.status != MessageStatus.ACCEPTED:
+            return False
+        return naive_utc(message.inbox_expiry_timestamp) <= (now or datetime.utcnow())
+
+    def _in_inbox_on_load(self, message: Message) -> bool:
+        return message.recipient.mailbox_id in self.mailboxes and not self._is_inbox_expired(message)
+
     def _load_messages(self) -> dict[str, Message]:
         messages: dict[str, Message] = {}
 
@@ -150,10 +197,7 @@ class CannedStore(Store):
                     with open(message_path.path, encoding="utf-8") as f:
                         message = deserialise_model(json.load(f), Message)
                         assert message
-                        message_expiry_date = message.created_timestamp + relativedelta(
-                            days=self.config.message_expiry_days
-                        )
-                        if self._filter_expired and message_expiry_date <= datetime.utcnow():
+                        if self._is_expired(message):
                             continue
                         messages[message.message_id] = message
                 except JSONDecodeError as e:
@@ -186,7 +230,7 @@ class CannedStore(Store):
         if not mailbox:
             return None
 
-        mailbox.inbox_count = len(await self.get_inbox_messages(mailbox_id, _accepted_messages))
+        mailbox.inbox_count = self.inbox_counters.get(mailbox_id).accepted
         if accessed:
             mailbox.last_accessed = datetime.utcnow()
         return mailbox
@@ -194,9 +238,6 @@ class CannedStore(Store):
     async def get_message(self, message_id: str) -> Optional[Message]:
         return self.messages.get(message_id)
 
-    async def get_file_size(self, message: Message) -> int:
-        return sum(len(chunk or b"") for chunk in self.chunks.get(message.message_id, []))
-
     async def add_to_outbox(self, message: Message):
         """does nothing on this readonly store..."""
 
@@ -230,9 +271,71 @@ class CannedStore(Store):
 
         return [m for m in inbox if predicate(m)]
 
+    async def get_accepted_inbox_messages(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        workflow_filter: Optional[WorkflowFilter] = None,
+    ) -> list[Message]:
+        if workflow_filter and workflow_filter.indexed:
+            messages = self.accepted_workflows[mailbox_id].iter_messages(workflow_filter, after)
+            return take_messages(messages, predicate, limit)
+
+        if workflow_filter:
+            predicate = all_of(workflow_filter.matches, predicate)
+        return take_messages(self.accepted_inboxes[mailbox_id].iter_messages(after), predicate, limit)
+
+    async def get_inbox_range(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        newest_first: bool = False,
+        since: Optional[datetime] = None,
+    ) -> list[Message]:
+        return take_messages(self.inbox_indexes[mailbox_id].iter_messages(after, newest_first, since), predicate, limit)
+
+    async def get_outbox_range(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        since: Optional[datetime] = None,
+    ) -> list[Message]:
+        return take_messages(
+            self.outbox_indexes[mailbox_id].iter_messages(after, newest_first=True, since=since), predicate, limit
+        )
+
+    async def get_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        return self.inbox_counters.get(mailbox_id)
+
+    async def get_gauges(self) -> StoreGauges:
+        return StoreGauges(
+            messages=len(self.messages),
+            inbox=self.inbox_counters.totals(),
+            chunk_bytes_in_memory=self.chunk_bytes_in_memory,
+        )
+
+    async def scan_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        counters = await super().scan_inbox_counters(mailbox_id)
+        in_inbox = {message.message_id for message in self.inboxes.get(mailbox_id, [])}
+        for message in list(self.messages.values()):
+            if message.recipient.mailbox_id != mailbox_id or message.message_id in in_inbox:
+                continue
+            counters.add(message_contribution(message, in_inbox=False))
+        return counters
+
     async def get_outbox(self, mailbox_id: str) -> list[Message]:
         return self.outboxes[mailbox_id]
 
+    async def is_in_outbox(self, mailbox_id: str, message_id: str) -> bool:
+        outbox = self.outbox_indexes.get(mailbox_id)
+        return outbox is not None and message_id in outbox
+
     async def get_by_local_id(self, mailbox_id: str, local_id: str) -> list[Message]:
         return self.local_ids.get(mailbox_id, {}).get(local_id, [])
 
@@ -0,0 +1,66 @@
+import os
+from collections.abc import AsyncIterator, Awaitable
+from typing import IO, Any, Callable, NamedTuple, Optional, Union, cast
+from uuid import uuid4
+
+ChunkStream = AsyncIterator[bytes]
+
+
+class ChunkFile(NamedTuple):
+    """a chunk stored as a file, which can be sent without reading it into memory"""
+
+    path: str
+    stat: os.stat_result
+
+
+def stat_chunk_file(path: str) -> Optional[ChunkFile]:
+    try:
+        return ChunkFile(path, os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+# uploads are written in pieces of about this size, so memory per upload does not grow with the chunk size
+STREAM_BUFFER_BYTES = 1024 * 1024
+
+
+async def read_chunk_stream(stream: ChunkStream) -> bytes:
+    return b"".join([part async for part in stream])
+
+
+def _open_for_write(path: str) -> IO[bytes]:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "wb")  # noqa: SIM115 pylint: disable=consider-using-with
+
+
+def _discard(f: IO[bytes], path: str):
+    f.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def write_chunk_stream(
+    stream: ChunkStream, path: str, run_io: Callable[..., Awaitable[Any]], head: Union[bytes, bytearray] = b""
+) -> int:
+    """
+    writes the stream to a temp file next to path (blocking calls are run with run_io) and renames it into place
+    once complete, so readers never see a partial chunk. returns the number of bytes written
+    """
+    temp_path = f"{path}.{uuid4().hex}.part"
+    f = await run_io(_open_for_write, temp_path)
+    size = 0
+    try:
+        buffer = bytearray(head)
+        async for part in stream:
+            buffer += part
+            if len(buffer) >= STREAM_BUFFER_BYTES:
+                size += cast(int, await run_io(f.write, buffer))
+                buffer.clear()
+        size += cast(int, await run_io(f.write, buffer))
+        await run_io(f.close)
+        await run_io(os.replace, temp_path, path)
+    except BaseException:
+        await run_io(_discard, f, temp_path)
+        raise
+
+    return size
@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+import logging
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Literal, Optional
+
+from .message_index import naive_utc
+
+if TYPE_CHECKING:
+    from .base import Store
+
+ExpiryKind = Literal["inbox", "message"]
+
+
+@dataclass
+class ExpiryStats:
+    """
+    what the retention sweeper has reclaimed, expired_messages were removed from the store entirely,
+    expired_inbox_messages were not collected in time and were removed from the recipient's inbox
+    """
+
+    expired_messages: int = 0
+    expired_inbox_messages: int = 0
+    reclaimed_bytes: int = 0
+    sweeps: int = 0
+    pending: int = 0
+    last_sweep: Optional[datetime] = None
+
+    def add(self, other: "ExpiryStats"):
+        self.expired_messages += other.expired_messages
+        self.expired_inbox_messages += other.expired_inbox_messages
+        self.reclaimed_bytes += other.reclaimed_bytes
+        self.sweeps += other.sweeps
+        # pending is a gauge, the entries left after the latest sweep
+        self.pending = other.pending
+        self.last_sweep = other.last_sweep or self.last_sweep
+
+
+class ExpiryQueue:
+    """
+    min-heap of (expiry time, message id, kind), a sweep only pops the entries that are due rather than scanning
+    every message. entries are not removed when a message goes away some other way (reset, etc.),
+    they are skipped when popped and dropped by retain once they make up most of the heap.
+    an inbox entry that falls due before the message reaches the inbox is deferred, and pushed again when it does
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[datetime, str, ExpiryKind]] = []
+        self._scheduled: set[str] = set()
+        self._awaiting_inbox: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self._scheduled
+
+    def clear(self):
+        self._heap.clear()
+        self._scheduled.clear()
+        self._awaiting_inbox.clear()
+
+    def schedule(self, message_id: str, message_expiry: datetime, inbox_expiry: Optional[datetime] = None):
+        """expiry times are fixed when the message is created, so a message is only scheduled once"""
+        if message_id in self._scheduled:
+            return
+        self._scheduled.add(message_id)
+        heapq.heappush(self._heap, (naive_utc(message_expiry), message_id, "message"))
+        if inbox_expiry:
+            heapq.heappush(self._heap, (naive_utc(inbox_expiry), message_id, "inbox"))
+
+    def defer_inbox(self, message_id: str):
+        """the inbox entry fell due while the message was not yet in the inbox"""
+        if message_id in self._scheduled:
+            self._awaiting_inbox.add(message_id)
+
+    def schedule_inbox(self, message_id: str, inbox_expiry: Optional[datetime]):
+        """the message has reached the inbox, push its inbox entry again if it fell due before it did"""
+        if message_id not in self._awaiting_inbox:
+            return
+        self._awaiting_inbox.discard(message_id)
+        if inbox_expiry:
+            heapq.heappush(self._heap, (naive_utc(inbox_expiry), message_id, "inbox"))
+
+    def next_expiry(self) -> Optional[datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> Iterator[tuple[str, ExpiryKind]]:
+        now = naive_utc(now)
+        while self._heap and self._heap[0][0] <= now:
+            _, message_id, kind = heapq.heappop(self._heap)
+            if kind == "message":
+                self._scheduled.discard(message_id)
+                self._awaiting_inbox.discard(message_id)
+            yield message_id, kind
+
+    def retain(self, is_live: Callable[[str], bool]):
+        """drop entries for messages that no longer exist"""
+        self._heap = [entry for entry in self._heap if is_live(entry[1])]
+        heapq.heapify(self._heap)
+        self._scheduled = {message_id for message_id in self._scheduled if is_live(message_id)}
+        self._awaiting_inbox &= self._scheduled
+
+
+async def run_expiry_sweeper(store: "Store", interval: float, logger: logging.Logger):
+    """periodically remove expired messages from the store, until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            swept = await store.expire_messages()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("expiry sweep failed")
+            continue
+
+        if swept.expired_messages or swept.expired_inbox_messages:
+            logger.info(
+                "expiry sweep removed %s messages, %s uncollected inbox messages, reclaimed %s bytes, "
+                "%s expiry entries pending",
+                swept.expired_messages,
+                swept.expired_inbox_messages,
+                swept.reclaimed_bytes,
+                swept.pending,
+            )
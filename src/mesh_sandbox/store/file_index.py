@@ -0,0 +1,438 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from json import JSONDecodeError
+from time import monotonic
+from typing import IO, Any, Final, NamedTuple, Optional
+
+FSYNC_POLICIES: Final[tuple[str, ...]] = ("none", "batched", "every")
+
+# with the batched fsync policy the journal is synced once this many records or seconds have passed since the last sync
+FSYNC_BATCH_RECORDS = 100
+FSYNC_BATCH_SECONDS = 1.0
+
+
+# per message digest the next delta is taken against: a fingerprint of each top level field (other than the events),
+# the number of events and a fingerprint of the events, rather than keeping the whole serialised message
+MessageDigest = tuple[dict[str, int], int, int]
+
+
+def _fingerprint(value: Any) -> int:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return hash(value)
+    return hash(json.dumps(value, separators=(",", ":")))
+
+
+def message_digest(record: dict[str, Any]) -> MessageDigest:
+    events = record.get("events") or []
+    fields = {key: _fingerprint(value) for key, value in record.items() if key != "events"}
+    return fields, len(events), _fingerprint(events)
+
+
+def journal_delta(previous: MessageDigest, current: dict[str, Any]) -> tuple[Optional[dict[str, Any]], MessageDigest]:
+    """
+    the change from the digest of a message's previous state to its current serialised state, the top level fields
+    set or unset and the events added, along with the digest of the current state.
+    events are only ever inserted at the front, so the events added are recorded with the resulting event count
+    """
+    previous_fields, previous_count, previous_events = previous
+    digest = message_digest(current)
+    fields, count, _ = digest
+
+    delta: dict[str, Any] = {}
+    changed = {key: current[key] for key, value in fields.items() if previous_fields.get(key) != value}
+    unset = [key for key in previous_fields if key not in fields]
+
+    events = current.get("events") or []
+    added = count - previous_count
+    if added < 0 or _fingerprint(events[added:]) != previous_events:
+        changed["events"] = events
+    elif added:
+        delta["events"] = events[:added]
+        delta["events_count"] = count
+
+    if changed:
+        delta["set"] = changed
+    if unset:
+        delta["unset"] = unset
+    return delta or None, digest
+
+
+def apply_delta(record: dict[str, Any], delta: dict[str, Any]) -> dict[str, Any]:
+    """idempotent, applying a delta that is already reflected in the record leaves it unchanged"""
+    merged = {**record, **delta.get("set", {})}
+    for key in delta.get("unset", ()):
+        merged.pop(key, None)
+
+    events = merged.get("events") or []
+    if len(events) < delta.get("events_count", 0):
+        merged["events"] = delta["events"] + events
+    return merged
+
+
+class JournalRead(NamedTuple):
+    # the merged record for each message
+    records: dict[str, dict[str, Any]]
+    # messages with deltas not yet written to their json snapshot
+    dirty: set[str]
+    num_records: int
+    # records that could not be read, skipped rather than discarding the rest of the journal
+    skipped: int
+    # deltas for messages whose full record was skipped, to be applied to the message json snapshot
+    orphans: dict[str, list[dict[str, Any]]]
+
+
+class FileStoreIndex:
+    """
+    append only journal for the file store, replaying this at startup avoids opening every
+    <MAILBOX>/in/<message_id>.json. the first record for a message is the serialised message (which carries the id,
+    recipient, sender, status events, created timestamp, workflow id and local id), later saves append a small delta
+    record rather than rewriting the message json. compaction rewrites the journal with one merged record per
+    message and brings the message json snapshots up to date, both via a temp file and rename. compaction is left
+    to the caller (see compaction_due) and only holds the lock appends take while it starts and finishes.
+    fsync is "none" (left to the os), "batched" (every FSYNC_BATCH_RECORDS records / FSYNC_BATCH_SECONDS) or "every"
+    """
+
+    file_name = "index.jsonl"
+
+    def __init__(self, mailboxes_dir: str, compact_min_records: int = 1000, fsync: str = "none"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy {fsync}, use one of: {', '.join(FSYNC_POLICIES)}")
+
+        self.mailboxes_dir = mailboxes_dir
+        self.path = os.path.join(mailboxes_dir, self.file_name)
+        self.fsync = fsync
+        self._compact_min_records = compact_min_records
+        # guards the journal and the state below, held briefly by every append
+        self._lock = threading.Lock()
+        # held for the whole of a compaction, and by anything replacing the journal, always taken before _lock
+        self._compacting = threading.Lock()
+        self._journal: Optional[IO[bytes]] = None
+        self._unsynced = 0
+        self._last_sync = monotonic()
+        self._records = 0
+        # messages with a record in the journal
+        self._live: set[str] = set()
+        # digests of the last state recorded for messages saved since startup, deltas are taken against these
+        self._digests: dict[str, MessageDigest] = {}
+        # messages with deltas not yet written to their json snapshot
+        self._dirty: set[str] = set()
+        # while compacting, messages whose json snapshot was rewritten after the compaction read the journal
+        self._snapshotted: Optional[set[str]] = None
+        # a compaction found corrupt records, compaction is not due again until the journal is replayed or replaced
+        self._corrupt = False
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def snapshot_path(self, record: dict[str, Any]) -> str:
+        recipient = (record.get("recipient") or {}).get("mailbox_id") or ""
+        return os.path.join(self.mailboxes_dir, recipient, "in", f"{record['message_id']}.json")
+
+    @property
+    def compaction_due(self) -> bool:
+        if self._corrupt:
+            return False
+        return self._records > max(self._compact_min_records, 2 * len(self._live))
+
+    def _reset_state(self, live: set[str], dirty: set[str]):
+        self._live = live
+        self._dirty = dirty
+        self._corrupt = False
+        self._digests = {}
+        self._records = len(live)
+
+    def remove(self):
+        with self._compacting, self._lock:
+            self._close_journal()
+            self._reset_state(set(), set())
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _read(self, limit: Optional[int] = None) -> JournalRead:
+        """
+        reads the journal (up to limit bytes), records that cannot be read are skipped and counted.
+        a torn record at the end of the journal (a crash mid write) is truncated when reading the whole journal
+        """
+        records: dict[str, dict[str, Any]] = {}
+        dirty: set[str] = set()
+        orphans: dict[str, list[dict[str, Any]]] = {}
+        num_records = skipped = offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if (limit is not None and offset >= limit) or not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+
+                try:
+                    record = json.loads(line)
+                except (JSONDecodeError, UnicodeDecodeError):
+                    skipped += 1
+                    continue
+
+                message_id = record.get("message_id") if isinstance(record, dict) else None
+                if not message_id:
+                    skipped += 1
+                    continue
+
+                delta = record.get("delta")
+                if delta is None:
+                    records[message_id] = record
+                elif message_id in records:
+                    records[message_id] = apply_delta(records[message_id], delta)
+                    dirty.add(message_id)
+                else:
+                    orphans.setdefault(message_id, []).append(delta)
+
+                num_records += 1
+
+        if limit is None and offset < os.path.getsize(self.path):
+            with open(self.path, "rb+") as f:
+                f.truncate(offset)
+
+        return JournalRead(records, dirty, num_records, skipped, orphans)
+
+    def replay(self) -> Optional[JournalRead]:
+        """
+        reads the journal for the latest serialised record of each message, None if there is no journal.
+        records that could not be read are skipped (see JournalRead.skipped), replace the journal with the recovered
+        records when there are any
+        """
+        if not self.exists():
+            return None
+
+        with self._compacting, self._lock:
+            self._close_journal()
+            journal = self._read()
+            self._reset_state(set(journal.records), journal.dirty)
+            self._records = journal.num_records + journal.skipped
+
+        return journal
+
+    def forget(self, message_id: str):
+        """stop tracking a message, it will be dropped from the index on the next compaction"""
+        with self._lock:
+            self._live.discard(message_id)
+            self._digests.pop(message_id, None)
+            self._dirty.discard(message_id)
+
+    @staticmethod
+    def _encode(record: dict[str, Any]) -> bytes:
+        return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def _open_journal(self) -> IO[bytes]:
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._journal = open(self.path, "ab")  # noqa: SIM115 pylint: disable=consider-using-with
+        return self._journal
+
+    def _close_journal(self):
+        if self._journal is None:
+            return
+        self._sync(force=True)
+        self._journal.close()
+        self._journal = None
+
+    def _sync(self, force: bool = False):
+        journal = self._journal
+        if journal is None:
+            return
+
+        journal.flush()
+        if self.fsync == "none" or not self._unsynced:
+            return
+        due = (
+            force
+            or self.fsync == "every"
+            or self._unsynced >= FSYNC_BATCH_RECORDS
+            or monotonic() - self._last_sync >= FSYNC_BATCH_SECONDS
+        )
+        if not due:
+            return
+        os.fsync(journal.fileno())
+        self._unsynced = 0
+        self._last_sync = monotonic()
+
+    def _append(self, record: dict[str, Any]):
+        """lock must be held"""
+        self._open_journal().write(self._encode(record))
+        self._records += 1
+        self._unsynced += 1
+        self._sync()
+        self._live.add(record["message_id"])
+
+    def append(self, record: dict[str, Any]):
+        """append a full record for a message"""
+        with self._lock:
+            self._append(record)
+
+    def record(self, serialised: dict[str, Any]):
+        """
+        record a saved message state, the first save of a message since startup writes the full record and the
+        message json, later saves append the delta from the last state recorded
+        """
+        message_id = serialised["message_id"]
+        with self._lock:
+            previous = self._digests.get(message_id)
+            if previous is None:
+                self._write_snapshot(serialised, create=True)
+                self._dirty.discard(message_id)
+                if self._snapshotted is not None:
+                    self._snapshotted.add(message_id)
+                self._append(serialised)
+                self._digests[message_id] = message_digest(serialised)
+                return
+
+            delta, self._digests[message_id] = journal_delta(previous, serialised)
+            if delta is not None:
+                self._dirty.add(message_id)
+                self._append({"message_id": message_id, "delta": delta})
+
+    def update(self, message_id: str, changes: dict[str, Any]):
+        """append a delta setting some top level fields of a message already in the journal"""
+        with self._lock:
+            if message_id not in self._live:
+                return
+            self._dirty.add(message_id)
+            self._append({"message_id": message_id, "delta": {"set": changes}})
+            digest = self._digests.get(message_id)
+            if digest is not None:
+                digest[0].update((key, _fingerprint(value)) for key, value in changes.items())
+
+    def _write_atomic(self, path: str, data: bytes, sync: bool):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _write_snapshot(self, record: dict[str, Any], create: bool):
+        """
+        snapshots are only created on the first save, after that existing snapshots are refreshed,
+        so a message whose files were removed from disk is not brought back
+        """
+        path = self.snapshot_path(record)
+        if create:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        elif not os.path.exists(path):
+            return
+        self._write_atomic(path, json.dumps(record).encode("utf-8"), sync=self.fsync == "every")
+
+    def replace(self, records: dict[str, dict[str, Any]], dirty: set[str]):
+        """replace the index with the supplied records, refreshing the json snapshots of the dirty messages"""
+        with self._compacting, self._lock:
+            self._close_journal()
+            for message_id in dirty:
+                if message_id in records:
+                    self._write_snapshot(records[message_id], create=False)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._write_atomic(
+                self.path, b"".join(self._encode(record) for record in records.values()), sync=self.fsync != "none"
+            )
+            self._reset_state(set(records), set())
+
+    def rebuild(self, records: dict[str, dict[str, Any]]):
+        """replace the index with the supplied records"""
+        self.replace(records, set())
+
+    def checkpoint(self):
+        """compact the journal, bringing every message json snapshot up to date"""
+        with self._compacting:
+            self._compact()
+            with self._lock:
+                self._close_journal()
+
+    def close(self):
+        with self._lock:
+            self._close_journal()
+
+    def compact(self):
+        """
+        rewrite the journal with the merged record for each tracked message, and refresh the json snapshots of the
+        messages that changed since the last compaction. the journal is read and rewritten without holding the lock,
+        records appended meanwhile are copied across when the rewritten journal replaces it
+        """
+        with self._compacting:
+            self._compact()
+
+    def _compact(self):
+        """_compacting must be held"""
+        with self._lock:
+            if not self.exists():
+                return
+            self._sync(force=True)
+            end = os.path.getsize(self.path)
+            live = set(self._live)
+            dirty, self._dirty = self._dirty, set()
+            self._snapshotted = set()
+
+        try:
+            journal = self._read(limit=end)
+            if journal.skipped:
+                # leave a journal with corrupt records for the next startup to recover, rather than reading it again
+                # after every save
+                with self._lock:
+                    self._dirty |= dirty
+                    self._corrupt = True
+                return
+
+            records = {message_id: record for message_id, record in journal.records.items() if message_id in live}
+            for message_id in dirty & set(records):
+                with self._lock:
+                    # a snapshot rewritten since the journal was read holds a later state than the merged record
+                    if message_id not in self._snapshotted:
+                        self._write_snapshot(records[message_id], create=False)
+
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(b"".join(self._encode(record) for record in records.values()))
+
+            with self._lock:
+                self._close_journal()
+                with open(self.path, "rb") as journal_file, open(temp_path, "ab") as f:
+                    journal_file.seek(end)
+                    appended = journal_file.read()
+                    f.write(appended)
+                    if self.fsync != "none":
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+                self._records = len(records) + appended.count(b"\n")
+        finally:
+            with self._lock:
+                self._snapshotted = None
+
+
+def main():
+    """
+    rebuilds the file store index from the message json files, e.g.
+    python -m mesh_sandbox.store.file_index --mailboxes-dir /tmp/mesh_store
+    """
+    from ..common import EnvConfig  # pylint: disable=import-outside-toplevel
+    from .file_store import FileStore  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description="rebuild the mesh sandbox file store index")
+    parser.add_argument("--mailboxes-dir", default=None, help="defaults to MAILBOXES_DATA_DIR / FILE_STORE_DIR")
+    args = parser.parse_args()
+
+    config = EnvConfig()
+    if args.mailboxes_dir:
+        config.mailboxes_dir = args.mailboxes_dir
+
+    logger = logging.getLogger("mesh-sandbox")
+    index = FileStoreIndex(config.mailboxes_dir)
+    if index.exists():
+        # loading the store replays the journal (recovering any corrupt records), then write the changes only held
+        # in it to the message json files before discarding it
+        FileStore(config, logger).index.checkpoint()
+    index.remove()
+    store = FileStore(config, logger)
+    print(f"rebuilt {store.index.path} with {len(store.messages)} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,64 @@
-import json
+import asyncio
+import logging
 import os.path
 from collections import defaultdict
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar, cast
+from weakref import WeakValueDictionary
 
+from ..common import EnvConfig
+from ..models.mailbox import Mailbox
 from ..models.message import Message
+from .chunk_stream import ChunkFile, ChunkStream, stat_chunk_file, write_chunk_stream
+from .file_index import FileStoreIndex, JournalRead, apply_delta
 from .memory_store import MemoryStore
-from .serialisation import serialise_model
+from .serialisation import deserialise_model, serialise_model
+
+T = TypeVar("T")
+
+
+def _write_chunk(path: str, chunk: Optional[bytes]):
+    if chunk is None:
+        if not os.path.exists(path):
+            return
+        os.remove(path)
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb+") as f:
+        f.write(chunk)
+
+
+def _read_chunk(path: str) -> Optional[bytes]:
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _sum_file_sizes(paths: list[str]) -> int:
+    return sum(os.stat(path).st_size for path in paths if os.path.exists(path))
+
+
+def _remove_message_files(message_paths: list[str]) -> int:
+    """removes the message json and chunk directory for each message, returns the bytes removed"""
+    removed = 0
+    for message_path in message_paths:
+        json_path = f"{message_path}.json"
+        if os.path.exists(json_path):
+            removed += os.stat(json_path).st_size
+            os.remove(json_path)
+
+        if not os.path.isdir(message_path):
+            continue
+        for entry in os.scandir(message_path):
+            removed += entry.stat().st_size
+            os.remove(entry.path)
+        os.rmdir(message_path)
+
+    return removed
 
 
 class FileStore(MemoryStore):
@@ -14,6 +67,16 @@ class FileStore(MemoryStore):
 
     load_messages = True
 
+    def __init__(self, config: EnvConfig, logger: logging.Logger):
+        # filesystem calls are run on a bounded pool so a large chunk write does not block the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(config.file_store_threads, 1), thread_name_prefix="file-store"
+        )
+        self._message_locks: WeakValueDictionary[str, asyncio.Lock] = WeakValueDictionary()
+        self._compaction: Optional[asyncio.Future] = None
+        self.index = FileStoreIndex(config.mailboxes_dir, fsync=config.file_store_fsync)
+        super().__init__(config, logger)
+
     def get_mailboxes_data_dir(self) -> str:
         return self._config.mailboxes_dir
 
@@ -25,44 +88,154 @@ class FileStore(MemoryStore):
             self._mailboxes_data_dir, message.recipient.mailbox_id, "in", message.message_id, str(chunk_number)
         )
 
+    def _load_messages(self) -> dict[str, Message]:
+        """
+        replays the index if present, falling back to a full scan of the message json files (and rebuilding the index)
+        if the index is missing
+        """
+        journal = self.index.replay()
+        if journal is None:
+            return self.rebuild_index()
+
+        records = journal.records
+        if journal.skipped:
+            self.logger.warning(
+                f"file store index {self.index.path} has {journal.skipped} corrupt records, "
+                "recovering the messages they held from the message files"
+            )
+            records = self._recover_index(journal)
+
+        messages: dict[str, Message] = {}
+        for message_id, record in records.items():
+            message = cast(Message, deserialise_model(record, Message))
+            if self._is_expired(message):
+                self.index.forget(message_id)
+                continue
+
+            mailbox_id = message.recipient.mailbox_id
+            if mailbox_id and mailbox_id not in self.mailboxes:
+                self.mailboxes[mailbox_id] = Mailbox(mailbox_id=mailbox_id, mailbox_name="Unknown", password="password")
+
+            messages[message_id] = message
+
+        return messages
+
+    def _recover_index(self, journal: JournalRead) -> dict[str, dict[str, Any]]:
+        """
+        only the corrupt records are lost, a message whose full record was lost is read back from its json snapshot
+        with its later deltas applied, then the journal is rewritten without the corrupt records
+        """
+        records = dict(journal.records)
+        dirty = set(journal.dirty)
+        for message_id, message in super()._load_messages().items():
+            if message_id in records:
+                continue
+            record = cast(dict[str, Any], serialise_model(message))
+            for delta in journal.orphans.get(message_id, ()):
+                record = apply_delta(record, delta)
+            records[message_id] = record
+            dirty.add(message_id)
+
+        self.index.replace(records, dirty)
+        return records
+
+    def rebuild_index(self) -> dict[str, Message]:
+        messages = super()._load_messages()
+        self.index.rebuild(
+            {message_id: cast(dict[str, Any], serialise_model(message)) for message_id, message in messages.items()}
+        )
+        return messages
+
     def _load_chunks(self) -> dict[str, list[Optional[bytes]]]:
         """overrides canned store default data load"""
         return defaultdict(list)
 
+    async def _run_io(self, func: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _run_message_io(self, message: Message, func: Callable[..., T], *args) -> T:
+        """
+        writes for the same message are serialised (in arrival order) so they never interleave on disk,
+        writes for different messages run concurrently on the executor
+        """
+        lock = self._message_locks.get(message.message_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._message_locks[message.message_id] = lock
+
+        async with lock:
+            return await self._run_io(func, *args)
+
+    async def reset(self):
+        # an explicit reset reloads from disk, so rescan the message files rather than trusting the index,
+        # once any changes only held in the index have been written to them
+        await self._run_io(self.index.checkpoint)
+        self.index.remove()
+        await super().reset()
+
+    def _compact_index_if_due(self):
+        """compaction rewrites the journal, so it is run in the background rather than by the save that made it due"""
+        if self._compaction is not None or not self.index.compaction_due:
+            return
+        self._compaction = asyncio.ensure_future(self._run_io(self.index.compact))
+        self._compaction.add_done_callback(self._compaction_done)
+
+    def _compaction_done(self, compaction: asyncio.Future):
+        self._compaction = None
+        if not compaction.cancelled() and compaction.exception():
+            self.logger.error("file store index compaction failed", exc_info=compaction.exception())
+
+    async def close(self):
+        if self._compaction is not None:
+            await asyncio.wait([self._compaction])
+        await self._run_io(self.index.close)
+        self._executor.shutdown(wait=True)
+
     async def save_message(self, message: Message):
         await super().save_message(message)
-        message_json_path = f"{self.message_path(message)}.json"
-        os.makedirs(os.path.dirname(message_json_path), exist_ok=True)
-        with open(message_json_path, "w+", encoding="utf-8") as f:
-            json.dump(serialise_model(message), f)
+        # serialise on the loop, so the snapshot written matches the message state at the time of the call
+        serialised = serialise_model(message)
+        if serialised is None:
+            raise ValueError(f"message {message.message_id} did not serialise")
+        await self._run_message_io(message, self.index.record, serialised)
+        self._compact_index_if_due()
+
+    async def save_chunk_sizes(self, message: Message):
+        # a delta record of just the chunk sizes, the message json is brought up to date on compaction
+        await self._run_message_io(
+            message, self.index.update, message.message_id, {"chunk_sizes": {**message.chunk_sizes}}
+        )
+        self._compact_index_if_due()
 
     async def save_chunk(self, message: Message, chunk_number: int, chunk: Optional[bytes]):
-        chunk_path = self.chunk_path(message, chunk_number)
-        if chunk is None:
-            if not os.path.exists(chunk_path):
-                return
-            os.remove(chunk_path)
-            return
+        await self._run_message_io(message, _write_chunk, self.chunk_path(message, chunk_number), chunk)
+
+    async def save_chunk_stream(self, message: Message, chunk_number: int, stream: ChunkStream) -> int:
+        # each write, and the final rename, is serialised with the other writes for the message
+        return await write_chunk_stream(
+            stream, self.chunk_path(message, chunk_number), partial(self._run_message_io, message)
+        )
 
-        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
-        with open(chunk_path, "wb+") as f:
-            f.write(chunk)
+    async def get_chunk_file(self, message: Message, chunk_number: int) -> Optional[ChunkFile]:
+        return await self._run_io(stat_chunk_file, self.chunk_path(message, chunk_number))
 
     async def get_chunk(self, message: Message, chunk_number: int) -> Optional[bytes]:
-        chunk_path = self.chunk_path(message, chunk_number)
-        if not os.path.exists(chunk_path):
-            return None
+        return await self._run_io(_read_chunk, self.chunk_path(message, chunk_number))
 
-        with open(chunk_path, "rb") as f:
-            return f.read()
+    async def _delete_expired(self, messages: list[Message]) -> int:
+        reclaimed = await super()._delete_expired(messages)
+        for message in messages:
+            self.index.forget(message.message_id)
+        return reclaimed + await self._run_io(_remove_message_files, [self.message_path(msg) for msg in messages])
 
     async def get_file_size(self, message: Message) -> int:
-        size = 0
-        if message.total_chunks < 1:
-            return 0
-
-        message_dir = self.message_path(message)
-        for chunk_no in range(message.total_chunks):
-            stat = os.stat(f"{message_dir}/{chunk_no+1}")
-            size += stat.st_size
-        return size
+        # only messages uploaded before chunk sizes were recorded should have chunks missing from chunk_sizes
+        missing = [
+            self.chunk_path(message, chunk_number)
+            for chunk_number in range(1, message.total_chunks + 1)
+            if chunk_number not in message.chunk_sizes
+        ]
+        if not missing:
+            return message.bytes_received
+
+        return message.bytes_received + await self._run_io(_sum_file_sizes, missing)
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from dataclasses import replace
+from typing import NamedTuple
+
+from ..models.mailbox import InboxCounters
+from ..models.message import Message, MessageStatus
+
+
+def message_contribution(message: Message, in_inbox: bool) -> InboxCounters:
+    """
+    what a message adds to its recipient's counters, accepted / acknowledged / bytes count messages in the inbox,
+    uploading counts messages addressed to the mailbox that are still being uploaded
+    """
+    status = message.status
+    counters = InboxCounters(uploading=int(status == MessageStatus.UPLOADING))
+    if not in_inbox:
+        return counters
+
+    counters.accepted = int(status == MessageStatus.ACCEPTED)
+    counters.acknowledged = int(status == MessageStatus.ACKNOWLEDGED)
+    counters.bytes = message.file_size or 0
+    return counters
+
+
+class _Tracked(NamedTuple):
+    recipient: str
+    sender: str
+    in_inbox: bool
+    contribution: InboxCounters
+
+
+class InboxCounterIndex:
+    """
+    per mailbox counters maintained incrementally as messages change state, the last contribution of each message
+    is kept so a status change only has to move that message between counters
+    """
+
+    def __init__(self):
+        self._counters: dict[str, InboxCounters] = defaultdict(InboxCounters)
+        self._tracked: dict[str, _Tracked] = {}
+
+    def clear(self):
+        self._counters.clear()
+        self._tracked.clear()
+
+    def get(self, mailbox_id: str) -> InboxCounters:
+        return replace(self._counters.get(mailbox_id) or InboxCounters())
+
+    def totals(self) -> InboxCounters:
+        totals = InboxCounters()
+        for counters in self._counters.values():
+            totals.add(counters)
+        return totals
+
+    def in_inbox(self, message_id: str) -> bool:
+        tracked = self._tracked.get(message_id)
+        return tracked is not None and tracked.in_inbox
+
+    def update(self, message: Message, in_inbox: bool = False):
+        """record the current state of a message, in_inbox is sticky once the message has been added to the inbox"""
+        previous = self._tracked.get(message.message_id)
+        in_inbox = in_inbox or (previous is not None and previous.in_inbox)
+        self._track(message.message_id, message.recipient.mailbox_id, message.sender.mailbox_id, in_inbox, message)
+
+    def _track(self, message_id: str, recipient: str, sender: str, in_inbox: bool, message: Message):
+        self.discard(message_id)
+        contribution = message_contribution(message, in_inbox)
+        self._tracked[message_id] = _Tracked(recipient, sender, in_inbox, contribution)
+        self._counters[recipient].add(contribution)
+
+    def discard(self, message_id: str):
+        previous = self._tracked.pop(message_id, None)
+        if previous:
+            self._counters[previous.recipient].add(previous.contribution, sign=-1)
+
+    def reset_mailbox(self, mailbox_id: str, messages: dict[str, Message]):
+        """
+        the mailbox inbox and outbox have been cleared, messages sent to it are no longer in the inbox and messages
+        sent from it are no longer tracked (unless they are still in the recipient's inbox)
+        """
+        for message_id, tracked in list(self._tracked.items()):
+            if mailbox_id not in (tracked.recipient, tracked.sender):
+                continue
+
+            in_inbox = tracked.in_inbox and tracked.recipient != mailbox_id
+            message = messages.get(message_id)
+            if message is None or (tracked.sender == mailbox_id and not in_inbox):
+                self.discard(message_id)
+                continue
+
+            self._track(message_id, tracked.recipient, tracked.sender, in_inbox, message)
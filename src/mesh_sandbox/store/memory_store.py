@@ -1,10 +1,15 @@
 import logging
 from collections import defaultdict
-from typing import Optional
+from dataclasses import replace
+from datetime import datetime
+from typing import Callable, Optional
 
 from ..common import EnvConfig
-from ..models.message import Message
+from ..models.mailbox import InboxCounters
+from ..models.message import Message, MessageStatus
 from .canned_store import CannedStore
+from .expiry import ExpiryQueue, ExpiryStats
+from .message_index import naive_utc
 
 
 class MemoryStore(CannedStore):
@@ -18,12 +23,28 @@ class MemoryStore(CannedStore):
     def __init__(self, config: EnvConfig, logger: logging.Logger):
         super().__init__(config, logger, filter_expired=True)
 
-    async def reset(self):
+    def initialise(self):
+        self.expiry_queue = ExpiryQueue()
+        self.expiry_stats = ExpiryStats()
+        # message ids removed by the expiry sweep, dropped from the inbox / outbox lists when they are next read
+        self._removed_from_inboxes: dict[str, set[str]] = defaultdict(set)
+        self._removed_from_outboxes: dict[str, set[str]] = defaultdict(set)
         super().initialise()
+        for message in self.messages.values():
+            self._schedule_expiry(message)
+
+    def _schedule_expiry(self, message: Message):
+        self.expiry_queue.schedule(message.message_id, self._message_expiry(message), message.inbox_expiry_timestamp)
+
+    async def reset(self):
+        self.initialise()
 
     async def reset_mailbox(self, mailbox_id: str):
+        self._reset_mailbox_indexes(mailbox_id)
         self.inboxes[mailbox_id] = []
         self.outboxes[mailbox_id] = []
+        self._removed_from_inboxes.pop(mailbox_id, None)
+        self._removed_from_outboxes.pop(mailbox_id, None)
         self.local_ids[mailbox_id] = defaultdict(list)
         self.mailboxes[mailbox_id].inbox_count = 0
 
@@ -32,6 +53,7 @@ class MemoryStore(CannedStore):
             return
 
         self.outboxes[message.sender.mailbox_id].insert(0, message)
+        self.outbox_indexes[message.sender.mailbox_id].add(message)
         if not message.metadata.local_id:
             return
 
@@ -39,11 +61,123 @@ class MemoryStore(CannedStore):
 
     async def add_to_inbox(self, message: Message):
         self.inboxes[message.recipient.mailbox_id].append(message)
+        self.inbox_indexes[message.recipient.mailbox_id].add(message)
+        self._index_message(message, added_to_inbox=True)
+        self.expiry_queue.schedule_inbox(message.message_id, message.inbox_expiry_timestamp)
 
     async def save_message(self, message: Message):
         self.messages[message.message_id] = message
+        self._index_message(message)
+        self._schedule_expiry(message)
+
+    async def save_chunk_sizes(self, message: Message):
+        # the message held in memory already has them
+        pass
 
     async def save_chunk(self, message: Message, chunk_number: int, chunk: Optional[bytes]):
         if message.message_id not in self.chunks:
             self.chunks[message.message_id] = [None for _ in range(message.total_chunks)]
-        self.chunks[message.message_id][chunk_number - 1] = chunk
+        chunks = self.chunks[message.message_id]
+        self.chunk_bytes_in_memory += len(chunk or b"") - len(chunks[chunk_number - 1] or b"")
+        chunks[chunk_number - 1] = chunk
+
+    @staticmethod
+    def _drop_removed(boxes: dict[str, list[Message]], removed: dict[str, set[str]], mailbox_id: str):
+        """drops the messages the expiry sweep marked as removed from a mailbox's inbox / outbox list"""
+        message_ids = removed.pop(mailbox_id, None)
+        if message_ids and mailbox_id in boxes:
+            boxes[mailbox_id] = [msg for msg in boxes[mailbox_id] if msg.message_id not in message_ids]
+
+    async def get_inbox_messages(
+        self, mailbox_id: str, predicate: Optional[Callable[[Message], bool]] = None
+    ) -> list[Message]:
+        self._drop_removed(self.inboxes, self._removed_from_inboxes, mailbox_id)
+        return await super().get_inbox_messages(mailbox_id, predicate)
+
+    async def get_outbox(self, mailbox_id: str) -> list[Message]:
+        self._drop_removed(self.outboxes, self._removed_from_outboxes, mailbox_id)
+        return await super().get_outbox(mailbox_id)
+
+    async def scan_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        self._drop_removed(self.inboxes, self._removed_from_inboxes, mailbox_id)
+        return await super().scan_inbox_counters(mailbox_id)
+
+    def _remove_from_inboxes(self, messages: list[Message]):
+        """
+        removes the messages from the inbox indexes and counters, the inbox lists are only read in full, so rather
+        than rebuilding each affected list during the sweep the messages are marked and dropped on the next read
+        """
+        for message in messages:
+            recipient = message.recipient.mailbox_id
+            self.inbox_indexes[recipient].discard(message.message_id)
+            self.inbox_counters.discard(message.message_id)
+            self._index_message(message)
+            if recipient in self.inboxes:
+                self._removed_from_inboxes[recipient].add(message.message_id)
+
+    def _remove_from_outboxes(self, messages: list[Message]):
+        for message in messages:
+            sender = message.sender.mailbox_id
+            if sender not in self.outboxes:
+                continue
+            self._removed_from_outboxes[sender].add(message.message_id)
+            self.outbox_indexes[sender].discard(message.message_id)
+
+            local_id = message.metadata.local_id
+            if not local_id:
+                continue
+            local_ids = self.local_ids[sender]
+            remaining = [msg for msg in local_ids.get(local_id, []) if msg.message_id != message.message_id]
+            if remaining:
+                local_ids[local_id] = remaining
+            else:
+                local_ids.pop(local_id, None)
+
+    async def _delete_expired(self, messages: list[Message]) -> int:
+        """release the payloads of expired messages, returns the bytes reclaimed"""
+        reclaimed = sum(len(chunk or b"") for message in messages for chunk in self.chunks.pop(message.message_id, []))
+        self.chunk_bytes_in_memory -= reclaimed
+        return reclaimed
+
+    async def expire_messages(self, now: Optional[datetime] = None) -> ExpiryStats:
+        now = naive_utc(now or datetime.utcnow())
+        expired: dict[str, Message] = {}
+        inbox_expired: dict[str, Message] = {}
+        for message_id, kind in self.expiry_queue.pop_due(now):
+            message = self.messages.get(message_id)
+            if message is None:
+                continue
+            if kind == "message":
+                expired[message_id] = message
+            elif not self.inbox_counters.in_inbox(message_id):
+                # still uploading (or not yet added to the inbox), expire it from the inbox once it gets there
+                if message.status in (MessageStatus.UPLOADING, MessageStatus.ACCEPTED):
+                    self.expiry_queue.defer_inbox(message_id)
+            elif self._is_inbox_expired(message, now):
+                inbox_expired[message_id] = message
+
+        uncollected = [message for message_id, message in inbox_expired.items() if message_id not in expired]
+        self._remove_from_inboxes([*uncollected, *expired.values()])
+        self._remove_from_outboxes(list(expired.values()))
+        for message_id in expired:
+            self.inbox_counters.discard(message_id)
+            self.messages.pop(message_id, None)
+
+        swept = ExpiryStats(
+            expired_messages=len(expired),
+            expired_inbox_messages=len(uncollected),
+            reclaimed_bytes=await self._delete_expired(list(expired.values())),
+            sweeps=1,
+            last_sweep=now,
+        )
+
+        # entries for messages removed by a reset are only skipped when they fall due, drop them once they dominate
+        if len(self.expiry_queue) > 4 * len(self.messages) + 1024:
+            self.expiry_queue.retain(lambda message_id: message_id in self.messages)
+
+        swept.pending = len(self.expiry_queue)
+        self.expiry_stats.add(swept)
+        return swept
+
+    async def get_expiry_stats(self) -> ExpiryStats:
+        return replace(self.expiry_stats, pending=len(self.expiry_queue))
@@ -0,0 +1,135 @@
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from ..models.message import Message, MessageStatus
+
+MessagePosition = tuple[datetime, str]
+PositionKey = Callable[[Message], MessagePosition]
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def message_position(message: Message) -> MessagePosition:
+    """sort key for a message, created timestamp (naive utc) with the message id as a tie breaker"""
+    return naive_utc(message.created_timestamp), message.message_id
+
+
+def inbox_position(message: Message) -> MessagePosition:
+    """
+    sort key for the accepted inbox, the time the message was accepted (created timestamp if there is no accepted
+    event) with the message id as a tie breaker, so a message accepted after a page was read sorts after that page
+    """
+    accepted = message.status_timestamp(MessageStatus.ACCEPTED)
+    return naive_utc(accepted or message.created_timestamp), message.message_id
+
+
+# sorts after any character, so (since, MAX_CHAR) sits after every message created at since
+MAX_CHAR = chr(0x10FFFF)
+
+
+def all_of(*predicates: Optional[Callable[[Message], bool]]) -> Callable[[Message], bool]:
+    checks = [predicate for predicate in predicates if predicate]
+    return lambda message: all(check(message) for check in checks)
+
+
+def take_messages(
+    messages: Iterable[Message], predicate: Optional[Callable[[Message], bool]] = None, limit: Optional[int] = None
+) -> list[Message]:
+    """the first limit messages matching the predicate, stops consuming messages once the limit is reached"""
+    taken: list[Message] = []
+    if limit is not None and limit < 1:
+        return taken
+
+    for message in messages:
+        if predicate and not predicate(message):
+            continue
+        taken.append(message)
+        if limit is not None and len(taken) >= limit:
+            break
+    return taken
+
+
+def order_messages(
+    messages: Iterable[Message],
+    after: Optional[MessagePosition] = None,
+    newest_first: bool = False,
+    since: Optional[datetime] = None,
+    position: PositionKey = message_position,
+) -> list[Message]:
+    """
+    sorts a list of messages by position, keeping only those created after since and after the cursor position
+    (in the sort direction)
+    """
+    ordered = sorted(messages, key=position, reverse=newest_first)
+    if since is not None:
+        since = naive_utc(since)
+        ordered = [message for message in ordered if naive_utc(message.created_timestamp) > since]
+    if after is None:
+        return ordered
+    if newest_first:
+        return [message for message in ordered if position(message) < after]
+    return [message for message in ordered if position(message) > after]
+
+
+class OrderedMessageIndex:
+    """
+    messages kept in position order, (created_timestamp, message_id) unless another position key is given,
+    so the first n messages can be read without filtering or sorting the whole mailbox
+    """
+
+    def __init__(self, position: PositionKey = message_position):
+        self._position = position
+        self._positions: list[MessagePosition] = []
+        self._messages: dict[str, tuple[MessagePosition, Message]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self._messages
+
+    def clear(self):
+        self._positions.clear()
+        self._messages.clear()
+
+    def add(self, message: Message):
+        if message.message_id in self._messages:
+            return
+        # the position is kept, so the message is found again even if it has changed since it was added
+        position = self._position(message)
+        self._messages[message.message_id] = position, message
+        insort(self._positions, position)
+
+    def discard(self, message_id: str):
+        entry = self._messages.pop(message_id, None)
+        if entry is None:
+            return
+        position = entry[0]
+        ix = bisect_left(self._positions, position)
+        if ix < len(self._positions) and self._positions[ix] == position:
+            del self._positions[ix]
+
+    def iter_messages(
+        self, after: Optional[MessagePosition] = None, newest_first: bool = False, since: Optional[datetime] = None
+    ) -> Iterator[Message]:
+        """
+        messages in position order created after since, starting after the cursor position (in the direction of
+        iteration), both bounds are found with a binary search so a page costs O(log n + page size)
+        """
+        first = 0 if since is None else bisect_right(self._positions, (naive_utc(since), MAX_CHAR))
+
+        if newest_first:
+            end = len(self._positions) if after is None else bisect_left(self._positions, after)
+            for ix in range(end - 1, first - 1, -1):
+                yield self._messages[self._positions[ix][1]][1]
+            return
+
+        start = first if after is None else max(first, bisect_right(self._positions, after))
+        for ix in range(start, len(self._positions)):
+            yield self._messages[self._positions[ix][1]][1]
@@ -0,0 +1,143 @@
+import asyncio
+import inspect
+import logging
+from collections import deque
+from functools import wraps
+from time import perf_counter
+from typing import Any, Final, Optional, cast
+
+from ..common.metrics import get_metrics
+from .base import Store
+
+# percentiles are worked out from the latest this many calls of each operation
+LATENCY_SAMPLES: Final[int] = 1024
+
+# operations returning the number of payload bytes they handled, rather than the bytes themselves
+_SIZE_RESULT_OPERATIONS: Final[frozenset[str]] = frozenset(("save_chunk_stream",))
+
+
+def _payload_bytes(name: str, args: tuple, kwargs: dict[str, Any], result: Any) -> int:
+    size = sum(len(arg) for arg in (*args, *kwargs.values()) if isinstance(arg, bytes))
+    if isinstance(result, bytes):
+        size += len(result)
+    elif name in _SIZE_RESULT_OPERATIONS and isinstance(result, int):
+        size += result
+    return size
+
+
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.payload_bytes = 0
+        self._latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, elapsed: float, payload_bytes: int, error: bool):
+        self.calls += 1
+        self.errors += int(error)
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        self.payload_bytes += payload_bytes
+        self._latencies.append(elapsed)
+
+    def percentile(self, percent: float) -> float:
+        """nearest rank percentile of the recent calls"""
+        if not self._latencies:
+            return 0.0
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, max(0, round(percent / 100 * len(latencies)) - 1))]
+
+
+class StoreInstrumentation:
+    """per operation call counts, errors, latencies and payload sizes, collected by MeteredStore when enabled"""
+
+    def __init__(self):
+        self.operations: dict[str, OperationStats] = {}
+
+    def record(self, name: str, elapsed: float, payload_bytes: int = 0, error: bool = False):
+        stats = self.operations.get(name)
+        if stats is None:
+            stats = self.operations[name] = OperationStats()
+        stats.record(elapsed, payload_bytes, error)
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{name} calls={stats.calls} errors={stats.errors} p50={stats.percentile(50) * 1000:.2f}ms "
+            f"p99={stats.percentile(99) * 1000:.2f}ms bytes={stats.payload_bytes}"
+            for name, stats in sorted(self.operations.items())
+        )
+
+
+class MeteredStore:
+    """
+    proxies a store, timing every coroutine method call into the store operation latency histogram, and with
+    instrumentation into its per operation stats. the timing wrapper for each method is built on first use and kept,
+    it looks the method up on the wrapped store on each call, so patching the store is still seen
+    """
+
+    def __init__(self, store: Store, instrumentation: Optional[StoreInstrumentation] = None):
+        self._store = store
+        self._instrumentation = instrumentation
+
+    @property
+    def wrapped(self) -> Store:
+        return self._store
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._store, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        timed = self._timed(name, attr)
+        # kept on the instance, so later lookups of the method do not reach __getattr__
+        setattr(self, name, timed)
+        return timed
+
+    def _timed(self, name: str, method: Any) -> Any:
+        labels = (name,)
+        store = self._store
+        instrumentation = self._instrumentation
+
+        if instrumentation is None:
+
+            @wraps(method)
+            async def _timed(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return await getattr(store, name)(*args, **kwargs)
+                finally:
+                    get_metrics().store_seconds.observe(perf_counter() - start, labels)
+
+            return _timed
+
+        @wraps(method)
+        async def _instrumented(*args, **kwargs):
+            start = perf_counter()
+            result = None
+            error = False
+            try:
+                result = await getattr(store, name)(*args, **kwargs)
+                return result
+            except Exception:
+                error = True
+                raise
+            finally:
+                elapsed = perf_counter() - start
+                get_metrics().store_seconds.observe(elapsed, labels)
+                instrumentation.record(name, elapsed, _payload_bytes(name, args, kwargs, result), error)
+
+        return _instrumented
+
+
+def metered(store: Store, instrumentation: Optional[StoreInstrumentation] = None) -> Store:
+    return cast(Store, MeteredStore(store, instrumentation))
+
+
+async def run_store_stats_logger(instrumentation: StoreInstrumentation, interval: float, logger: logging.Logger):
+    """periodically log a summary of the store operation stats, until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        if instrumentation.operations:
+            logger.info("store operations: %s", instrumentation.summary())
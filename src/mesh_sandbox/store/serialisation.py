@@ -1,6 +1,7 @@
 from dataclasses import fields, is_dataclass
 from datetime import date, datetime
-from typing import Any, Optional, TypeVar, cast, get_args, get_origin
+from functools import cache
+from typing import Any, Callable, Optional, TypeVar, cast, get_args, get_origin
 
 _NoneType = type(None)
 
@@ -25,22 +26,22 @@ def is_dataclass_instance(obj) -> bool:
     return is_dataclass(obj) and not isinstance(obj, type)
 
 
-def serialise_value(value) -> Optional[Any]:
+def serialise_value(value, exclude_empty_strings: bool = True) -> Optional[Any]:
     if value is None:
         return None
 
     if is_dataclass_instance(value):
-        class_serialised = serialise_model(value)
+        class_serialised = serialise_model(value, exclude_empty_strings)
         return class_serialised
 
     if isinstance(value, dict):
-        dict_serialised = {k: serialise_value(v) for k, v in value.items()}
+        dict_serialised = {k: serialise_value(v, exclude_empty_strings) for k, v in value.items()}
         return dict_serialised
 
     if isinstance(value, (list, tuple)):
         if not value:
             return None
-        list_serialised = [serialise_value(v) for v in value]
+        list_serialised = [serialise_value(v, exclude_empty_strings) for v in value]
         return list_serialised
 
     if isinstance(value, (date, datetime)):
@@ -52,64 +53,158 @@ def serialise_value(value) -> Optional[Any]:
     return value
 
 
-def serialise_model(model) -> Optional[dict[str, Any]]:
-    if model is None:
+_Encoder = Callable[[Any], Any]
+_Decoder = Callable[[Any], Any]
+
+_PRIMITIVE_TYPES = (str, bytes, bool, int, float)
+
+
+def _value_encoder(field_type, exclude_empty_strings: bool) -> Optional[_Encoder]:
+    """
+    encoder specialised to the declared field type, None where the value is stored as is.
+    values not of the declared type fall back to serialise_value, so the output matches it exactly
+    """
+    field_type = optional_origin_type(field_type)
+
+    if field_type in _PRIMITIVE_TYPES:
         return None
 
-    if not is_dataclass_instance(model):
-        raise TypeError(f"type {type(model)} is not a dataclass")
+    if is_dataclass(field_type):
+        encode_model = _model_encoder(cast(type, field_type), exclude_empty_strings)
+        return lambda value: (
+            encode_model(value) if type(value) is field_type else serialise_value(value, exclude_empty_strings)
+        )
+
+    if field_type in (datetime, date):
+        return lambda value: value.isoformat() if isinstance(value, date) else serialise_value(value)
+
+    origin_type = get_origin(field_type)
+
+    if origin_type == list:
+        encode_item = _value_encoder(get_args(field_type)[0], exclude_empty_strings)
+        if encode_item is None:
+            return lambda value: [*value] if value else None
+        return lambda value: [encode_item(val) for val in value] if value else None
+
+    if origin_type == dict:
+        encode_val = _value_encoder(get_args(field_type)[1], exclude_empty_strings)
+        if encode_val is None:
+            return lambda value: {**value}
+        return lambda value: {key: encode_val(val) for key, val in value.items()}
+
+    return lambda value: serialise_value(value, exclude_empty_strings)
+
+
+@cache
+def _model_encoder(model_type: type, exclude_empty_strings: bool) -> Callable[[Any], dict[str, Any]]:
+    """
+    built once per dataclass type, rather than reflecting over the fields on every call.
+    fields with metadata {"omit_empty": True} are not stored when empty
+    """
+    plan = [
+        (
+            field.name,
+            _value_encoder(field.type, exclude_empty_strings),
+            exclude_empty_strings and field.type == Optional[str],
+            field.metadata.get("omit_empty", False),
+        )
+        for field in fields(model_type)
+    ]
+
+    def encode(model) -> dict[str, Any]:
+        result: dict[str, Any] = {}
+        for name, encode_value, skip_empty_string, omit_empty in plan:
+            value = getattr(model, name)
+            if value is None:
+                # don't store None values.
+                continue
+
+            if skip_empty_string and value == "":
+                continue
 
-    result: dict[str, Any] = {}
+            if omit_empty and not value:
+                continue
 
-    for field in fields(model):
-        value = getattr(model, field.name)
-        if value is None:
-            # don't store None values.
-            continue
+            result[name] = value if encode_value is None else encode_value(value)
 
-        if field.type == Optional[str] and value == "":
-            continue
+        return result
 
-        value = serialise_value(value)
+    return encode
 
-        result[field.name] = value
 
-    return result
+def serialise_model(model, exclude_empty_strings: bool = True) -> Optional[dict[str, Any]]:
+    """
+    exclude_empty_strings: drop empty Optional[str] fields, set False where the serialised form should round trip
+    exactly (empty strings and None are rendered differently in the api views)
+    """
+    if model is None:
+        return None
+
+    if not is_dataclass_instance(model):
+        raise TypeError(f"type {type(model)} is not a dataclass")
+
+    return _model_encoder(cast(Any, type(model)), exclude_empty_strings)(model)
 
 
-# pylint: disable=too-many-return-statements
-def _deserialise_value(field_type, value):
+def _value_decoder(field_type) -> Optional[_Decoder]:
+    """decoder specialised to the declared field type, None where the stored value is used as is"""
     field_type = optional_origin_type(field_type)
 
     if field_type in (str, bytes, bool):
-        return value
+        return None
 
     if is_dataclass(field_type):
-        return deserialise_model(value, field_type)
+        return _model_decoder(cast(type, field_type))
 
     if field_type in (int, float):
-        return field_type(value)
+        return cast(_Decoder, field_type)
 
     if field_type == datetime:
-        return datetime.fromisoformat(value)
+        return datetime.fromisoformat
 
     if field_type == date:
-        return date.fromisoformat(value)
+        return date.fromisoformat
 
     origin_type = get_origin(field_type)
 
     if origin_type == list:
-        item_type = get_args(field_type)[0]
-        return [_deserialise_value(item_type, val) for val in value]
+        decode_item = _value_decoder(get_args(field_type)[0])
+        if decode_item is None:
+            return lambda value: [*value]
+        return lambda value: [decode_item(val) for val in value]
 
     if origin_type == dict:
-        val_type = get_args(field_type)[1]
-        return {key: _deserialise_value(val_type, val) for key, val in value.items()}
+        key_type, val_type = get_args(field_type)
+        decode_key, decode_val = _value_decoder(key_type), _value_decoder(val_type)
+        # json object keys are always strings
+        return lambda value: {
+            (key if decode_key is None else decode_key(key)): (val if decode_val is None else decode_val(val))
+            for key, val in value.items()
+        }
 
     if origin_type == frozenset:
-        return frozenset(val for val in value)
+        return frozenset
 
-    return value
+    return None
+
+
+@cache
+def _model_decoder(model_type: type) -> Callable[[dict[str, Any]], Any]:
+    """built once per dataclass type, rather than reflecting over the fields on every call"""
+    plan = [(field.name, _value_decoder(field.type)) for field in fields(model_type)]
+
+    def decode(model_dict: dict[str, Any]):
+        deserialised: dict[str, Any] = {}
+        for name, decode_value in plan:
+            value = model_dict.get(name)
+            if value is None:
+                continue
+
+            deserialised[name] = value if decode_value is None else decode_value(value)
+
+        return model_type(**deserialised)
+
+    return decode
 
 
 TModel = TypeVar("TModel")  # pylint: disable=invalid-name
@@ -122,14 +217,4 @@ def deserialise_model(model_dict: dict[str, Any], model_type: type[TModel]) -> O
     if not is_dataclass(model_type):
         raise TypeError(f"type {model_type} is not a dataclass")
 
-    model_fields = fields(model_type)
-
-    deserialised: dict[str, Any] = {}
-    for field in model_fields:
-        value = model_dict.get(field.name)
-        if value is None:
-            continue
-
-        deserialised[field.name] = _deserialise_value(field.type, value)
-
-    return model_type(**deserialised)  # type: ignore[return-value]
+    return cast(TModel, _model_decoder(cast(Any, model_type))(model_dict))
@@ -0,0 +1,596 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, TypeVar, cast
+
+from dateutil.relativedelta import relativedelta
+
+from ..common import EnvConfig
+from ..models.mailbox import InboxCounters, Mailbox
+from ..models.message import Message, MessageStatus
+from .base import StoreGauges
+from .canned_store import CannedStore
+from .chunk_stream import ChunkFile, ChunkStream, stat_chunk_file, write_chunk_stream
+from .expiry import ExpiryStats
+from .message_index import MAX_CHAR, MessagePosition, all_of, inbox_position, naive_utc, take_messages
+from .serialisation import deserialise_model, serialise_model
+from .workflow_index import WorkflowFilter
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    status TEXT NOT NULL,
+    workflow_id TEXT NOT NULL,
+    local_id TEXT,
+    created_timestamp TEXT NOT NULL,
+    accepted_timestamp TEXT NOT NULL DEFAULT '',
+    inbox_expiry_timestamp TEXT NOT NULL DEFAULT '',
+    file_size INTEGER NOT NULL DEFAULT 0,
+    in_inbox INTEGER NOT NULL DEFAULT 0,
+    in_outbox INTEGER NOT NULL DEFAULT 0,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_messages_outbox ON messages (sender, created_timestamp, message_id);
+CREATE INDEX IF NOT EXISTS ix_messages_recipient ON messages (recipient, created_timestamp, message_id);
+CREATE INDEX IF NOT EXISTS ix_messages_local_id ON messages (sender, local_id);
+CREATE INDEX IF NOT EXISTS ix_messages_workflow_id ON messages (workflow_id);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    message_id TEXT NOT NULL,
+    chunk_number INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB,
+    path TEXT,
+    PRIMARY KEY (message_id, chunk_number)
+);
+
+CREATE TABLE IF NOT EXISTS inbox_counters (
+    mailbox_id TEXT PRIMARY KEY,
+    accepted INTEGER NOT NULL DEFAULT 0,
+    acknowledged INTEGER NOT NULL DEFAULT 0,
+    uploading INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# the accepted inbox is read in the order messages were accepted, databases created before accepted_timestamp was
+# added get the column backfilled from created_timestamp, and the created order inbox indexes are replaced
+_ACCEPTED_INBOX_INDEXES = """
+DROP INDEX IF EXISTS ix_messages_inbox;
+DROP INDEX IF EXISTS ix_messages_inbox_workflow_id;
+CREATE INDEX IF NOT EXISTS ix_messages_accepted_inbox
+    ON messages (recipient, status, accepted_timestamp, message_id);
+CREATE INDEX IF NOT EXISTS ix_messages_accepted_inbox_workflow_id
+    ON messages (recipient, status, workflow_id, accepted_timestamp, message_id);
+"""
+
+# the expiry sweep finds messages past their message expiry by created timestamp, and uncollected inbox messages
+# by inbox expiry, databases created before inbox_expiry_timestamp was added get the column backfilled
+_EXPIRY_INDEXES = """
+CREATE INDEX IF NOT EXISTS ix_messages_created ON messages (created_timestamp);
+CREATE INDEX IF NOT EXISTS ix_messages_inbox_expiry ON messages (in_inbox, status, inbox_expiry_timestamp);
+"""
+
+
+def _count_message(row: str, sign: str) -> str:
+    """upsert adding (or removing) a message row's contribution to its recipient's inbox counters"""
+    return f"""
+    INSERT INTO inbox_counters (mailbox_id, accepted, acknowledged, uploading, bytes)
+    VALUES (
+        {row}.recipient,
+        {sign}({row}.in_inbox AND {row}.status = '{MessageStatus.ACCEPTED}'),
+        {sign}({row}.in_inbox AND {row}.status = '{MessageStatus.ACKNOWLEDGED}'),
+        {sign}({row}.status = '{MessageStatus.UPLOADING}'),
+        {sign}({row}.in_inbox * {row}.file_size)
+    )
+    ON CONFLICT (mailbox_id) DO UPDATE SET
+        accepted = accepted + excluded.accepted,
+        acknowledged = acknowledged + excluded.acknowledged,
+        uploading = uploading + excluded.uploading,
+        bytes = bytes + excluded.bytes;"""
+
+
+# counters are maintained by triggers, so they stay consistent whichever process writes the message
+_COUNTER_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS tr_messages_insert_counters AFTER INSERT ON messages BEGIN
+{_count_message("NEW", "+")}
+END;
+CREATE TRIGGER IF NOT EXISTS tr_messages_update_counters AFTER UPDATE ON messages BEGIN
+{_count_message("OLD", "-")}
+{_count_message("NEW", "+")}
+END;
+CREATE TRIGGER IF NOT EXISTS tr_messages_delete_counters AFTER DELETE ON messages BEGIN
+{_count_message("OLD", "-")}
+END;
+"""
+
+_UPSERT_MESSAGE = """
+INSERT INTO messages (
+    message_id, recipient, sender, status, workflow_id, local_id, created_timestamp, accepted_timestamp,
+    inbox_expiry_timestamp, file_size, message
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (message_id) DO UPDATE SET
+    recipient = excluded.recipient,
+    sender = excluded.sender,
+    status = excluded.status,
+    workflow_id = excluded.workflow_id,
+    local_id = excluded.local_id,
+    created_timestamp = excluded.created_timestamp,
+    accepted_timestamp = excluded.accepted_timestamp,
+    inbox_expiry_timestamp = excluded.inbox_expiry_timestamp,
+    file_size = excluded.file_size,
+    message = excluded.message
+"""
+
+
+def _sortable_timestamp(timestamp: datetime) -> str:
+    """fixed width utc timestamp, so text ordering in the indexes matches time ordering"""
+    if timestamp.tzinfo:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+def _sortable_inbox_expiry(inbox_expiry: Optional[datetime]) -> str:
+    return _sortable_timestamp(inbox_expiry) if inbox_expiry else ""
+
+
+class SqliteStore(CannedStore):
+    """
+    sqlite backed store, messages are persisted in a single database file (WAL mode) with secondary indexes for the
+    inbox, outbox and local id queries, so memory use does not grow with message volume.
+    no message state is held in process, so the database can be shared by several worker processes.
+    the expiry sweep deletes expired messages and takes uncollected messages out of the inbox with a query per sweep.
+    chunks up to SQLITE_INLINE_CHUNK_BYTES are stored inline, larger chunks are written to files in MAILBOXES_DATA_DIR
+    """
+
+    readonly = False
+    load_messages = False
+
+    def __init__(self, config: EnvConfig, logger: logging.Logger):
+        self._db_path = config.sqlite_path
+        self._inline_chunk_bytes = config.sqlite_inline_chunk_bytes
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(config.sqlite_store_threads, 1), thread_name_prefix="sqlite-store"
+        )
+        self._local = threading.local()
+        self.expiry_stats = ExpiryStats()
+        super().__init__(config, logger)
+
+    def initialise(self):
+        super().initialise()
+        db_dir = os.path.dirname(self._db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # several worker processes may initialise the same database at once, so wait on the database lock
+        with sqlite3.connect(self._db_path, timeout=30) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._add_accepted_timestamp(conn)
+            self._add_inbox_expiry_timestamp(conn)
+            conn.executescript(_ACCEPTED_INBOX_INDEXES)
+            conn.executescript(_EXPIRY_INDEXES)
+            conn.executescript(_COUNTER_TRIGGERS)
+
+    @staticmethod
+    def _add_accepted_timestamp(conn: sqlite3.Connection):
+        # immediate, so only one of several processes initialising the database adds the column
+        conn.execute("BEGIN IMMEDIATE")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if "accepted_timestamp" not in columns:
+            conn.execute("ALTER TABLE messages ADD COLUMN accepted_timestamp TEXT NOT NULL DEFAULT ''")
+            conn.execute("UPDATE messages SET accepted_timestamp = created_timestamp")
+        conn.commit()
+
+    @staticmethod
+    def _add_inbox_expiry_timestamp(conn: sqlite3.Connection):
+        conn.execute("BEGIN IMMEDIATE")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if "inbox_expiry_timestamp" not in columns:
+            conn.execute("ALTER TABLE messages ADD COLUMN inbox_expiry_timestamp TEXT NOT NULL DEFAULT ''")
+            rows = conn.execute(
+                "SELECT message_id, json_extract(message, '$.inbox_expiry_timestamp') FROM messages"
+            ).fetchall()
+            conn.executemany(
+                "UPDATE messages SET inbox_expiry_timestamp = ? WHERE message_id = ?",
+                [
+                    (_sortable_inbox_expiry(datetime.fromisoformat(inbox_expiry) if inbox_expiry else None), message_id)
+                    for message_id, inbox_expiry in rows
+                ],
+            )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return cast(sqlite3.Connection, conn)
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _query(self, sql: str, *params) -> list[tuple]:
+        def _fetch() -> list[tuple]:
+            return self._connection().execute(sql, params).fetchall()
+
+        return await self._run(_fetch)
+
+    async def _execute(self, sql: str, *params):
+        def _write():
+            with self._connection() as conn:
+                conn.execute(sql, params)
+
+        await self._run(_write)
+
+    async def _query_messages(self, sql: str, *params) -> list[Message]:
+        rows = await self._query(sql, *params)
+        return [cast(Message, deserialise_model(json.loads(row[0]), Message)) for row in rows]
+
+    def chunk_path(self, message: Message, chunk_number: int) -> str:
+        return os.path.join(
+            self._mailboxes_data_dir, message.recipient.mailbox_id, "in", message.message_id, str(chunk_number)
+        )
+
+    def get_mailboxes_data_dir(self) -> str:
+        return self._config.mailboxes_dir
+
+    async def get_mailbox(self, mailbox_id: str, accessed: bool = False) -> Optional[Mailbox]:
+        mailbox = self.mailboxes.get(mailbox_id)
+        if not mailbox:
+            return None
+
+        rows = await self._query("SELECT accepted FROM inbox_counters WHERE mailbox_id = ?", mailbox_id)
+        mailbox.inbox_count = rows[0][0] if rows else 0
+        if accessed:
+            mailbox.last_accessed = datetime.utcnow()
+        return mailbox
+
+    async def get_message(self, message_id: str) -> Optional[Message]:
+        messages = await self._query_messages("SELECT message FROM messages WHERE message_id = ?", message_id)
+        return messages[0] if messages else None
+
+    async def save_message(self, message: Message):
+        await self._execute(
+            _UPSERT_MESSAGE,
+            message.message_id,
+            message.recipient.mailbox_id,
+            message.sender.mailbox_id,
+            message.status,
+            message.workflow_id,
+            message.metadata.local_id,
+            _sortable_timestamp(message.created_timestamp),
+            _sortable_timestamp(inbox_position(message)[0]),
+            _sortable_inbox_expiry(message.inbox_expiry_timestamp),
+            message.file_size or 0,
+            json.dumps(serialise_model(message, exclude_empty_strings=False)),
+        )
+
+    async def save_chunk_sizes(self, message: Message):
+        await self._execute(
+            "UPDATE messages SET message = json_set(message, '$.chunk_sizes', json(?)) WHERE message_id = ?",
+            json.dumps(message.chunk_sizes),
+            message.message_id,
+        )
+
+    async def add_to_outbox(self, message: Message):
+        if not message.sender.mailbox_id:
+            return
+        await self._execute("UPDATE messages SET in_outbox = 1 WHERE message_id = ?", message.message_id)
+
+    async def add_to_inbox(self, message: Message):
+        await self._execute("UPDATE messages SET in_inbox = 1 WHERE message_id = ?", message.message_id)
+
+    async def get_chunk(self, message: Message, chunk_number: int) -> Optional[bytes]:
+        def _read() -> Optional[bytes]:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT data, path FROM chunks WHERE message_id = ? AND chunk_number = ?",
+                    (message.message_id, chunk_number),
+                )
+                .fetchone()
+            )
+            if not row:
+                return None
+            data, path = row
+            if path is None:
+                return cast(bytes, data)
+            with open(path, "rb") as f:
+                return f.read()
+
+        return await self._run(_read)
+
+    async def get_chunk_file(self, message: Message, chunk_number: int) -> Optional[ChunkFile]:
+        def _stat() -> Optional[ChunkFile]:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT path FROM chunks WHERE message_id = ? AND chunk_number = ?",
+                    (message.message_id, chunk_number),
+                )
+                .fetchone()
+            )
+            if not row or row[0] is None:
+                return None
+            return stat_chunk_file(row[0])
+
+        return await self._run(_stat)
+
+    async def save_chunk(self, message: Message, chunk_number: int, chunk: Optional[bytes]):
+        path = self.chunk_path(message, chunk_number)
+
+        def _write():
+            if chunk is not None and len(chunk) > self._inline_chunk_bytes:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb+") as f:
+                    f.write(chunk)
+            elif os.path.exists(path):
+                os.remove(path)
+
+            with self._connection() as conn:
+                if chunk is None:
+                    conn.execute(
+                        "DELETE FROM chunks WHERE message_id = ? AND chunk_number = ?",
+                        (message.message_id, chunk_number),
+                    )
+                    return
+
+                inline = len(chunk) <= self._inline_chunk_bytes
+                conn.execute(
+                    "INSERT OR REPLACE INTO chunks (message_id, chunk_number, size, data, path) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        message.message_id,
+                        chunk_number,
+                        len(chunk),
+                        chunk if inline else None,
+                        None if inline else path,
+                    ),
+                )
+
+        await self._run(_write)
+
+    async def save_chunk_stream(self, message: Message, chunk_number: int, stream: ChunkStream) -> int:
+        head = bytearray()
+        async for part in stream:
+            head += part
+            if len(head) > self._inline_chunk_bytes:
+                break
+        else:
+            await self.save_chunk(message, chunk_number, bytes(head))
+            return len(head)
+
+        # too large to store inline, write the rest of the stream straight to the chunk file
+        path = self.chunk_path(message, chunk_number)
+        size = await write_chunk_stream(stream, path, self._run, head=head)
+
+        def _record():
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO chunks (message_id, chunk_number, size, data, path) "
+                    "VALUES (?, ?, ?, NULL, ?)",
+                    (message.message_id, chunk_number, size, path),
+                )
+
+        await self._run(_record)
+        return size
+
+    async def get_file_size(self, message: Message) -> int:
+        rows = await self._query("SELECT COALESCE(SUM(size), 0) FROM chunks WHERE message_id = ?", message.message_id)
+        return cast(int, rows[0][0])
+
+    def _delete_messages(self, where: str, params: tuple[Any, ...]) -> tuple[int, int]:
+        """deletes the matching messages and their chunks, returns the messages and chunk bytes deleted"""
+        message_ids = f"SELECT message_id FROM messages WHERE {where}"
+        with self._connection() as conn:
+            reclaimed = conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM chunks WHERE message_id IN ({message_ids})", params
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT path FROM chunks WHERE path IS NOT NULL AND message_id IN ({message_ids})", params
+            ).fetchall()
+            conn.execute(f"DELETE FROM chunks WHERE message_id IN ({message_ids})", params)
+            deleted = conn.execute(f"DELETE FROM messages WHERE {where}", params).rowcount
+
+        for (path,) in rows:
+            if os.path.exists(path):
+                os.remove(path)
+        return deleted, reclaimed
+
+    async def reset(self):
+        await self._run(self._delete_messages, "1 = 1", ())
+        super().initialise()
+
+    async def expire_messages(self, now: Optional[datetime] = None) -> ExpiryStats:
+        now = naive_utc(now or datetime.utcnow())
+        created_before = _sortable_timestamp(now - relativedelta(days=self.config.message_expiry_days))
+
+        def _expire() -> ExpiryStats:
+            expired, reclaimed = self._delete_messages("created_timestamp <= ?", (created_before,))
+            with self._connection() as conn:
+                uncollected = conn.execute(
+                    "UPDATE messages SET in_inbox = 0 WHERE in_inbox = 1 AND status = ? "
+                    "AND inbox_expiry_timestamp != '' AND inbox_expiry_timestamp <= ?",
+                    (MessageStatus.ACCEPTED, _sortable_timestamp(now)),
+                ).rowcount
+                pending = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            return ExpiryStats(
+                expired_messages=expired,
+                expired_inbox_messages=uncollected,
+                reclaimed_bytes=reclaimed,
+                sweeps=1,
+                pending=pending,
+                last_sweep=now,
+            )
+
+        swept = await self._run(_expire)
+        self.expiry_stats.add(swept)
+        return swept
+
+    async def get_expiry_stats(self) -> ExpiryStats:
+        pending = await self._query("SELECT COUNT(*) FROM messages")
+        return replace(self.expiry_stats, pending=pending[0][0])
+
+    async def reset_mailbox(self, mailbox_id: str):
+        def _reset():
+            with self._connection() as conn:
+                conn.execute("UPDATE messages SET in_inbox = 0 WHERE recipient = ?", (mailbox_id,))
+                conn.execute("UPDATE messages SET in_outbox = 0 WHERE sender = ?", (mailbox_id,))
+            self._delete_messages("in_inbox = 0 AND in_outbox = 0 AND (recipient = ? OR sender = ?)", (mailbox_id,) * 2)
+
+        await self._run(_reset)
+        self.mailboxes[mailbox_id].inbox_count = 0
+
+    async def get_inbox_messages(
+        self, mailbox_id: str, predicate: Optional[Callable[[Message], bool]] = None
+    ) -> list[Message]:
+        messages = await self._query_messages(
+            "SELECT message FROM messages WHERE recipient = ? AND in_inbox = 1 ORDER BY created_timestamp",
+            mailbox_id,
+        )
+        if not predicate:
+            return messages
+        return [m for m in messages if predicate(m)]
+
+    async def _query_messages_page(
+        self,
+        where: str,
+        params: tuple[Any, ...],
+        predicate: Optional[Callable[[Message], bool]],
+        limit: Optional[int],
+        after: Optional[MessagePosition],
+        newest_first: bool = False,
+        since: Optional[datetime] = None,
+        order_by: str = "created_timestamp",
+    ) -> list[Message]:
+        """
+        messages created after since in (order_by, message_id) order starting after the cursor position,
+        both are range constraints on the index so paging does not have to skip over earlier rows
+        """
+        if since is not None:
+            where = f"{where} AND created_timestamp > ?"
+            params = (*params, _sortable_timestamp(since))
+        if after is not None:
+            where = f"{where} AND ({order_by}, message_id) {'<' if newest_first else '>'} (?, ?)"
+            params = (*params, _sortable_timestamp(after[0]), after[1])
+        direction = "DESC" if newest_first else "ASC"
+        sql = f"SELECT message FROM messages WHERE {where} ORDER BY {order_by} {direction}, message_id {direction}"
+
+        if not predicate:
+            if limit is not None:
+                return await self._query_messages(f"{sql} LIMIT ?", *params, limit)
+            return await self._query_messages(sql, *params)
+
+        def _fetch_matching() -> list[Message]:
+            # rows are read from the index in order and only deserialised until the page is full
+            rows = self._connection().execute(sql, params)
+            messages = (cast(Message, deserialise_model(json.loads(row), Message)) for (row,) in rows)
+            return take_messages(messages, predicate, limit)
+
+        return await self._run(_fetch_matching)
+
+    async def get_accepted_inbox_messages(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        workflow_filter: Optional[WorkflowFilter] = None,
+    ) -> list[Message]:
+        where = "recipient = ? AND status = ? AND in_inbox = 1"
+        params: tuple[Any, ...] = (mailbox_id, MessageStatus.ACCEPTED)
+        if workflow_filter and workflow_filter.indexed and workflow_filter.match == "exact":
+            where = f"{where} AND workflow_id = ?"
+            params = (*params, workflow_filter.value)
+        elif workflow_filter and workflow_filter.indexed:
+            where = f"{where} AND workflow_id >= ? AND workflow_id < ?"
+            params = (*params, workflow_filter.value, workflow_filter.value + MAX_CHAR)
+        elif workflow_filter:
+            predicate = all_of(workflow_filter.matches, predicate)
+
+        return await self._query_messages_page(where, params, predicate, limit, after, order_by="accepted_timestamp")
+
+    async def get_inbox_range(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        newest_first: bool = False,
+        since: Optional[datetime] = None,
+    ) -> list[Message]:
+        return await self._query_messages_page(
+            "recipient = ? AND in_inbox = 1", (mailbox_id,), predicate, limit, after, newest_first, since
+        )
+
+    async def get_outbox_range(
+        self,
+        mailbox_id: str,
+        predicate: Optional[Callable[[Message], bool]] = None,
+        limit: Optional[int] = None,
+        after: Optional[MessagePosition] = None,
+        since: Optional[datetime] = None,
+    ) -> list[Message]:
+        return await self._query_messages_page(
+            "sender = ? AND in_outbox = 1", (mailbox_id,), predicate, limit, after, newest_first=True, since=since
+        )
+
+    async def get_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        rows = await self._query(
+            "SELECT accepted, acknowledged, uploading, bytes FROM inbox_counters WHERE mailbox_id = ?", mailbox_id
+        )
+        return InboxCounters(*rows[0]) if rows else InboxCounters()
+
+    async def get_gauges(self) -> StoreGauges:
+        totals = await self._query(
+            "SELECT COALESCE(SUM(accepted), 0), COALESCE(SUM(acknowledged), 0), COALESCE(SUM(uploading), 0), "
+            "COALESCE(SUM(bytes), 0) FROM inbox_counters"
+        )
+        messages = await self._query("SELECT COUNT(*) FROM messages")
+        return StoreGauges(messages=messages[0][0], inbox=InboxCounters(*totals[0]))
+
+    async def scan_inbox_counters(self, mailbox_id: str) -> InboxCounters:
+        rows = await self._query(
+            "SELECT "
+            "COALESCE(SUM(in_inbox AND status = ?), 0), "
+            "COALESCE(SUM(in_inbox AND status = ?), 0), "
+            "COALESCE(SUM(status = ?), 0), "
+            "COALESCE(SUM(in_inbox * file_size), 0) "
+            "FROM messages WHERE recipient = ?",
+            MessageStatus.ACCEPTED,
+            MessageStatus.ACKNOWLEDGED,
+            MessageStatus.UPLOADING,
+            mailbox_id,
+        )
+        return InboxCounters(*rows[0])
+
+    async def get_outbox(self, mailbox_id: str) -> list[Message]:
+        return await self._query_messages(
+            "SELECT message FROM messages WHERE sender = ? AND in_outbox = 1 ORDER BY created_timestamp DESC",
+            mailbox_id,
+        )
+
+    async def is_in_outbox(self, mailbox_id: str, message_id: str) -> bool:
+        rows = await self._query(
+            "SELECT 1 FROM messages WHERE message_id = ? AND sender = ? AND in_outbox = 1", message_id, mailbox_id
+        )
+        return bool(rows)
+
+    async def get_by_local_id(self, mailbox_id: str, local_id: str) -> list[Message]:
+        return await self._query_messages(
+            "SELECT message FROM messages WHERE sender = ? AND local_id = ? AND in_outbox = 1 "
+            "ORDER BY created_timestamp DESC",
+            mailbox_id,
+            local_id,
+        )
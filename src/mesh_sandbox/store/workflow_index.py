@@ -0,0 +1,106 @@
+from bisect import bisect_left, insort
+from collections.abc import Iterator
+from heapq import merge
+from typing import Literal, NamedTuple, Optional
+
+from ..models.message import Message
+from .message_index import MAX_CHAR, MessagePosition, OrderedMessageIndex, PositionKey, message_position
+
+WorkflowMatch = Literal["exact", "begins_with", "contains"]
+
+
+class WorkflowFilter(NamedTuple):
+    """
+    parsed inbox workflow_filter, e.g. WORKFLOW (exact), PATH_* (begins with), *_ACK* (contains),
+    any of which can be negated with a leading !
+    """
+
+    match: WorkflowMatch
+    value: str
+    negate: bool = False
+
+    @classmethod
+    def parse(cls, workflow_filter: Optional[str]) -> Optional["WorkflowFilter"]:
+        workflow_id_filter = (workflow_filter or "").strip()
+        if not workflow_id_filter:
+            return None
+
+        is_not = workflow_id_filter.startswith("!")
+        if is_not:
+            workflow_id_filter = workflow_id_filter[1:]
+
+        is_contains = workflow_id_filter.startswith("*")
+        if is_contains:
+            workflow_id_filter = workflow_id_filter[1:-1]
+
+        if workflow_id_filter.endswith("*"):
+            return cls("begins_with", workflow_id_filter[:-1], is_not)
+
+        return cls("contains" if is_contains else "exact", workflow_id_filter, is_not)
+
+    @property
+    def indexed(self) -> bool:
+        """exact and begins with matches can be served from a workflow index, everything else needs a scan"""
+        return not self.negate and self.match != "contains"
+
+    def matches(self, message: Message) -> bool:
+        workflow_id = message.workflow_id
+        if self.match == "exact":
+            matched = workflow_id == self.value
+        elif self.match == "begins_with":
+            matched = workflow_id.startswith(self.value)
+        else:
+            matched = self.value in workflow_id
+        return matched != self.negate
+
+
+class WorkflowIndex:
+    """
+    messages grouped by workflow id (each group kept in position order) with the workflow ids kept sorted,
+    so an exact match is a dict lookup and a prefix match is a range of workflow ids merged in position order
+    """
+
+    def __init__(self, position: PositionKey = message_position):
+        self._position = position
+        self._by_workflow: dict[str, OrderedMessageIndex] = {}
+        self._workflow_ids: list[str] = []
+
+    def clear(self):
+        self._by_workflow.clear()
+        self._workflow_ids.clear()
+
+    def add(self, message: Message):
+        index = self._by_workflow.get(message.workflow_id)
+        if index is None:
+            index = self._by_workflow[message.workflow_id] = OrderedMessageIndex(self._position)
+            insort(self._workflow_ids, message.workflow_id)
+        index.add(message)
+
+    def discard(self, message: Message):
+        index = self._by_workflow.get(message.workflow_id)
+        if index is None:
+            return
+        index.discard(message.message_id)
+        if len(index):
+            return
+        del self._by_workflow[message.workflow_id]
+        del self._workflow_ids[bisect_left(self._workflow_ids, message.workflow_id)]
+
+    def _matching_workflows(self, workflow_filter: WorkflowFilter) -> list[OrderedMessageIndex]:
+        if workflow_filter.match == "exact":
+            index = self._by_workflow.get(workflow_filter.value)
+            return [index] if index is not None else []
+
+        start = bisect_left(self._workflow_ids, workflow_filter.value)
+        end = bisect_left(self._workflow_ids, workflow_filter.value + MAX_CHAR, lo=start)
+        return [self._by_workflow[workflow_id] for workflow_id in self._workflow_ids[start:end]]
+
+    def iter_messages(
+        self, workflow_filter: WorkflowFilter, after: Optional[MessagePosition] = None
+    ) -> Iterator[Message]:
+        """messages matching an indexed workflow filter in position order, starting after the cursor position"""
+        assert workflow_filter.indexed
+        indexes = self._matching_workflows(workflow_filter)
+        if len(indexes) == 1:
+            return indexes[0].iter_messages(after)
+        return merge(*(index.iter_messages(after) for index in indexes), key=self._position)
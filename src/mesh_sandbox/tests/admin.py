@@ -1,6 +1,7 @@
 import os
 import shutil
 from datetime import datetime, timedelta
+from typing import Any, ClassVar, Optional
 from uuid import uuid4
 
 import pytest
@@ -17,6 +18,7 @@ from mesh_sandbox.tests.mesh_api_helpers import (
 )
 
 from ..common.constants import Headers
+from ..dependencies import get_messaging
 from ..models.message import MessageStatus, MessageType
 from ..views.admin import AddMessageEventRequest, CreateReportRequest
 from .helpers import generate_auth_token, temp_env_vars
@@ -447,3 +449,84 @@ def test_get_message_report_type(app: TestClient, root_path: str):
 def test_get_message_not_found(app: TestClient, root_path: str):
     res = app.get(f"{root_path}/notfound")
     assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+def _assert_inbox_counters(app: TestClient, mailbox_id: str, **expected: int):
+    res = app.get(f"/messageexchange/admin/mailbox/{mailbox_id}/counters?verify=true")
+    assert res.status_code == status.HTTP_200_OK
+    counters = res.json()
+    assert counters["consistent"] is True, counters
+    assert {key: counters[key] for key in expected} == expected
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+def test_inbox_counters_track_message_lifecycle(app: TestClient, store_mode: str, tmp_path: str):
+    sender, recipient = _CANNED_MAILBOX1, _CANNED_MAILBOX2
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        _assert_inbox_counters(app, recipient, accepted=0, acknowledged=0, uploading=0, bytes=0)
+
+        first = mesh_api_send_message_and_return_message_id(app, sender, recipient, message_data=b"12345")
+        second = mesh_api_send_message_and_return_message_id(app, sender, recipient, message_data=b"123")
+        _assert_inbox_counters(app, recipient, accepted=2, acknowledged=0, uploading=0, bytes=8)
+
+        res = app.post(
+            f"/messageexchange/{sender}/outbox",
+            headers={
+                Headers.Mex_From: sender,
+                Headers.Mex_To: recipient,
+                Headers.Mex_WorkflowID: "TEST_WORKFLOW",
+                Headers.Mex_Chunk_Range: "1:2",
+                Headers.Authorization: generate_auth_token(sender),
+            },
+            content=b"chunk1",
+        )
+        assert res.status_code == status.HTTP_202_ACCEPTED
+        _assert_inbox_counters(app, recipient, accepted=2, uploading=1)
+        chunked = res.json()["messageID"]
+
+        res = app.post(
+            f"/messageexchange/{sender}/outbox/{chunked}/2",
+            headers={Headers.Authorization: generate_auth_token(sender), Headers.Mex_Chunk_Range: "2:2"},
+            content=b"chunk2",
+        )
+        assert res.status_code == status.HTTP_202_ACCEPTED
+        _assert_inbox_counters(app, recipient, accepted=3, uploading=0)
+
+        res = app.put(
+            f"/messageexchange/{recipient}/inbox/{first}/status/acknowledged",
+            headers={Headers.Authorization: generate_auth_token(recipient)},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        _assert_inbox_counters(app, recipient, accepted=2, acknowledged=1)
+        assert mesh_api_get_inbox_size(app, recipient) == 2
+
+        res = app.post(
+            f"/messageexchange/admin/message/{second}/event",
+            json=AddMessageEventRequest(status=MessageStatus.ERROR, code="1", description="failed").model_dump(),
+        )
+        assert res.status_code == status.HTTP_200_OK
+        _assert_inbox_counters(app, recipient, accepted=1, acknowledged=1)
+
+        res = app.delete(f"/messageexchange/admin/reset/{recipient}")
+        assert res.status_code == status.HTTP_200_OK
+        _assert_inbox_counters(app, recipient, accepted=0, acknowledged=0, uploading=0, bytes=0)
+
+
+def test_plugin_stats(app: TestClient):
+    class CountingPlugin:
+        triggers: ClassVar[list[str]] = ["before_send_message"]
+
+        async def on_event(self, event: str, args: dict[str, Any], exception: Optional[Exception] = None):
+            pass
+
+    with temp_env_vars(STORE_MODE="memory"):
+        get_messaging().register_plugin(CountingPlugin)
+        mesh_api_send_message_and_return_message_id(app, _CANNED_MAILBOX1, _CANNED_MAILBOX2)
+
+        res = app.get("/messageexchange/admin/plugins")
+        assert res.status_code == status.HTTP_200_OK
+        details = res.json()
+        assert details["drop_policy"] == "drop_newest"
+        assert details["dropped"] == 0
+        assert details["plugins"]["CountingPlugin"]["calls"] == 1
+        assert details["plugins"]["CountingPlugin"]["failures"] == 0
@@ -0,0 +1,39 @@
+import httpx
+import pytest
+
+from ..api import app
+from ..bench import Bench, BenchOptions, OperationTimings
+
+
+def test_operation_timings_percentiles():
+    timings = OperationTimings()
+    timings.samples.extend(millis / 1000 for millis in range(100, 0, -1))
+
+    assert timings.percentile(50) == 0.05
+    assert timings.percentile(99) == 0.099
+    assert OperationTimings().percentile(50) == 0.0
+
+
+@pytest.mark.parametrize("gzip", [False, True])
+async def test_bench_delivers_every_message(gzip: bool):
+    options = BenchOptions(
+        senders=2, receivers=3, message_bytes=3000, chunks=3, gzip=gzip, poll_seconds=0.01, messages=3, drain_seconds=10
+    )
+    # startup creates the store, rather than the first of the concurrent requests racing to
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            results = await Bench(client, options).run()
+    finally:
+        await app.router.shutdown()
+
+    summary = results.summary()
+    assert summary["sent"] == summary["acknowledged"] == 6
+    assert results.payload_bytes == 6 * 3000
+    for operation in ("send", "download", "acknowledge", "end_to_end"):
+        assert summary["operations"][operation]["count"] == 6
+    assert summary["operations"]["send_chunk"]["count"] == 12
+    assert summary["operations"]["download_chunk"]["count"] == 12
+    assert not any(operation["errors"] for operation in summary["operations"].values())
+    assert "6 of 6 messages delivered" in results.report()
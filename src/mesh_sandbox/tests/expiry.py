@@ -0,0 +1,203 @@
+import os
+from datetime import datetime, timedelta
+from typing import cast
+from uuid import uuid4
+
+import pytest
+from fastapi import BackgroundTasks, status
+from fastapi.testclient import TestClient
+
+from ..dependencies import get_messaging, get_store
+from ..models.message import Message, MessageEvent, MessageMetadata, MessageParty, MessageStatus
+from ..store.expiry import ExpiryQueue, ExpiryStats
+from ..store.file_store import FileStore
+from ..store.memory_store import MemoryStore
+from . import _CANNED_MAILBOX1, _CANNED_MAILBOX2
+from .helpers import temp_env_vars
+from .mesh_api_helpers import mesh_api_get_inbox_size, mesh_api_send_message_and_return_message_id
+
+
+def _create_message(created: datetime, local_id: str = "") -> Message:
+    return Message(
+        message_id=uuid4().hex.upper(),
+        sender=MessageParty(mailbox_id=_CANNED_MAILBOX1),
+        recipient=MessageParty(mailbox_id=_CANNED_MAILBOX2),
+        created_timestamp=created,
+        inbox_expiry_timestamp=created + timedelta(days=5),
+        total_chunks=1,
+        metadata=MessageMetadata(local_id=local_id),
+    )
+
+
+async def _send(store: MemoryStore, message: Message, chunk: bytes):
+    await store.save_message(message)
+    await store.save_chunk(message, 1, chunk)
+    await store.add_to_outbox(message)
+    await store.add_to_inbox(message)
+
+
+def test_expiry_queue_pops_due_entries_in_expiry_order():
+    now = datetime.utcnow()
+    queue = ExpiryQueue()
+    queue.schedule("LATER", now + timedelta(days=2), inbox_expiry=now + timedelta(hours=2))
+    queue.schedule("SOONER", now + timedelta(days=1))
+    queue.schedule("SOONER", now)
+
+    assert len(queue) == 3
+    assert not list(queue.pop_due(now))
+    assert list(queue.pop_due(now + timedelta(days=1))) == [("LATER", "inbox"), ("SOONER", "message")]
+    assert "SOONER" not in queue
+    assert "LATER" in queue
+    assert queue.next_expiry() == now + timedelta(days=2)
+
+    queue.retain(lambda message_id: message_id != "LATER")
+    assert len(queue) == 0
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file"])
+async def test_expire_messages_removes_expired_messages(store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(MemoryStore, get_store())
+        now = datetime.utcnow()
+        old = _create_message(now - timedelta(days=29), local_id="old")
+        new = _create_message(now, local_id="new")
+        await _send(store, old, os.urandom(100))
+        await _send(store, new, os.urandom(10))
+
+        assert (await store.expire_messages(now)).expired_messages == 0
+
+        swept = await store.expire_messages(now + timedelta(days=2))
+        assert swept.expired_messages == 1
+        assert swept.reclaimed_bytes >= 100
+
+        assert await store.get_message(old.message_id) is None
+        assert [msg.message_id for msg in await store.get_inbox_messages(_CANNED_MAILBOX2)] == [new.message_id]
+        assert [msg.message_id for msg in await store.get_outbox(_CANNED_MAILBOX1)] == [new.message_id]
+        assert not await store.is_in_outbox(_CANNED_MAILBOX1, old.message_id)
+        assert await store.get_by_local_id(_CANNED_MAILBOX1, "old") == []
+        assert old.message_id not in store.chunks
+        assert (await store.get_inbox_counters(_CANNED_MAILBOX2)).accepted == 1
+        if isinstance(store, FileStore):
+            assert not os.path.exists(f"{store.message_path(old)}.json")
+            assert not os.path.exists(store.message_path(old))
+            assert os.path.exists(f"{store.message_path(new)}.json")
+
+        totals = await store.get_expiry_stats()
+        assert (totals.sweeps, totals.expired_messages, totals.pending) == (2, 1, 2)
+
+
+async def test_chunk_bytes_in_memory_follow_saved_and_expired_chunks():
+    with temp_env_vars(STORE_MODE="memory"):
+        store = cast(MemoryStore, get_store())
+        now = datetime.utcnow()
+        old, new = _create_message(now - timedelta(days=29)), _create_message(now)
+        await _send(store, old, os.urandom(100))
+        await _send(store, new, os.urandom(10))
+        assert (await store.get_gauges()).chunk_bytes_in_memory == 110
+
+        # a chunk uploaded again replaces the bytes held for it
+        await store.save_chunk(new, 1, os.urandom(20))
+        assert (await store.get_gauges()).chunk_bytes_in_memory == 120
+
+        await store.expire_messages(now + timedelta(days=2))
+        assert (await store.get_gauges()).chunk_bytes_in_memory == 20
+
+        await store.reset()
+        assert (await store.get_gauges()).chunk_bytes_in_memory == 0
+
+
+async def test_expire_messages_drops_expired_messages_from_the_mailbox_lists_when_next_read():
+    with temp_env_vars(STORE_MODE="memory"):
+        store = cast(MemoryStore, get_store())
+        now = datetime.utcnow()
+        old, new = _create_message(now - timedelta(days=29)), _create_message(now)
+        await _send(store, old, b"old")
+        await _send(store, new, b"new")
+
+        await store.expire_messages(now + timedelta(days=2))
+
+        # the sweep only marks the lists, they are not rebuilt until they are read
+        assert [msg.message_id for msg in store.inboxes[_CANNED_MAILBOX2]] == [old.message_id, new.message_id]
+        assert [msg.message_id for msg in await store.get_inbox_messages(_CANNED_MAILBOX2)] == [new.message_id]
+        assert [msg.message_id for msg in await store.get_outbox(_CANNED_MAILBOX1)] == [new.message_id]
+        assert [msg.message_id for msg in store.inboxes[_CANNED_MAILBOX2]] == [new.message_id]
+
+
+def test_expiry_stats_add_keeps_the_latest_pending():
+    totals = ExpiryStats(pending=5)
+    totals.add(ExpiryStats(expired_messages=1, sweeps=1, pending=2))
+    assert (totals.expired_messages, totals.sweeps, totals.pending) == (1, 1, 2)
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file"])
+async def test_expire_messages_removes_uncollected_messages_from_inbox(store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(MemoryStore, get_store())
+        messaging = get_messaging()
+        now = datetime.utcnow()
+        uncollected, collected = _create_message(now - timedelta(days=6)), _create_message(now - timedelta(days=6))
+        await _send(store, uncollected, b"uncollected")
+        await _send(store, collected, b"collected")
+        await messaging.acknowledge_message(message=collected, background_tasks=BackgroundTasks())
+
+        swept = await store.expire_messages(now)
+        assert (swept.expired_messages, swept.expired_inbox_messages, swept.reclaimed_bytes) == (0, 1, 0)
+
+        assert await store.get_accepted_inbox_messages(_CANNED_MAILBOX2) == []
+        assert [msg.message_id for msg in await store.get_inbox_messages(_CANNED_MAILBOX2)] == [collected.message_id]
+        assert (await store.get_inbox_counters(_CANNED_MAILBOX2)).accepted == 0
+        # the sender can still track the message until it expires
+        assert await store.get_message(uncollected.message_id) is uncollected
+        assert await store.is_in_outbox(_CANNED_MAILBOX1, uncollected.message_id)
+
+        if store_mode == "file":
+            await store.reset()
+            accepted = await store.get_accepted_inbox_messages(_CANNED_MAILBOX2)
+            assert uncollected.message_id not in [msg.message_id for msg in accepted]
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file"])
+async def test_expire_messages_accepted_after_inbox_expiry_removed_from_inbox(store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(MemoryStore, get_store())
+        now = datetime.utcnow()
+        slow = _create_message(now - timedelta(days=6))
+        slow.events.insert(0, MessageEvent(status=MessageStatus.UPLOADING))
+        await store.save_message(slow)
+        await store.save_chunk(slow, 1, b"slow")
+
+        # the inbox expiry falls due while the message is still uploading
+        swept = await store.expire_messages(now)
+        assert (swept.expired_messages, swept.expired_inbox_messages) == (0, 0)
+
+        slow.events.insert(0, MessageEvent(status=MessageStatus.ACCEPTED))
+        await store.save_message(slow)
+        await store.add_to_outbox(slow)
+        await store.add_to_inbox(slow)
+        assert (await store.get_inbox_counters(_CANNED_MAILBOX2)).accepted == 1
+
+        swept = await store.expire_messages(now)
+        assert (swept.expired_messages, swept.expired_inbox_messages) == (0, 1)
+        assert await store.get_accepted_inbox_messages(_CANNED_MAILBOX2) == []
+        assert await store.get_message(slow.message_id) is slow
+
+
+def test_admin_expiry_endpoints(app: TestClient):
+    with temp_env_vars(STORE_MODE="memory"):
+        mesh_api_send_message_and_return_message_id(app, _CANNED_MAILBOX1, _CANNED_MAILBOX2)
+        assert mesh_api_get_inbox_size(app, _CANNED_MAILBOX2) == 1
+
+        res = app.post("/messageexchange/admin/expiry")
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["expired_messages"] == 0
+        assert res.json()["sweeps"] == 1
+
+        res = app.get("/admin/expiry")
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["sweeps"] == 1
+        assert res.json()["pending"] == 2
+
+
+def test_admin_expire_messages_canned_store_not_allowed(app: TestClient):
+    with temp_env_vars(STORE_MODE="canned"):
+        assert app.post("/admin/expiry").status_code == status.HTTP_405_METHOD_NOT_ALLOWED
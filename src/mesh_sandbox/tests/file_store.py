@@ -0,0 +1,421 @@
+import asyncio
+import json
+import os
+from typing import Optional, cast
+from uuid import uuid4
+
+import pytest
+from fastapi import BackgroundTasks
+
+from ..dependencies import get_env_config, get_logger, get_messaging, get_store
+from ..models.message import Message, MessageEvent, MessageParty, MessageStatus
+from ..store import file_store
+from ..store.canned_store import CannedStore
+from ..store.file_index import FileStoreIndex, apply_delta, journal_delta, message_digest
+from ..store.file_store import FileStore
+from . import _CANNED_MAILBOX1, _CANNED_MAILBOX2
+from .helpers import temp_env_vars
+
+
+def _create_message(total_chunks: int = 3) -> Message:
+    return Message(
+        message_id=uuid4().hex.upper(),
+        sender=MessageParty(mailbox_id=_CANNED_MAILBOX1),
+        recipient=MessageParty(mailbox_id=_CANNED_MAILBOX2),
+        total_chunks=total_chunks,
+    )
+
+
+async def test_file_store_executor_uses_configured_pool_size(tmp_path: str):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path, FILE_STORE_THREADS=2):
+        store = cast(FileStore, get_store())
+        assert store._executor._max_workers == 2  # pylint: disable=protected-access
+
+
+async def test_file_store_concurrent_writes_to_same_chunk_are_applied_in_order(tmp_path: str):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path, FILE_STORE_THREADS=8):
+        store = get_store()
+        message = _create_message()
+
+        payloads = [os.urandom(64 * 1024) for _ in range(20)]
+        await asyncio.gather(*[store.save_chunk(message, 1, payload) for payload in payloads])
+
+        assert await store.get_chunk(message, 1) == payloads[-1]
+
+
+async def test_file_store_close_shuts_down_the_executor(tmp_path: str):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        await store.save_message(_create_message())
+        await store.close()
+
+        with pytest.raises(RuntimeError, match="shutdown"):
+            store._executor.submit(print)  # pylint: disable=protected-access
+
+
+async def test_file_store_io_round_trip(tmp_path: str):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        message = _create_message()
+
+        chunks = [os.urandom(1024 * (chunk_no + 1)) for chunk_no in range(message.total_chunks)]
+        await asyncio.gather(
+            *[store.save_chunk(message, chunk_no + 1, chunk) for chunk_no, chunk in enumerate(chunks)],
+            store.save_message(message),
+        )
+
+        assert os.path.exists(f"{store.message_path(message)}.json")
+        assert await store.get_file_size(message) == sum(len(chunk) for chunk in chunks)
+        assert await store.get_chunk(message, 2) == chunks[1]
+        assert await store.get_chunk(message, message.total_chunks + 1) is None
+
+        await store.save_chunk(message, 2, None)
+        assert await store.get_chunk(message, 2) is None
+
+
+async def test_file_store_restarts_from_index_without_scanning_message_files(tmp_path: str, monkeypatch):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        message = _create_message(total_chunks=1)
+        await store.save_message(message)
+        await store.add_to_inbox(message)
+        assert os.path.exists(store.index.path)
+
+        def _no_scan(_self):
+            raise AssertionError("should load from the index")
+
+        monkeypatch.setattr(CannedStore, "_load_messages", _no_scan)
+
+        restarted = FileStore(get_env_config(), get_logger())
+        loaded = await restarted.get_message(message.message_id)
+        assert loaded
+        assert loaded.workflow_id == message.workflow_id
+        assert [msg.message_id for msg in await restarted.get_inbox_messages(_CANNED_MAILBOX2)] == [message.message_id]
+
+
+async def test_file_store_rescans_when_index_is_corrupt(tmp_path: str):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        message = _create_message(total_chunks=1)
+        await store.save_message(message)
+
+        with open(store.index.path, "ab") as f:
+            f.write(b'{"message_id": "trunc')
+
+        restarted = FileStore(get_env_config(), get_logger())
+        assert await restarted.get_message(message.message_id)
+        assert restarted.index.replay() is not None
+
+
+async def test_file_store_recovers_from_a_corrupt_record_mid_journal(tmp_path: str):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        messaging = get_messaging()
+        acked, uploading = _create_message(total_chunks=1), _create_message(total_chunks=2)
+        for message in (acked, uploading):
+            await store.save_message(message)
+            await store.add_to_inbox(message)
+        await messaging.acknowledge_message(message=acked, background_tasks=BackgroundTasks())
+        uploading.chunk_sizes[1] = 10
+        await store.save_chunk_sizes(uploading)
+        await store.close()
+
+        with open(store.index.path, "rb") as f:
+            lines = f.readlines()
+        assert len(lines) == 4
+        # corrupt the full record of the second message, its json snapshot does not have the later delta
+        lines[1] = b"\0" * (len(lines[1]) - 1) + b"\n"
+        with open(store.index.path, "wb") as f:
+            f.writelines(lines)
+
+        restarted = FileStore(get_env_config(), get_logger())
+        reloaded_acked = await restarted.get_message(acked.message_id)
+        assert reloaded_acked
+        assert reloaded_acked.status == MessageStatus.ACKNOWLEDGED
+        reloaded_uploading = await restarted.get_message(uploading.message_id)
+        assert reloaded_uploading
+        assert reloaded_uploading.chunk_sizes == {1: 10}
+
+        # the journal is rewritten without the corrupt record, and the snapshots brought up to date
+        journal = restarted.index.replay()
+        assert journal
+        assert (journal.skipped, set(journal.records)) == (0, {acked.message_id, uploading.message_id})
+        with open(f"{store.message_path(acked)}.json", encoding="utf-8") as f:
+            assert len(json.load(f)["events"]) == 2
+
+
+async def test_file_store_index_compacts_superseded_records(tmp_path: str):
+    index = FileStoreIndex(str(tmp_path), compact_min_records=10)
+    for version in range(25):
+        index.append({"message_id": "MSG1", "version": version})
+        index.append({"message_id": "MSG2", "version": version})
+
+    # compaction is left to the caller
+    assert index.compaction_due
+    index.compact()
+    assert not index.compaction_due
+
+    with open(index.path, "rb") as f:
+        assert len(f.readlines()) == 2
+
+    journal = index.replay()
+    assert journal
+    assert journal.records["MSG1"]["version"] == 24
+    assert journal.records["MSG2"]["version"] == 24
+
+
+def test_file_store_index_compaction_not_due_again_after_skipping_corrupt_records(tmp_path: str):
+    index = FileStoreIndex(str(tmp_path), compact_min_records=3)
+    index.append({"message_id": "MSG1", "version": 0})
+    index.close()
+    with open(index.path, "ab") as journal_file:
+        journal_file.write(b"\0" * 10 + b"\n")
+    for version in range(1, 5):
+        index.append({"message_id": "MSG1", "version": version})
+
+    assert index.compaction_due
+    index.compact()
+    # the corrupt journal is left for the next startup to recover, rather than read again after every append
+    assert not index.compaction_due
+    index.append({"message_id": "MSG1", "version": 5})
+    assert not index.compaction_due
+    with open(index.path, "rb") as journal_file:
+        assert len(journal_file.readlines()) == 7
+
+    journal = index.replay()
+    assert journal
+    assert journal.skipped == 1
+    assert index.compaction_due
+
+
+async def test_file_store_index_keeps_records_appended_while_compacting(tmp_path: str, monkeypatch):
+    index = FileStoreIndex(str(tmp_path))
+    index.record({"message_id": "MSG1", "recipient": {"mailbox_id": "MB1"}, "file_size": 1})
+    index.record({"message_id": "MSG1", "recipient": {"mailbox_id": "MB1"}, "file_size": 2})
+
+    read = index._read  # pylint: disable=protected-access
+
+    def _read_then_append(limit: Optional[int] = None):
+        journal = read(limit)
+        # the lock is not held while the journal is read, so saves carry on
+        index.record({"message_id": "MSG1", "recipient": {"mailbox_id": "MB1"}, "file_size": 3})
+        index.record({"message_id": "MSG2", "recipient": {"mailbox_id": "MB1"}, "file_size": 1})
+        return journal
+
+    monkeypatch.setattr(index, "_read", _read_then_append)
+    index.compact()
+    monkeypatch.undo()
+
+    with open(index.path, "rb") as journal_file:
+        assert len(journal_file.readlines()) == 3
+    with open(index.snapshot_path({"message_id": "MSG1", "recipient": {"mailbox_id": "MB1"}}), encoding="utf-8") as f:
+        assert json.load(f)["file_size"] == 2
+
+    journal = index.replay()
+    assert journal
+    assert journal.records["MSG1"]["file_size"] == 3
+    assert journal.records["MSG2"]["file_size"] == 1
+    assert journal.dirty == {"MSG1"}
+
+
+async def test_file_store_compacts_the_index_in_the_background(tmp_path: str, monkeypatch):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        monkeypatch.setattr(store.index, "_compact_min_records", 3)
+        message = _create_message(total_chunks=3)
+        await store.save_message(message)
+        for chunk_number in range(1, 4):
+            message.chunk_sizes[chunk_number] = chunk_number
+            await store.save_chunk_sizes(message)
+
+        await store.close()
+        with open(store.index.path, "rb") as f:
+            assert len(f.readlines()) == 1
+        with open(f"{store.message_path(message)}.json", encoding="utf-8") as f:
+            assert json.load(f)["chunk_sizes"] == {"1": 1, "2": 2, "3": 3}
+
+
+async def _stream(parts: list[bytes], fail: bool = False):
+    for part in parts:
+        yield part
+    if fail:
+        raise ConnectionResetError("client went away")
+
+
+async def test_file_store_streams_chunks_to_a_temp_file_then_renames(tmp_path: str):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        message = _create_message()
+
+        parts = [os.urandom(64 * 1024) for _ in range(40)]
+        assert await store.save_chunk_stream(message, 1, _stream(parts)) == 40 * 64 * 1024
+        assert await store.get_chunk(message, 1) == b"".join(parts)
+
+        with pytest.raises(ConnectionResetError):
+            await store.save_chunk_stream(message, 1, _stream([b"partial"], fail=True))
+
+        # the failed upload leaves the previous chunk in place and no temp file behind
+        assert await store.get_chunk(message, 1) == b"".join(parts)
+        assert os.listdir(os.path.dirname(store.chunk_path(message, 1))) == ["1"]
+
+
+async def test_file_store_streamed_chunk_writes_are_serialised_with_message_saves(tmp_path: str, monkeypatch):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        message = _create_message()
+        run_io = store._run_io  # pylint: disable=protected-access
+        active, most_active = 0, 0
+
+        async def _tracked_run_io(func, *args):
+            nonlocal active, most_active
+            active += 1
+            most_active = max(most_active, active)
+            try:
+                await asyncio.sleep(0.001)
+                return await run_io(func, *args)
+            finally:
+                active -= 1
+
+        monkeypatch.setattr(store, "_run_io", _tracked_run_io)
+        parts = [os.urandom(1024 * 1024) for _ in range(4)]
+        saves = [store.save_message(message) for _ in range(4)]
+        size, *_ = await asyncio.gather(store.save_chunk_stream(message, 1, _stream(parts)), *saves)
+        monkeypatch.undo()
+
+        assert size == 4 * 1024 * 1024
+        assert most_active == 1
+        assert await store.get_chunk(message, 1) == b"".join(parts)
+
+
+async def test_file_store_chunk_sizes_are_recorded_as_chunks_are_saved(tmp_path: str, monkeypatch):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        messaging = get_messaging()
+        message = _create_message(total_chunks=2)
+        message.events.insert(0, MessageEvent(status=MessageStatus.UPLOADING))
+
+        await messaging.save_chunk(
+            message=message, chunk_number=1, chunk=os.urandom(100), background_tasks=BackgroundTasks()
+        )
+        await store.save_message(message)
+        await messaging.save_chunk(
+            message=message, chunk_number=2, chunk=os.urandom(20), background_tasks=BackgroundTasks()
+        )
+
+        def _no_stat(_paths: list[str]) -> int:
+            raise AssertionError("chunk sizes should not be read from disk")
+
+        monkeypatch.setattr(file_store, "_sum_file_sizes", _no_stat)
+        assert await store.get_file_size(message) == 120
+        monkeypatch.undo()
+
+        # the size of chunk 2 was not persisted with the message, so is read from disk
+        await store.reset()
+        reloaded = cast(Message, await store.get_message(message.message_id))
+        assert reloaded.chunk_sizes == {1: 100}
+        assert await store.get_file_size(reloaded) == 120
+
+
+async def test_file_store_journals_message_changes_as_deltas(tmp_path: str):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(FileStore, get_store())
+        messaging = get_messaging()
+        message = _create_message(total_chunks=1)
+        await store.save_message(message)
+        await store.add_to_inbox(message)
+        await messaging.acknowledge_message(message=message, background_tasks=BackgroundTasks())
+
+        with open(store.index.path, "rb") as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 2
+        assert set(records[1]) == {"message_id", "delta"}
+        assert [event["status"] for event in records[1]["delta"]["events"]] == [MessageStatus.ACKNOWLEDGED]
+
+        # the json snapshot is only brought up to date on compaction
+        with open(f"{store.message_path(message)}.json", encoding="utf-8") as f:
+            assert len(json.load(f)["events"]) == 1
+
+        restarted = FileStore(get_env_config(), get_logger())
+        loaded = await restarted.get_message(message.message_id)
+        assert loaded
+        assert loaded.status == MessageStatus.ACKNOWLEDGED
+
+        await restarted._run_io(restarted.index.checkpoint)  # pylint: disable=protected-access
+        await restarted.close()
+        with open(f"{store.message_path(message)}.json", encoding="utf-8") as f:
+            assert len(json.load(f)["events"]) == 2
+
+
+async def test_file_store_index_truncates_a_torn_final_record(tmp_path: str):
+    index = FileStoreIndex(str(tmp_path))
+    index.record({"message_id": "MSG1", "recipient": {"mailbox_id": "MB1"}, "events": [{"status": "accepted"}]})
+    index.record(
+        {
+            "message_id": "MSG1",
+            "recipient": {"mailbox_id": "MB1"},
+            "events": [{"status": "acknowledged"}, {"status": "accepted"}],
+        }
+    )
+    index.close()
+    size = os.path.getsize(index.path)
+    with open(index.path, "ab") as f:
+        f.write(b'{"message_id":"MSG1","delta":{"ev')
+
+    journal = FileStoreIndex(str(tmp_path)).replay()
+    assert journal
+    assert [event["status"] for event in journal.records["MSG1"]["events"]] == ["acknowledged", "accepted"]
+    assert os.path.getsize(index.path) == size
+
+
+async def test_file_store_index_compaction_does_not_recreate_removed_snapshots(tmp_path: str):
+    index = FileStoreIndex(str(tmp_path))
+    kept = {"message_id": "KEPT", "recipient": {"mailbox_id": "MB1"}, "file_size": 1}
+    removed = {"message_id": "REMOVED", "recipient": {"mailbox_id": "MB1"}, "file_size": 1}
+    index.record(kept)
+    index.record(removed)
+    os.remove(index.snapshot_path(removed))
+
+    index.record({**removed, "file_size": 2})
+    index.record({**kept, "file_size": 2})
+    index.compact()
+
+    with open(index.snapshot_path(kept), encoding="utf-8") as f:
+        assert json.load(f)["file_size"] == 2
+    assert not os.path.exists(index.snapshot_path(removed))
+    with open(index.path, "rb") as f:
+        assert len(f.readlines()) == 2
+
+
+def test_journal_deltas_are_idempotent():
+    previous = {"message_id": "MSG1", "file_size": 0, "subject": "x", "events": [{"status": "uploading"}]}
+    current = {"message_id": "MSG1", "file_size": 10, "events": [{"status": "accepted"}, {"status": "uploading"}]}
+
+    delta, digest = journal_delta(message_digest(previous), current)
+    assert digest == message_digest(current)
+    assert delta == {
+        "events": [{"status": "accepted"}],
+        "events_count": 2,
+        "set": {"file_size": 10},
+        "unset": ["subject"],
+    }
+    assert apply_delta(previous, delta) == current
+    assert apply_delta(apply_delta(previous, delta), delta) == current
+    assert journal_delta(digest, current)[0] is None
+
+
+@pytest.mark.parametrize(("policy", "expected_syncs"), [("none", 0), ("batched", 1), ("every", 3)])
+def test_file_store_index_fsync_policy(tmp_path: str, monkeypatch, policy: str, expected_syncs: int):
+    syncs: list[int] = []
+    monkeypatch.setattr(os, "fsync", syncs.append)
+
+    index = FileStoreIndex(str(tmp_path), fsync=policy)
+    for version in range(3):
+        index.append({"message_id": f"MSG{version}"})
+    index.close()
+
+    assert len(syncs) == expected_syncs
+
+
+def test_file_store_index_rejects_unknown_fsync_policy(tmp_path: str):
+    with pytest.raises(ValueError, match="fsync"):
+        FileStoreIndex(str(tmp_path), fsync="sometimes")
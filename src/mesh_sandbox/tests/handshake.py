@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta
 from uuid import uuid4
 
 import pytest
@@ -5,6 +6,7 @@ from fastapi import status
 from fastapi.testclient import TestClient
 
 from ..common import APP_JSON, APP_V1_JSON, APP_V2_JSON
+from ..common.auth_cache import AuthCache, NonceIndexFull, TtlSet
 from ..common.constants import Headers
 from ..tests.helpers import generate_auth_token, temp_env_vars
 
@@ -198,3 +200,134 @@ def test_handshake_full_auth_mailbox_bad_key(app: TestClient):
         )
 
         assert res.status_code == status.HTTP_403_FORBIDDEN
+
+
+def _handshake(app: TestClient, mailbox_id: str, auth_token: str) -> int:
+    res = app.get(
+        f"/messageexchange/{mailbox_id}",
+        headers={
+            Headers.Mex_ClientVersion: "1.0",
+            Headers.Mex_OSName: "bob",
+            Headers.Mex_OSVersion: "latest",
+            Headers.Authorization: auth_token,
+        },
+    )
+    return res.status_code
+
+
+def test_handshake_full_auth_token_reused_is_cached(app: TestClient):
+    auth_token = generate_auth_token(_CANNED_MAILBOX1)
+
+    with temp_env_vars(AUTH_MODE="full"):
+        assert _handshake(app, _CANNED_MAILBOX1, auth_token) == status.HTTP_200_OK
+        assert _handshake(app, _CANNED_MAILBOX1, auth_token) == status.HTTP_200_OK
+
+        # a cached token is not accepted for another mailbox or with a different cipher text
+        assert _handshake(app, _CANNED_MAILBOX2, auth_token) == status.HTTP_403_FORBIDDEN
+        assert _handshake(app, _CANNED_MAILBOX1, auth_token[:-4] + "0000") == status.HTTP_403_FORBIDDEN
+
+        res = app.get("/messageexchange/admin/auth")
+        assert res.status_code == status.HTTP_200_OK
+        stats = res.json()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 1)
+        assert not stats["reject_replays"]
+
+
+def test_handshake_full_auth_rejects_replays(app: TestClient):
+    nonce = uuid4().hex
+    auth_token = generate_auth_token(_CANNED_MAILBOX1, nonce=nonce)
+
+    with temp_env_vars(AUTH_MODE="full", AUTH_REJECT_REPLAYS="true"):
+        assert _handshake(app, _CANNED_MAILBOX1, auth_token) == status.HTTP_200_OK
+        assert _handshake(app, _CANNED_MAILBOX1, auth_token) == status.HTTP_403_FORBIDDEN
+        assert (
+            _handshake(app, _CANNED_MAILBOX1, generate_auth_token(_CANNED_MAILBOX1, nonce=nonce, nonce_count="2"))
+            == status.HTTP_200_OK
+        )
+
+        stats = app.get("/messageexchange/admin/auth").json()
+        assert stats["reject_replays"]
+        assert (stats["replays"], stats["nonces"]) == (1, 2)
+
+
+def test_handshake_full_auth_refused_when_nonce_index_full(app: TestClient):
+    auth_token = generate_auth_token(_CANNED_MAILBOX1, nonce=uuid4().hex)
+
+    with temp_env_vars(AUTH_MODE="full", AUTH_REJECT_REPLAYS="true", AUTH_CACHE_SIZE="0", AUTH_NONCE_INDEX_SIZE="1"):
+        assert _handshake(app, _CANNED_MAILBOX1, auth_token) == status.HTTP_200_OK
+        # the header cache being off does not turn off replay rejection
+        assert _handshake(app, _CANNED_MAILBOX1, auth_token) == status.HTTP_403_FORBIDDEN
+        # the unexpired nonce is not evicted to make room for another
+        other_token = generate_auth_token(_CANNED_MAILBOX1, nonce=uuid4().hex)
+        assert _handshake(app, _CANNED_MAILBOX1, other_token) == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert _handshake(app, _CANNED_MAILBOX1, auth_token) == status.HTTP_403_FORBIDDEN
+
+        stats = app.get("/messageexchange/admin/auth").json()
+        assert (stats["nonces"], stats["max_nonces"], stats["nonces_full"]) == (1, 1, 1)
+
+
+def test_handshake_full_auth_rejects_tokens_older_than_the_replay_window(app: TestClient):
+    issued = datetime.now() - timedelta(minutes=10)
+    with temp_env_vars(AUTH_MODE="full", AUTH_REJECT_REPLAYS="true", AUTH_CACHE_SECONDS="300"):
+        stale_token = generate_auth_token(_CANNED_MAILBOX1, timestamp=issued)
+        assert _handshake(app, _CANNED_MAILBOX1, stale_token) == status.HTTP_403_FORBIDDEN
+        future_token = generate_auth_token(_CANNED_MAILBOX1, timestamp=datetime.now() + timedelta(minutes=5))
+        assert _handshake(app, _CANNED_MAILBOX1, future_token) == status.HTTP_403_FORBIDDEN
+        assert _handshake(app, _CANNED_MAILBOX1, generate_auth_token(_CANNED_MAILBOX1)) == status.HTTP_200_OK
+
+        stats = app.get("/messageexchange/admin/auth").json()
+        assert (stats["stale"], stats["nonces"]) == (2, 1)
+
+
+def test_auth_cache_token_replayed_after_its_nonce_expires_is_not_current():
+    now = [0.0]
+    cache = AuthCache(
+        max_entries=0, ttl_seconds=300, reject_replays=True, max_nonces=10, clock=lambda: now[0], token_slack_seconds=60
+    )
+    issued = datetime(2024, 1, 1, 12, 0)
+
+    assert cache.is_current(issued, issued + timedelta(seconds=59))
+    assert not cache.is_replay(_CANNED_MAILBOX1, "a", "1")
+
+    # the nonce is held until the token is no longer current, however late in its window it was first used
+    now[0] = 300 + 2 * 60
+    assert not cache.is_replay(_CANNED_MAILBOX1, "a", "1")
+    assert not cache.is_current(issued, issued + timedelta(seconds=59 + 300 + 2 * 60))
+    assert not cache.is_current(None, issued)
+    assert cache.stale == 2
+
+    # without replay rejection the token timestamp is not checked
+    assert AuthCache(max_entries=0, ttl_seconds=300).is_current(None, issued)
+
+
+def test_auth_cache_nonces_are_held_until_they_expire():
+    now = [0.0]
+    cache = AuthCache(max_entries=0, ttl_seconds=10, reject_replays=True, max_nonces=2, clock=lambda: now[0])
+
+    assert not cache.is_replay(_CANNED_MAILBOX1, "a", "1")
+    assert not cache.is_replay(_CANNED_MAILBOX1, "b", "1")
+    with pytest.raises(NonceIndexFull):
+        cache.is_replay(_CANNED_MAILBOX1, "c", "1")
+    assert cache.is_replay(_CANNED_MAILBOX1, "a", "1")
+
+    now[0] = 10
+    assert not cache.is_replay(_CANNED_MAILBOX1, "c", "1")
+    assert not cache.is_replay(_CANNED_MAILBOX1, "a", "1")
+
+
+def test_auth_cache_entries_expire():
+    now = [0.0]
+    entries = TtlSet(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+
+    entries.add("a")
+    now[0] = 5
+    entries.add("b")
+    now[0] = 8
+    entries.add("c")
+    assert "a" not in entries
+    assert "b" in entries
+
+    now[0] = 15
+    assert "b" not in entries
+    assert "c" in entries
+    assert len(entries) == 1
@@ -3,29 +3,11 @@ import os
 import pathlib
 import shutil
 import subprocess
-from datetime import datetime
-from typing import Optional
-from uuid import uuid4
 
 import httpx
 from OpenSSL import crypto
 
-from ..common import MESH_AUTH_SCHEME, generate_cipher_text
-
-
-def generate_auth_token(
-    mailbox_id: str,
-    mailbox_password: str = "password",
-    secret_key: str = "TestKey",
-    timestamp: Optional[datetime] = None,
-    nonce: Optional[str] = None,
-    nonce_count: str = "1",
-) -> str:
-    nonce = nonce or uuid4().hex
-    timestamp_string = (timestamp or datetime.now()).strftime("%Y%m%d%H%M")
-    public_auth_data = f"{mailbox_id}:{nonce}:{nonce_count}:{timestamp_string}"
-    cipher_text = generate_cipher_text(secret_key, mailbox_id, mailbox_password, timestamp_string, nonce, nonce_count)
-    return f"{MESH_AUTH_SCHEME} {public_auth_data}:{cipher_text}"
+from ..bench import generate_auth_token  # noqa: F401 pylint: disable=unused-import
 
 
 @contextlib.contextmanager
@@ -1,13 +1,22 @@
+import gzip
+import os
+from datetime import datetime, timezone
 from uuid import uuid4
 
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
-from mesh_sandbox.tests.mesh_api_helpers import mesh_api_send_message
+from mesh_sandbox.tests.mesh_api_helpers import (
+    mesh_api_get_message,
+    mesh_api_send_message,
+    mesh_api_send_message_and_return_message_id,
+)
 
 from ..common import APP_V1_JSON, APP_V2_JSON
 from ..common.constants import Headers
+from ..common.handler_helpers import ChunkFileResponse
+from ..dependencies import get_gzip_cache, get_pagination_tokens, get_store
 from ..models.message import MessageStatus
 from .helpers import generate_auth_token, temp_env_vars
 
@@ -345,3 +354,185 @@ def test_rich_inbox_returns_most_recent_messages(app: TestClient):
     for messages_in_inbox_index in range(100):
         assert messages[messages_in_inbox_index]["message_id"] == message_ids[message_sent_index]
         message_sent_index -= 1
+
+
+def test_continue_from_tokens_without_position_are_accepted(app: TestClient):
+    sender = _CANNED_MAILBOX1
+    recipient = _CANNED_MAILBOX2
+    page_size = 10
+
+    message_ids = [
+        mesh_api_send_message(app, sender_mailbox_id=sender, recipient_mailbox_id=recipient).json()["messageID"]
+        for _ in range(page_size * 2 + 5)
+    ]
+
+    headers = {Headers.Authorization: generate_auth_token(recipient), Headers.Accept: APP_V2_JSON}
+
+    # tokens issued before cursors carried the message position only hold the message id
+    legacy_token = get_pagination_tokens().encode_dict({"message_id": message_ids[page_size - 1]})
+    res = app.get(
+        f"/messageexchange/{recipient}/inbox?max_results={page_size}&continue_from={legacy_token}", headers=headers
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json()["messages"] == message_ids[page_size : page_size * 2]
+
+    res = app.get(res.json()["links"]["next"], headers=headers)
+    assert res.json()["messages"] == message_ids[page_size * 2 :]
+    assert "next" not in res.json()["links"]
+
+    res = app.get(
+        f"/messageexchange/{recipient}/inbox/rich?max_results={page_size}&continue_from={legacy_token}",
+        headers=headers,
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert [msg["message_id"] for msg in res.json()["messages"]] == list(reversed(message_ids[: page_size - 1]))
+
+    res = app.get(
+        f"/messageexchange/{sender}/outbox/rich?max_results={page_size}&continue_from={legacy_token}",
+        headers={Headers.Authorization: generate_auth_token(sender), Headers.Accept: APP_V2_JSON},
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert [msg["message_id"] for msg in res.json()["messages"]] == list(reversed(message_ids[: page_size - 1]))
+
+
+@pytest.mark.parametrize("accept", [APP_V1_JSON, APP_V2_JSON])
+def test_chunked_message_accepted_after_a_page_is_read_is_on_the_next_page(app: TestClient, accept: str):
+    sender = _CANNED_MAILBOX1
+    recipient = _CANNED_MAILBOX2
+    page_size = 10
+    headers = {Headers.Authorization: generate_auth_token(recipient), Headers.Accept: accept}
+
+    # created before the other messages, but only accepted once its last chunk arrives
+    res = mesh_api_send_message(
+        app,
+        sender_mailbox_id=sender,
+        recipient_mailbox_id=recipient,
+        message_data=b"chunk 1",
+        extra_headers={Headers.Mex_Chunk_Range: "1:2"},
+    )
+    assert res.status_code == status.HTTP_202_ACCEPTED
+    chunked = res.json()["messageID"]
+
+    message_ids = [
+        mesh_api_send_message_and_return_message_id(app, sender_mailbox_id=sender, recipient_mailbox_id=recipient)
+        for _ in range(page_size + 1)
+    ]
+
+    res = app.get(f"/messageexchange/{recipient}/inbox?max_results={page_size}", headers=headers)
+    first_page = res.json()
+    assert first_page["messages"] == message_ids[:page_size]
+
+    res = app.post(
+        f"/messageexchange/{sender}/outbox/{chunked}/2",
+        headers={Headers.Authorization: generate_auth_token(sender), Headers.Mex_Chunk_Range: "2:2"},
+        content=b"chunk 2",
+    )
+    assert res.status_code == status.HTTP_202_ACCEPTED, res.text
+
+    if accept == APP_V1_JSON:
+        next_page = f"/messageexchange/{recipient}/inbox?max_results={page_size}&continue_from={message_ids[-2]}"
+    else:
+        next_page = first_page["links"]["next"]
+    res = app.get(next_page, headers=headers)
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json()["messages"] == [message_ids[-1], chunked]
+
+
+def test_rich_inbox_and_outbox_start_time(app: TestClient):
+    sender = _CANNED_MAILBOX1
+    recipient = _CANNED_MAILBOX2
+
+    before = [mesh_api_send_message_and_return_message_id(app, sender, recipient) for _ in range(3)]
+    start_time = datetime.now(tz=timezone.utc).isoformat()
+    after = [mesh_api_send_message_and_return_message_id(app, sender, recipient) for _ in range(3)]
+    assert before
+
+    res = app.get(
+        f"/messageexchange/{recipient}/inbox/rich",
+        params={"start_time": start_time},
+        headers={Headers.Authorization: generate_auth_token(recipient), Headers.Accept: APP_V2_JSON},
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert [msg["message_id"] for msg in res.json()["messages"]] == list(reversed(after))
+
+    res = app.get(
+        f"/messageexchange/{sender}/outbox/rich",
+        params={"start_time": start_time},
+        headers={Headers.Authorization: generate_auth_token(sender), Headers.Accept: APP_V2_JSON},
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert [msg["message_id"] for msg in res.json()["messages"]] == list(reversed(after))
+
+
+def test_file_store_download_is_sent_from_the_chunk_file(app: TestClient, tmp_path: str, monkeypatch):
+    with temp_env_vars(STORE_MODE="file", MAILBOXES_DATA_DIR=tmp_path):
+        message_data = os.urandom(1024 * 1024)
+        message_id = mesh_api_send_message_and_return_message_id(
+            app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, message_data=message_data
+        )
+
+        async def _no_buffered_reads(*_args, **_kwargs):
+            raise AssertionError("chunk should be sent from the file")
+
+        monkeypatch.setattr(get_store(), "get_chunk", _no_buffered_reads)
+
+        res = mesh_api_get_message(app, _CANNED_MAILBOX2, message_id)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers[Headers.Content_Length] == str(len(message_data))
+        assert res.content == message_data
+
+
+async def test_chunk_file_response_uses_zerocopy_when_supported(tmp_path: str):
+    path = os.path.join(tmp_path, "1")
+    with open(path, "wb") as f:
+        f.write(b"chunk data")
+
+    sent: list[dict] = []
+
+    async def _send(message: dict):
+        sent.append(message)
+
+    response = ChunkFileResponse(path, stat_result=os.stat(path), media_type="application/octet-stream")
+    scope = {"type": "http", "extensions": {"http.response.zerocopy": {}}}
+    await response(scope, None, _send)  # type: ignore[arg-type]
+
+    assert [message["type"] for message in sent] == ["http.response.start", "http.response.zerocopy"]
+    assert sent[1]["count"] == len(b"chunk data")
+    assert sent[1]["file"].closed
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file"])
+def test_download_is_gzip_compressed_for_v2_clients_and_cached(app: TestClient, tmp_path: str, store_mode: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path, GZIP_CACHE_BYTES="1000000"):
+        message_data = os.urandom(600 * 1024)
+        message_id = mesh_api_send_message_and_return_message_id(
+            app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, message_data=message_data
+        )
+
+        extra_headers = {Headers.Accept: APP_V2_JSON, "Accept-Encoding": "gzip"}
+        for _ in range(2):
+            res = mesh_api_get_message(app, _CANNED_MAILBOX2, message_id, extra_headers=extra_headers)
+            assert res.status_code == status.HTTP_200_OK
+            assert res.headers[Headers.Content_Encoding] == "gzip"
+            assert res.content == message_data
+
+        cache = get_gzip_cache()
+        assert (len(cache), cache.hits) == (1, 1)
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file"])
+def test_gzip_message_is_decompressed_for_clients_without_gzip(app: TestClient, tmp_path: str, store_mode: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        message_data = os.urandom(600 * 1024)
+        message_id = mesh_api_send_message_and_return_message_id(
+            app,
+            _CANNED_MAILBOX1,
+            _CANNED_MAILBOX2,
+            message_data=gzip.compress(message_data),
+            extra_headers={Headers.Content_Encoding: "gzip"},
+        )
+
+        res = mesh_api_get_message(app, _CANNED_MAILBOX2, message_id, extra_headers={"Accept-Encoding": "identity"})
+        assert res.status_code == status.HTTP_200_OK
+        assert Headers.Content_Encoding not in res.headers
+        assert res.content == message_data
@@ -104,7 +104,7 @@ def mesh_api_track_message_by_local_id(
     if extra_headers:
         headers.update(extra_headers)
 
-    return app.get(f"/messageexchange/{sender_mailbox_id}/outbox/tracking?localID={local_id}", headers=headers)
+    return app.get(f"/messageexchange/{sender_mailbox_id}/outbox/tracking/{local_id}", headers=headers)
 
 
 def mesh_api_track_message_by_message_id(
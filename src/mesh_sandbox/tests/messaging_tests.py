@@ -1,3 +1,5 @@
+import asyncio
+import logging
 from typing import Any, ClassVar, Optional
 from uuid import uuid4
 
@@ -6,6 +8,7 @@ from fastapi import BackgroundTasks
 
 from .. import tests as tests_module
 from ..common.messaging import Messaging
+from ..common.plugin_engine import PluginEngine
 from ..dependencies import get_messaging, get_store
 from ..models.message import (
     Message,
@@ -75,7 +78,7 @@ async def test_canned_messaging_does_not_raise_with_bgt(message: Message, backgr
         messaging.register_plugin(Test2Plugin)
         await messaging.save_message(message=message, background_tasks=background_tasks)
 
-    await background_tasks()
+    await messaging.plugins.close()
 
     assert len(calls) == 2
     assert calls[0][0] == "before_save_message"
@@ -96,7 +99,7 @@ async def test_messaging_does_not_raise_with_bgt(message: Message, background_ta
         messaging.register_plugin(Test2Plugin)
         await messaging.save_message(message=message, background_tasks=background_tasks)
 
-    await background_tasks()
+    await messaging.plugins.close()
 
     assert len(calls) == 2
     assert calls[0][0] == "before_save_message"
@@ -117,13 +120,41 @@ async def test_error_events_raised_with_bgt(message: Message, background_tasks:
         messaging.register_plugin(Test2Plugin)
         await messaging.save_message(message=message, background_tasks=background_tasks)
 
-    await background_tasks()
+    await messaging.plugins.close()
 
     assert len(calls) == 2
     assert calls[0][0] == "before_save_message"
     assert calls[1][0] == "after_save_message"
 
 
+async def test_streamed_chunks_are_not_passed_to_plugins(message: Message, background_tasks: BackgroundTasks):
+    calls = []
+
+    class StreamPlugin:
+        triggers: ClassVar[list[str]] = ["before_save_chunk", "after_save_chunk"]
+
+        async def on_event(self, event: str, args: dict[str, Any], exception: Optional[Exception] = None):
+            calls.append((event, args["chunk"]))
+
+    async def _stream():
+        yield b"streamed "
+        yield b"chunk"
+
+    with temp_env_vars(STORE_MODE="memory"):
+        messaging = get_messaging()
+        messaging.register_plugin(StreamPlugin)
+        await messaging.save_message(message=message)
+        size = await messaging.save_chunk(
+            message=message, chunk_number=1, chunk=_stream(), background_tasks=background_tasks
+        )
+
+        await messaging.plugins.close()
+
+        assert size == len(b"streamed chunk")
+        assert await messaging.get_chunk(message, 1) == b"streamed chunk"
+        assert calls == [("before_save_chunk", b""), ("after_save_chunk", b"")]
+
+
 class TestDiscoveredPlugin:
     triggers: ClassVar[list[str]] = ["before_accept_message"]
 
@@ -153,3 +184,100 @@ async def test_plugin_discovery(monkeypatch):
     assert calls[0][0] == "before_accept_message"
     assert calls[0][1] == args
     assert calls[0][2] is None
+
+
+async def test_after_event_plugin_timeout_and_failure_counted(message: Message, background_tasks: BackgroundTasks):
+    calls = []
+
+    class SlowPlugin:
+        triggers: ClassVar[list[str]] = ["before_save_message", "after_save_message"]
+        timeout: ClassVar[float] = 0.01
+
+        async def on_event(self, event: str, args: dict[str, Any], exception: Optional[Exception] = None):
+            calls.append(event)
+            if event == "after_save_message":
+                await asyncio.sleep(1)
+
+    class FailingPlugin:
+        triggers: ClassVar[list[str]] = ["after_save_message"]
+
+        async def on_event(self, event: str, args: dict[str, Any], exception: Optional[Exception] = None):
+            raise ValueError(event)
+
+    with temp_env_vars(STORE_MODE="memory"):
+        messaging = get_messaging()
+        messaging.register_plugin(SlowPlugin)
+        messaging.register_plugin(FailingPlugin)
+        await messaging.save_message(message=message, background_tasks=background_tasks)
+
+    await messaging.plugins.close()
+
+    assert calls == ["before_save_message", "after_save_message"]
+    slow = messaging.plugins.stats["SlowPlugin"]
+    assert (slow.calls, slow.failures, slow.timeouts) == (2, 1, 1)
+    assert slow.max_seconds < 1
+    failing = messaging.plugins.stats["FailingPlugin"]
+    assert (failing.calls, failing.failures, failing.timeouts) == (1, 1, 0)
+
+
+async def test_before_event_plugin_errors_still_raised(message: Message, background_tasks: BackgroundTasks):
+    class RejectPlugin:
+        triggers: ClassVar[list[str]] = ["before_save_message"]
+
+        async def on_event(self, event: str, args: dict[str, Any], exception: Optional[Exception] = None):
+            raise ValueError(event)
+
+    with temp_env_vars(STORE_MODE="memory"):
+        messaging = get_messaging()
+        messaging.register_plugin(RejectPlugin)
+        with pytest.raises(ValueError, match="before_save_message"):
+            await messaging.save_message(message=message, background_tasks=background_tasks)
+
+    assert messaging.plugins.stats["RejectPlugin"].failures == 1
+    assert messaging.plugins.get_queue_stats().queued == 0
+
+
+@pytest.mark.parametrize(
+    ("policy", "expected_events", "dropped"),
+    [
+        ("drop_newest", ["first", "second"], 2),
+        ("drop_oldest", ["first", "fourth"], 2),
+        ("block", ["first", "second", "third", "fourth"], 0),
+    ],
+)
+async def test_plugin_queue_drop_policy(policy: str, expected_events: list[str], dropped: int):
+    release = asyncio.Event()
+    handled: list[str] = []
+
+    async def run_event(event: str, _event_args: dict[str, Any], _exception: Optional[Exception]):
+        await release.wait()
+        handled.append(event)
+
+    engine = PluginEngine(run_event, logging.getLogger("test"), workers=1, queue_size=1, drop_policy=policy)
+
+    await engine.submit("first", {})
+    # let the worker take the first event, leaving the queue empty
+    await asyncio.sleep(0)
+    await engine.submit("second", {})
+
+    if policy == "block":
+        blocked = asyncio.ensure_future(engine.submit("third", {}))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        release.set()
+        await blocked
+        await engine.submit("fourth", {})
+    else:
+        await engine.submit("third", {})
+        await engine.submit("fourth", {})
+        release.set()
+
+    await engine.close()
+
+    assert handled == expected_events
+    assert engine.get_queue_stats().dropped == dropped
+
+
+def test_plugin_queue_unknown_policy():
+    with pytest.raises(ValueError, match="unknown plugin drop policy"):
+        PluginEngine(lambda *_: asyncio.sleep(0), logging.getLogger("test"), drop_policy="drop_all")
@@ -0,0 +1,140 @@
+import re
+from typing import cast
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from ..common.metrics import Histogram, Metrics
+from ..models.message import Message
+from ..store.base import Store
+from ..store.metered_store import OperationStats, StoreInstrumentation, metered
+from . import _CANNED_MAILBOX1, _CANNED_MAILBOX2
+from .helpers import temp_env_vars
+from .mesh_api_helpers import mesh_api_get_message, mesh_api_send_message_and_return_message_id
+
+
+def _sample(metrics: str, name: str) -> float:
+    match = re.search(rf"^{re.escape(name)} (\S+)$", metrics, re.MULTILINE)
+    assert match, f"{name} not in metrics"
+    return float(match.group(1))
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value, ("a",))
+
+    assert list(histogram.render()) == [
+        "# HELP test_seconds test",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="a",le="0.1"} 2',
+        'test_seconds_bucket{route="a",le="1"} 3',
+        'test_seconds_bucket{route="a",le="+Inf"} 4',
+        'test_seconds_sum{route="a"} 5.65',
+        'test_seconds_count{route="a"} 4',
+    ]
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+def test_metrics_endpoint(app: TestClient, store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        message_id = mesh_api_send_message_and_return_message_id(
+            app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, message_data=b"a" * 100
+        )
+        res = mesh_api_get_message(app, _CANNED_MAILBOX2, message_id)
+        assert res.status_code == status.HTTP_200_OK
+
+        res = app.get("/metrics")
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["content-type"] == f"{Metrics.content_type}; charset=utf-8"
+        metrics = res.text
+
+    assert _sample(metrics, 'mesh_requests_total{route="send_message",status="202"}') == 1
+    assert _sample(metrics, 'mesh_requests_total{route="retrieve_message",status="200"}') == 1
+    assert _sample(metrics, 'mesh_request_duration_seconds_count{route="send_message",status="202"}') == 1
+    assert _sample(metrics, 'mesh_store_operation_duration_seconds_count{operation="save_message"}') >= 1
+    assert _sample(metrics, 'mesh_chunk_bytes_total{direction="upload"}') == 100
+    assert _sample(metrics, 'mesh_chunk_bytes_total{direction="download"}') == 100
+    assert _sample(metrics, 'mesh_chunks_total{direction="download"}') == 1
+    assert _sample(metrics, "mesh_messages") >= 1
+    assert _sample(metrics, 'mesh_inbox_messages{status="accepted"}') >= 1
+    assert _sample(metrics, "mesh_inbox_bytes") >= 100
+    if store_mode == "memory":
+        assert _sample(metrics, "mesh_chunk_bytes_in_memory") >= 100
+
+
+class _FailingStore:
+    readonly = False
+
+    async def get_chunk(self, message, chunk_number: int):  # pylint: disable=unused-argument
+        return b"abc"
+
+    async def save_chunk(self, message, chunk_number: int, chunk: bytes):
+        raise ValueError("disk full")
+
+
+async def test_store_instrumentation_records_operations():
+    instrumentation = StoreInstrumentation()
+    store = metered(cast(Store, _FailingStore()), instrumentation)
+
+    assert await store.get_chunk(cast(Message, None), 1) == b"abc"
+    with pytest.raises(ValueError, match="disk full"):
+        await store.save_chunk(cast(Message, None), 1, b"12345")
+    assert not store.readonly
+
+    get_chunk = instrumentation.operations["get_chunk"]
+    assert (get_chunk.calls, get_chunk.errors, get_chunk.payload_bytes) == (1, 0, 3)
+    save_chunk = instrumentation.operations["save_chunk"]
+    assert (save_chunk.calls, save_chunk.errors, save_chunk.payload_bytes) == (1, 1, 5)
+    assert save_chunk.percentile(99) == save_chunk.max_seconds
+    assert "save_chunk calls=1 errors=1" in instrumentation.summary()
+
+
+async def test_metered_store_builds_each_wrapper_once(monkeypatch):
+    raw = _FailingStore()
+    store = metered(cast(Store, raw))
+
+    assert store.get_chunk is store.get_chunk
+    assert await store.get_chunk(cast(Message, None), 1) == b"abc"
+
+    async def _patched(message, chunk_number: int):  # pylint: disable=unused-argument
+        return b"patched"
+
+    # the kept wrapper still calls whatever the store holds now
+    monkeypatch.setattr(raw, "get_chunk", _patched)
+    assert await store.get_chunk(cast(Message, None), 1) == b"patched"
+
+
+def test_operation_stats_percentiles():
+    stats = OperationStats()
+    for millis in range(1, 101):
+        stats.record(millis / 1000, 0, False)
+
+    assert stats.percentile(50) == 0.05
+    assert stats.percentile(95) == 0.095
+    assert stats.percentile(99) == 0.099
+    assert OperationStats().percentile(99) == 0.0
+
+
+def test_store_stats_disabled_by_default(app: TestClient):
+    res = app.get("/admin/store/stats")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json() == {"enabled": False, "operations": {}}
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+def test_store_stats_endpoint(app: TestClient, store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path, STORE_INSTRUMENTATION="true"):
+        mesh_api_send_message_and_return_message_id(app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, message_data=b"a" * 100)
+
+        res = app.get("/messageexchange/admin/store/stats")
+        assert res.status_code == status.HTTP_200_OK
+        stats = res.json()
+
+    assert stats["enabled"]
+    save_message = stats["operations"]["save_message"]
+    assert save_message["calls"] >= 1
+    assert save_message["errors"] == 0
+    assert save_message["p50_ms"] <= save_message["p99_ms"] <= save_message["max_ms"]
+    assert sum(operation["payload_bytes"] for operation in stats["operations"].values()) >= 100
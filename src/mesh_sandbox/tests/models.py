@@ -0,0 +1,78 @@
+import copy
+import json
+import pickle
+from dataclasses import FrozenInstanceError, asdict
+from uuid import uuid4
+from weakref import ref
+
+import pytest
+
+from ..models.message import Message, MessageEvent, MessageMetadata, MessageParty, MessageStatus
+from ..store.serialisation import deserialise_model, serialise_model
+from . import _CANNED_MAILBOX1, _CANNED_MAILBOX2
+
+
+def _message() -> Message:
+    return Message(
+        message_id=uuid4().hex,
+        sender=MessageParty(mailbox_id=_CANNED_MAILBOX1.lower(), mailbox_name="sender"),
+        recipient=MessageParty(mailbox_id=_CANNED_MAILBOX2, mailbox_name="recipient"),
+        workflow_id="TEST_WORKFLOW",
+        metadata=MessageMetadata(local_id="local"),
+    )
+
+
+def test_messages_do_not_carry_an_instance_dict():
+    message = _message()
+    for obj in (message, message.sender, message.metadata, message.events[0]):
+        assert not hasattr(obj, "__dict__")
+
+    # the attribute api is unchanged
+    message.events.insert(0, MessageEvent(status=MessageStatus.ACKNOWLEDGED))
+    message.metadata.subject = "subject"
+    message.file_size = 10
+    assert message.status == MessageStatus.ACKNOWLEDGED
+    assert asdict(message)["metadata"]["subject"] == "subject"
+
+    with pytest.raises(AttributeError):
+        message.not_a_field = 1  # type: ignore[attr-defined]  # pylint: disable=assigning-non-slot
+
+    assert ref(message)() is message
+
+
+def test_messages_share_parties_and_repeated_strings():
+    first, second = _message(), _message()
+    loaded = deserialise_model(json.loads(json.dumps(serialise_model(first))), Message)
+    assert loaded
+
+    assert first.sender.mailbox_id == _CANNED_MAILBOX1
+    assert first.sender is second.sender is loaded.sender
+    assert first.recipient is second.recipient is loaded.recipient
+    assert first.sender is not first.recipient
+    assert loaded.workflow_id is first.workflow_id
+    assert loaded.events[0].status is MessageStatus.ACCEPTED
+
+    other = Message(message_id=uuid4().hex, sender=MessageParty(mailbox_id=_CANNED_MAILBOX1, mailbox_name="other"))
+    assert other.sender is not first.sender
+    assert other.sender.mailbox_name == "other"
+
+
+def test_shared_parties_are_immutable():
+    message = _message()
+    with pytest.raises(FrozenInstanceError):
+        message.sender.mailbox_name = "changed"  # type: ignore[misc]
+
+
+def test_messages_can_be_copied_and_pickled():
+    message = _message()
+    message.chunk_sizes[1] = 10
+
+    for restored in (copy.deepcopy(message), pickle.loads(pickle.dumps(message)), copy.copy(message)):
+        assert restored is not message
+        assert asdict(restored) == asdict(message)
+        assert restored.sender.mailbox_id == _CANNED_MAILBOX1
+
+    party = pickle.loads(pickle.dumps(message.sender))
+    assert party == message.sender
+    with pytest.raises(FrozenInstanceError):
+        party.mailbox_name = "changed"  # type: ignore[misc]
@@ -0,0 +1,116 @@
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from ..api import app
+from ..common import APP_V2_JSON
+from ..common.constants import Headers
+from ..common.pagination import InvalidPaginationToken, PaginationTokens
+from ..dependencies import get_env_config, get_messaging, get_pagination_tokens, get_store
+from . import _CANNED_MAILBOX1, _CANNED_MAILBOX2
+from .helpers import generate_auth_token, temp_env_vars
+from .mesh_api_helpers import mesh_api_send_message_and_return_message_id
+
+
+def _restart_worker():
+    """drop the per process state, as if the next request were served by another worker"""
+    get_store.cache_clear()
+    get_env_config.cache_clear()
+    get_messaging.cache_clear()
+    get_pagination_tokens.cache_clear()
+
+
+def test_pagination_key_derived_from_config_is_stable():
+    key = PaginationTokens.derive_key("TestKey")
+    assert key == PaginationTokens.derive_key("TestKey")
+    assert key != PaginationTokens.derive_key("OtherKey")
+
+    token = PaginationTokens([key]).encode_dict({"last_index": 10})
+    assert PaginationTokens([key]).decode_dict(token) == {"last_index": 10}
+
+
+def test_pagination_tokens_signed_with_previous_key_are_accepted():
+    old_key, new_key = PaginationTokens.derive_key("OldKey"), PaginationTokens.derive_key("NewKey")
+    old_token = PaginationTokens([old_key]).encode_dict({"message_id": "ABC"})
+
+    rotated = PaginationTokens([new_key, old_key])
+    assert rotated.decode_dict(old_token) == {"message_id": "ABC"}
+    new_token = rotated.encode_dict({"message_id": "ABC"})
+    assert new_token != old_token
+
+    with pytest.raises(InvalidPaginationToken):
+        PaginationTokens([old_key]).decode_dict(new_token)
+
+
+@pytest.mark.parametrize("token", ["", "not-a-token", "e30.AAAA", "!!!.???"])
+def test_pagination_tokens_reject_invalid_tokens(token: str):
+    with pytest.raises(InvalidPaginationToken):
+        PaginationTokens([PaginationTokens.derive_key("TestKey")]).decode_dict(token)
+
+
+def test_pagination_tokens_reject_tampered_position():
+    tokens = PaginationTokens([PaginationTokens.derive_key("TestKey")])
+    payload, signature = tokens.encode_dict({"last_index": 10}).split(".")
+    forged_payload = tokens.encode_dict({"last_index": 99}).split(".")[0]
+
+    with pytest.raises(InvalidPaginationToken):
+        tokens.decode_dict(f"{forged_payload}.{signature}")
+    assert tokens.decode_dict(f"{payload}.{signature}") == {"last_index": 10}
+
+
+def test_continue_from_token_accepted_by_another_worker(app: TestClient, tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path):
+        message_ids = [
+            mesh_api_send_message_and_return_message_id(app, _CANNED_MAILBOX1, _CANNED_MAILBOX2) for _ in range(12)
+        ]
+        headers = {Headers.Authorization: generate_auth_token(_CANNED_MAILBOX2), Headers.Accept: APP_V2_JSON}
+
+        res = app.get(f"/messageexchange/{_CANNED_MAILBOX2}/inbox?max_results=10", headers=headers)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["messages"] == message_ids[:10]
+        next_page = res.json()["links"]["next"]
+
+        _restart_worker()
+
+        res = app.get(next_page, headers=headers)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["messages"] == message_ids[10:]
+
+        # after a key rotation, tokens signed with the previous key are still accepted
+        with temp_env_vars(PAGINATION_KEY="RotatedKey", PAGINATION_PREVIOUS_KEY="TestKey"):
+            _restart_worker()
+            res = app.get(next_page, headers=headers)
+            assert res.status_code == status.HTTP_200_OK
+            assert res.json()["messages"] == message_ids[10:]
+
+        with temp_env_vars(PAGINATION_KEY="RotatedKey"):
+            _restart_worker()
+            res = app.get(next_page, headers=headers)
+            assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file"])
+def test_startup_rejects_in_process_store_with_multiple_workers(store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path, WORKERS="2"), pytest.raises(
+        ValueError, match="cannot be used with 2 workers"
+    ), TestClient(app):
+        pass
+
+
+def test_startup_rejects_replay_rejection_with_multiple_workers(tmp_path: str):
+    with temp_env_vars(
+        STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path, WORKERS="2", AUTH_REJECT_REPLAYS="true"
+    ), pytest.raises(ValueError, match="cannot be used with 2 workers"), TestClient(app):
+        pass
+
+
+def test_startup_rejects_replay_rejection_without_a_nonce_index():
+    with temp_env_vars(AUTH_REJECT_REPLAYS="true", AUTH_NONCE_INDEX_SIZE="0"), pytest.raises(
+        ValueError, match="auth_nonce_index_size"
+    ), TestClient(app):
+        pass
+
+
+def test_startup_allows_sqlite_store_with_multiple_workers(tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path, WORKERS="2"), TestClient(app) as client:
+        assert client.get("/health").status_code == status.HTTP_200_OK
@@ -1,4 +1,5 @@
 import os.path
+from typing import Any, ClassVar, Optional
 from uuid import uuid4
 
 import pytest
@@ -9,7 +10,9 @@ from mesh_sandbox.tests.mesh_api_helpers import mesh_api_send_message
 
 from ..common import APP_V1_JSON, APP_V2_JSON
 from ..common.constants import Headers
+from ..dependencies import get_messaging
 from ..models.message import MessageStatus
+from ..store.file_index import FileStoreIndex
 from .helpers import generate_auth_token, temp_env_vars
 
 _CANNED_MAILBOX1 = "X26ABC1"
@@ -638,3 +641,89 @@ def test_rich_outbox_returns_most_recent_messages(app: TestClient):
     for messages_in_inbox_index in range(100):
         assert messages[messages_in_inbox_index]["message_id"] == message_ids[message_sent_index]
         message_sent_index -= 1
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+def test_chunked_upload_progress_is_reported_while_uploading(app: TestClient, tmp_path: str, store_mode: str):
+    sender = _CANNED_MAILBOX1
+    recipient = _CANNED_MAILBOX2
+
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        chunks = [os.urandom(100), os.urandom(200), os.urandom(50)]
+        resp = mesh_api_send_message(
+            app,
+            sender_mailbox_id=sender,
+            recipient_mailbox_id=recipient,
+            message_data=chunks[0],
+            extra_headers={Headers.Accept: APP_V1_JSON, Headers.Mex_Chunk_Range: "1:3"},
+        )
+        assert resp.status_code == status.HTTP_202_ACCEPTED
+        message_id = resp.json()["messageID"]
+
+        for chunk_number, chunk in enumerate(chunks[1:], start=2):
+            res = app.get(f"/admin/message/{message_id}")
+            assert res.status_code == status.HTTP_200_OK
+            details = res.json()
+            assert details["status"].lower() == MessageStatus.UPLOADING
+            assert details["chunks_received"] == chunk_number - 1
+            assert details["bytes_received"] == sum(len(chunk) for chunk in chunks[: chunk_number - 1])
+
+            res = app.get(
+                f"/messageexchange/{sender}/outbox/tracking?messageID={message_id}",
+                headers={Headers.Authorization: generate_auth_token(sender), Headers.Accept: APP_V1_JSON},
+            )
+            assert res.json()["fileSize"] == details["bytes_received"]
+
+            res = app.post(
+                f"/messageexchange/{sender}/outbox/{message_id}/{chunk_number}",
+                headers={
+                    Headers.Authorization: generate_auth_token(sender),
+                    Headers.Mex_Chunk_Range: f"{chunk_number}:3",
+                },
+                content=chunk,
+            )
+            assert res.status_code == status.HTTP_202_ACCEPTED, res.text
+
+        details = app.get(f"/admin/message/{message_id}").json()
+        assert details["status"].lower() == MessageStatus.ACCEPTED
+        assert details["file_size"] == details["bytes_received"] == sum(len(chunk) for chunk in chunks)
+        assert details["chunks_received"] == 3
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+def test_chunk_sizes_are_persisted_without_saving_the_message(app: TestClient, tmp_path: str, store_mode: str):
+    sender = _CANNED_MAILBOX1
+    saves = []
+
+    class SavePlugin:
+        triggers: ClassVar[list[str]] = ["before_save_message"]
+
+        async def on_event(self, event: str, args: dict[str, Any], err: Optional[Exception] = None):
+            saves.append(args["message"].message_id)
+
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        get_messaging().register_plugin(SavePlugin)
+        resp = mesh_api_send_message(
+            app,
+            sender_mailbox_id=sender,
+            recipient_mailbox_id=_CANNED_MAILBOX2,
+            message_data=b"chunk 1",
+            extra_headers={Headers.Mex_Chunk_Range: "1:3"},
+        )
+        message_id = resp.json()["messageID"]
+        saved = len(saves)
+
+        res = app.post(
+            f"/messageexchange/{sender}/outbox/{message_id}/2",
+            headers={Headers.Authorization: generate_auth_token(sender), Headers.Mex_Chunk_Range: "2:3"},
+            content=b"chunk two",
+        )
+        assert res.status_code == status.HTTP_202_ACCEPTED, res.text
+
+        assert len(saves) == saved
+        assert app.get(f"/admin/message/{message_id}").json()["bytes_received"] == len(b"chunk 1chunk two")
+        if store_mode == "file":
+            # the chunk sizes are journalled, so they survive a restart
+            journal = FileStoreIndex(str(tmp_path)).replay()
+            assert journal
+            assert journal.records[message_id]["chunk_sizes"] == {"1": 7, "2": 9}
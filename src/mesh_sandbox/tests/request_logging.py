@@ -0,0 +1,128 @@
+import atexit
+import io
+import json
+import logging
+from typing import Any, Optional
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from ..common.constants import Headers
+from ..common.structured_logging import JsonFormatter, RequestLogSampler, start_queue_logging
+from . import _CANNED_MAILBOX1
+from .helpers import generate_auth_token, temp_env_vars
+
+
+def _handshake(app: TestClient, auth_token: Optional[str] = None) -> int:
+    res = app.get(
+        f"/messageexchange/{_CANNED_MAILBOX1}",
+        headers={
+            Headers.Mex_ClientVersion: "1.0",
+            Headers.Mex_OSName: "bob",
+            Headers.Mex_OSVersion: "latest",
+            Headers.Authorization: auth_token or generate_auth_token(_CANNED_MAILBOX1),
+        },
+    )
+    return res.status_code
+
+
+def _request_logs(caplog: pytest.LogCaptureFixture) -> list[dict[str, Any]]:
+    return [vars(record) for record in caplog.records if getattr(record, "route", None) == "handshake"]
+
+
+def test_json_formatter_includes_request_fields():
+    record = logging.makeLogRecord(
+        {
+            "name": "mesh-sandbox",
+            "levelno": logging.INFO,
+            "levelname": "INFO",
+            "msg": "end %s",
+            "args": ("handshake",),
+            "route": "handshake",
+            "mailbox_id": _CANNED_MAILBOX1,
+            "status": 200,
+            "duration_ms": 1.5,
+        }
+    )
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "end handshake"
+    assert entry["level"] == "INFO"
+    assert (entry["route"], entry["mailbox_id"], entry["status"], entry["duration_ms"]) == (
+        "handshake",
+        _CANNED_MAILBOX1,
+        200,
+        1.5,
+    )
+    assert "message_id" not in entry
+
+
+def test_queued_exception_logged_with_exception_field():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger("mesh-sandbox-queue-test")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    listener = start_queue_logging(logger)
+    try:
+        raise ValueError("disk full")
+    except ValueError:
+        logger.exception("saving %s failed", "message1")
+    finally:
+        listener.stop()
+        atexit.unregister(listener.stop)
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "saving message1 failed"
+    assert "ValueError: disk full" in entry["exception"]
+
+
+def test_request_begin_and_end_logged(app: TestClient, caplog: pytest.LogCaptureFixture):
+    with caplog.at_level(logging.INFO, logger="mesh-sandbox"):
+        assert _handshake(app) == status.HTTP_200_OK
+
+    begin, end = _request_logs(caplog)
+    assert (begin["event"], end["event"]) == ("begin", "end")
+    assert end["mailbox_id"] == _CANNED_MAILBOX1
+    assert end["status"] == status.HTTP_200_OK
+    assert end["duration_ms"] >= 0
+
+
+def test_request_begin_suppressed(app: TestClient, caplog: pytest.LogCaptureFixture):
+    with temp_env_vars(LOG_REQUEST_BEGIN="false"), caplog.at_level(logging.INFO, logger="mesh-sandbox"):
+        assert _handshake(app) == status.HTTP_200_OK
+
+    assert [log["event"] for log in _request_logs(caplog)] == ["end"]
+
+
+def test_unsampled_requests_only_log_failures(app: TestClient, caplog: pytest.LogCaptureFixture):
+    with temp_env_vars(LOG_SAMPLE_RATE="0"), caplog.at_level(logging.INFO, logger="mesh-sandbox"):
+        assert _handshake(app) == status.HTTP_200_OK
+        assert not _request_logs(caplog)
+
+        assert _handshake(app, auth_token="invalid") == status.HTTP_403_FORBIDDEN
+
+    (end,) = _request_logs(caplog)
+    assert end["event"] == "end"
+    assert end["status"] == status.HTTP_403_FORBIDDEN
+
+
+def test_route_sample_rate_overrides_default(app: TestClient, caplog: pytest.LogCaptureFixture):
+    with temp_env_vars(LOG_SAMPLE_RATE="0", LOG_ROUTE_SAMPLE_RATES="handshake=1"), caplog.at_level(
+        logging.INFO, logger="mesh-sandbox"
+    ):
+        assert _handshake(app) == status.HTTP_200_OK
+
+    assert [log["event"] for log in _request_logs(caplog)] == ["begin", "end"]
+
+
+def test_parse_route_rates():
+    assert RequestLogSampler.parse_route_rates("") == {}
+    assert RequestLogSampler.parse_route_rates("handshake=0.5, get_message_chunk=0.01,") == {
+        "handshake": 0.5,
+        "get_message_chunk": 0.01,
+    }
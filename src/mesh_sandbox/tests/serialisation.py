@@ -1,8 +1,15 @@
+import json
 from dataclasses import asdict
+from datetime import datetime
+from typing import Any, cast
 from uuid import uuid4
 
-from ..models.message import Message, MessageMetadata, MessageParty
-from ..store.serialisation import deserialise_model, serialise_model
+import pytest
+
+from ..models.mailbox import Mailbox
+from ..models.message import Message, MessageEvent, MessageMetadata, MessageParty
+from ..models.workflow import Workflow
+from ..store.serialisation import deserialise_model, serialise_model, serialise_value
 
 
 def test_serialise_deserialise_message():
@@ -20,3 +27,66 @@ def test_serialise_deserialise_message():
     deserialised = deserialise_model(serialised, Message)
     assert deserialised
     assert asdict(deserialised) == asdict(message)
+
+
+def test_serialise_keeping_empty_strings():
+    message = Message(message_id=uuid4().hex, metadata=MessageMetadata(local_id="", subject=""))
+
+    serialised = serialise_model(message)
+    assert serialised
+    assert "local_id" not in serialised["metadata"]
+
+    serialised = serialise_model(message, exclude_empty_strings=False)
+    assert serialised
+    deserialised = deserialise_model(serialised, Message)
+    assert deserialised
+    assert asdict(deserialised) == asdict(message)
+
+
+def test_serialise_deserialise_chunk_sizes():
+    message = Message(message_id=uuid4().hex, chunk_sizes={1: 100, 2: 0})
+
+    serialised = serialise_model(message)
+    assert serialised
+
+    deserialised = deserialise_model(json.loads(json.dumps(serialised)), Message)
+    assert deserialised
+    assert deserialised.chunk_sizes == {1: 100, 2: 0}
+    assert (deserialised.chunks_received, deserialised.bytes_received) == (2, 100)
+
+
+def test_serialise_values_not_of_the_declared_type_fall_back_to_serialise_value():
+    event = MessageEvent(status="accepted", timestamp=cast(datetime, "2023-01-01T00:00:00"))
+    message = Message(message_id=uuid4().hex, events=[event], created_timestamp=datetime(2023, 1, 1))
+    message.metadata = cast(MessageMetadata, {"subject": "subject"})
+
+    serialised = serialise_model(message)
+    assert serialised
+    assert serialised["events"] == [{"status": "accepted", "timestamp": "2023-01-01T00:00:00"}]
+    assert serialised["metadata"] == serialise_value({"subject": "subject"})
+    assert serialised["created_timestamp"] == "2023-01-01T00:00:00"
+
+
+def test_deserialise_mailbox_and_workflow():
+    last_accessed = datetime(2023, 1, 1, 12)
+    mailbox = Mailbox(mailbox_id="x26abc1", mailbox_name="name", _last_accessed=last_accessed, _inbox_count=3)
+    workflow = Workflow(workflow_id="WORKFLOW", senders=["X26ABC1"], receivers=["X26ABC2"])
+
+    for model in (mailbox, workflow):
+        serialised = json.loads(json.dumps(serialise_model(model)))
+        assert asdict(cast(Any, deserialise_model(serialised, type(model)))) == asdict(model)
+
+    with pytest.raises(TypeError):
+        serialise_model({"mailbox_id": "X26ABC1"})
+    with pytest.raises(TypeError):
+        deserialise_model({"mailbox_id": "X26ABC1"}, dict)
+
+
+def test_only_fields_marked_omit_empty_drop_empty_dicts():
+    message = Message(message_id=uuid4().hex)
+
+    serialised = serialise_model(message)
+    assert serialised
+    assert "chunk_sizes" not in serialised
+
+    assert serialise_value({}) == {}
@@ -0,0 +1,234 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import cast
+from uuid import uuid4
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from ..dependencies import get_store
+from ..models.message import Message, MessageEvent, MessageMetadata, MessageParty, MessageStatus
+from ..store.sqlite_store import SqliteStore
+from . import _CANNED_MAILBOX1, _CANNED_MAILBOX2
+from .helpers import temp_env_vars
+from .mesh_api_helpers import (
+    mesh_api_get_inbox_size,
+    mesh_api_get_message,
+    mesh_api_send_message_and_return_message_id,
+    mesh_api_track_message_by_local_id,
+)
+
+
+def _create_message(local_id: str = "") -> Message:
+    return Message(
+        message_id=uuid4().hex.upper(),
+        sender=MessageParty(mailbox_id=_CANNED_MAILBOX1),
+        recipient=MessageParty(mailbox_id=_CANNED_MAILBOX2),
+        metadata=MessageMetadata(local_id=local_id, content_encoding=""),
+    )
+
+
+def test_sqlite_store_send_receive(app: TestClient, tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path):
+        local_id = uuid4().hex
+        message_data = os.urandom(1024)
+        message_id = mesh_api_send_message_and_return_message_id(
+            app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, message_data=message_data, extra_headers={"mex-localid": local_id}
+        )
+        assert os.path.exists(os.path.join(tmp_path, "mesh_sandbox.sqlite"))
+        assert mesh_api_get_inbox_size(app, _CANNED_MAILBOX2) == 1
+
+        res = mesh_api_get_message(app, _CANNED_MAILBOX2, message_id)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.content == message_data
+
+        res = mesh_api_track_message_by_local_id(app, _CANNED_MAILBOX1, local_id)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["messageId"] == message_id
+
+
+async def test_sqlite_store_round_trips_empty_strings(tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path):
+        store = get_store()
+        message = _create_message()
+        await store.save_message(message)
+
+        loaded = await store.get_message(message.message_id)
+        assert loaded
+        assert loaded.metadata.content_encoding == ""
+        assert loaded.metadata.local_id == ""
+
+
+async def test_sqlite_store_large_chunks_are_written_to_files(tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path, SQLITE_INLINE_CHUNK_BYTES=100):
+        store = cast(SqliteStore, get_store())
+        message = _create_message()
+        message.total_chunks = 2
+        await store.save_message(message)
+
+        small, large = os.urandom(100), os.urandom(101)
+        await store.save_chunk(message, 1, small)
+        await store.save_chunk(message, 2, large)
+
+        assert not os.path.exists(store.chunk_path(message, 1))
+        assert os.path.exists(store.chunk_path(message, 2))
+        assert await store.get_chunk(message, 1) == small
+        assert await store.get_chunk(message, 2) == large
+        assert await store.get_file_size(message) == 201
+
+        await store.save_chunk(message, 2, None)
+        assert not os.path.exists(store.chunk_path(message, 2))
+        assert await store.get_chunk(message, 2) is None
+
+
+async def test_sqlite_store_reset_mailbox_keeps_other_mailbox_outbox(tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path):
+        store = get_store()
+        message = _create_message(local_id=uuid4().hex)
+        await store.save_message(message)
+        await store.add_to_inbox(message)
+        await store.add_to_outbox(message)
+
+        await store.reset_mailbox(_CANNED_MAILBOX2)
+
+        assert await store.get_inbox_messages(_CANNED_MAILBOX2) == []
+        assert [msg.message_id for msg in await store.get_outbox(_CANNED_MAILBOX1)] == [message.message_id]
+
+        await store.reset_mailbox(_CANNED_MAILBOX1)
+        assert await store.get_outbox(_CANNED_MAILBOX1) == []
+        assert await store.get_message(message.message_id) is None
+
+
+def test_sqlite_store_queries_use_indexes(tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(SqliteStore, get_store())
+
+        queries = {
+            "ix_messages_accepted_inbox": "SELECT message FROM messages WHERE recipient = 'A' "
+            "AND status = 'accepted' AND in_inbox = 1 ORDER BY accepted_timestamp",
+            "ix_messages_accepted_inbox_workflow_id": "SELECT message FROM messages WHERE recipient = 'A' "
+            "AND status = 'accepted' AND in_inbox = 1 AND workflow_id >= 'B' AND workflow_id < 'C' "
+            "ORDER BY accepted_timestamp",
+            "ix_messages_outbox": "SELECT message FROM messages WHERE sender = 'A' AND in_outbox = 1 "
+            "ORDER BY created_timestamp DESC",
+            "ix_messages_local_id": "SELECT message FROM messages WHERE sender = 'A' AND local_id = 'B'",
+            "ix_messages_created": "SELECT message_id FROM messages WHERE created_timestamp <= 'A'",
+            "ix_messages_inbox_expiry": "SELECT message_id FROM messages WHERE in_inbox = 1 AND status = 'accepted' "
+            "AND inbox_expiry_timestamp != '' AND inbox_expiry_timestamp <= 'A'",
+        }
+        with sqlite3.connect(store.config.sqlite_path) as conn:
+            for index, sql in queries.items():
+                plan = " ".join(str(row) for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall())
+                assert index in plan, plan
+
+
+def test_sqlite_store_adds_accepted_timestamp_to_an_existing_database(tmp_path: str):
+    db_path = os.path.join(tmp_path, "mesh_sandbox.sqlite")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE messages (message_id TEXT PRIMARY KEY, recipient TEXT NOT NULL, sender TEXT NOT NULL, "
+            "status TEXT NOT NULL, workflow_id TEXT NOT NULL, local_id TEXT, created_timestamp TEXT NOT NULL, "
+            "file_size INTEGER NOT NULL DEFAULT 0, in_inbox INTEGER NOT NULL DEFAULT 0, "
+            "in_outbox INTEGER NOT NULL DEFAULT 0, message TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX ix_messages_inbox ON messages (recipient, status, created_timestamp, message_id)")
+        conn.execute(
+            "INSERT INTO messages VALUES ('M1', 'A', 'B', 'accepted', 'W', NULL, '2023-01-01T00:00:00.000000', "
+            "0, 1, 0, '{}')"
+        )
+
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(SqliteStore, get_store())
+
+        with sqlite3.connect(store.config.sqlite_path) as conn:
+            rows = conn.execute("SELECT accepted_timestamp FROM messages").fetchall()
+            indexes = {row[1] for row in conn.execute("PRAGMA index_list(messages)")}
+
+        assert rows == [("2023-01-01T00:00:00.000000",)]
+        assert "ix_messages_inbox" not in indexes
+        assert "ix_messages_accepted_inbox" in indexes
+
+
+async def test_sqlite_store_expire_messages(tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path, SQLITE_INLINE_CHUNK_BYTES=10):
+        store = cast(SqliteStore, get_store())
+        now = datetime.utcnow()
+        old, uncollected, new = _create_message(), _create_message(), _create_message()
+        old.created_timestamp = now - timedelta(days=29)
+        uncollected.created_timestamp = now - timedelta(days=6)
+        uncollected.inbox_expiry_timestamp = now - timedelta(days=1)
+        for message in (old, uncollected, new):
+            message.events.insert(0, MessageEvent(status=MessageStatus.ACCEPTED))
+            await store.save_message(message)
+            await store.save_chunk(message, 1, os.urandom(100))
+            await store.add_to_outbox(message)
+            await store.add_to_inbox(message)
+        old_chunk = store.chunk_path(old, 1)
+        assert os.path.exists(old_chunk)
+
+        swept = await store.expire_messages(now + timedelta(days=2))
+        assert (swept.expired_messages, swept.expired_inbox_messages, swept.reclaimed_bytes) == (1, 1, 100)
+
+        assert await store.get_message(old.message_id) is None
+        assert not os.path.exists(old_chunk)
+        inbox = await store.get_accepted_inbox_messages(_CANNED_MAILBOX2)
+        assert [msg.message_id for msg in inbox] == [new.message_id]
+        assert (await store.get_inbox_counters(_CANNED_MAILBOX2)).accepted == 1
+        # the sender can still track the uncollected message until it expires
+        assert await store.is_in_outbox(_CANNED_MAILBOX1, uncollected.message_id)
+
+        totals = await store.get_expiry_stats()
+        assert (totals.sweeps, totals.expired_messages, totals.pending) == (1, 1, 2)
+
+
+def test_sqlite_store_adds_inbox_expiry_timestamp_to_an_existing_database(tmp_path: str):
+    db_path = os.path.join(tmp_path, "mesh_sandbox.sqlite")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE messages (message_id TEXT PRIMARY KEY, recipient TEXT NOT NULL, sender TEXT NOT NULL, "
+            "status TEXT NOT NULL, workflow_id TEXT NOT NULL, local_id TEXT, created_timestamp TEXT NOT NULL, "
+            "accepted_timestamp TEXT NOT NULL DEFAULT '', file_size INTEGER NOT NULL DEFAULT 0, "
+            "in_inbox INTEGER NOT NULL DEFAULT 0, in_outbox INTEGER NOT NULL DEFAULT 0, message TEXT NOT NULL)"
+        )
+        conn.execute(
+            "INSERT INTO messages VALUES ('M1', 'A', 'B', 'accepted', 'W', NULL, '2023-01-01T00:00:00.000000', "
+            "'2023-01-01T00:00:00.000000', 0, 1, 0, '{\"inbox_expiry_timestamp\": \"2023-01-06T00:00:00\"}')"
+        )
+        conn.execute(
+            "INSERT INTO messages VALUES ('M2', 'A', 'B', 'accepted', 'W', NULL, '2023-01-01T00:00:00.000000', "
+            "'2023-01-01T00:00:00.000000', 0, 1, 0, '{}')"
+        )
+
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path):
+        store = cast(SqliteStore, get_store())
+
+        with sqlite3.connect(store.config.sqlite_path) as conn:
+            rows = conn.execute(
+                "SELECT message_id, inbox_expiry_timestamp FROM messages ORDER BY message_id"
+            ).fetchall()
+
+        assert rows == [("M1", "2023-01-06T00:00:00.000000"), ("M2", "")]
+
+
+async def _stream(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def test_sqlite_store_streamed_chunks_spill_to_files_when_large(tmp_path: str):
+    with temp_env_vars(STORE_MODE="sqlite", MAILBOXES_DATA_DIR=tmp_path, SQLITE_INLINE_CHUNK_BYTES=100):
+        store = cast(SqliteStore, get_store())
+        message = _create_message()
+        message.total_chunks = 2
+        await store.save_message(message)
+
+        small, large = [os.urandom(50), os.urandom(50)], [os.urandom(60), os.urandom(60), os.urandom(60)]
+        assert await store.save_chunk_stream(message, 1, _stream(*small)) == 100
+        assert await store.save_chunk_stream(message, 2, _stream(*large)) == 180
+
+        assert not os.path.exists(store.chunk_path(message, 1))
+        assert os.path.exists(store.chunk_path(message, 2))
+        assert await store.get_chunk(message, 1) == b"".join(small)
+        assert await store.get_chunk(message, 2) == b"".join(large)
+        assert await store.get_file_size(message) == 280
@@ -0,0 +1,243 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from fastapi import BackgroundTasks
+
+from ..dependencies import get_messaging, get_store
+from ..models.message import Message, MessageEvent, MessageParty, MessageStatus
+from ..store.message_index import OrderedMessageIndex, message_position
+from ..store.workflow_index import WorkflowFilter, WorkflowIndex
+from . import _CANNED_MAILBOX1, _CANNED_MAILBOX2
+from .helpers import temp_env_vars
+
+
+def _create_message(created: datetime, workflow_id: str = "TEST_WORKFLOW") -> Message:
+    return Message(
+        message_id=uuid4().hex.upper(),
+        workflow_id=workflow_id,
+        sender=MessageParty(mailbox_id=_CANNED_MAILBOX1),
+        recipient=MessageParty(mailbox_id=_CANNED_MAILBOX2),
+        created_timestamp=created,
+        events=[MessageEvent(status=MessageStatus.ACCEPTED, timestamp=created)],
+    )
+
+
+def test_ordered_message_index_orders_by_created_timestamp_then_id():
+    now = datetime.utcnow()
+    later, earlier, tied = _create_message(now), _create_message(now - timedelta(seconds=1)), _create_message(now)
+    index = OrderedMessageIndex()
+    for message in (later, earlier, tied):
+        index.add(message)
+    index.add(later)
+
+    expected = [earlier, *sorted([later, tied], key=lambda msg: msg.message_id)]
+    assert list(index.iter_messages()) == expected
+    assert len(index) == 3
+
+    index.discard(tied.message_id)
+    index.discard(tied.message_id)
+    assert tied.message_id not in index
+    assert list(index.iter_messages()) == [msg for msg in expected if msg is not tied]
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+async def test_accepted_inbox_index_follows_status_changes(store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        store = get_store()
+        messaging = get_messaging()
+        start = datetime.utcnow() - timedelta(minutes=10)
+
+        messages = [
+            _create_message(start + timedelta(seconds=offset), workflow_id=f"WF_{offset % 2}")
+            for offset in (5, 1, 4, 2, 3)
+        ]
+        for message in messages:
+            await store.save_message(message)
+            await store.add_to_inbox(message)
+
+        in_order = sorted(messages, key=lambda msg: msg.created_timestamp)
+        accepted = await store.get_accepted_inbox_messages(_CANNED_MAILBOX2)
+        assert [msg.message_id for msg in accepted] == [msg.message_id for msg in in_order]
+
+        await messaging.acknowledge_message(message=in_order[0], background_tasks=BackgroundTasks())
+        await messaging.add_message_event(
+            message=in_order[2], event=MessageEvent(status=MessageStatus.ERROR), background_tasks=BackgroundTasks()
+        )
+
+        accepted = await store.get_accepted_inbox_messages(_CANNED_MAILBOX2, limit=2)
+        assert [msg.message_id for msg in accepted] == [in_order[1].message_id, in_order[3].message_id]
+
+        accepted = await store.get_accepted_inbox_messages(
+            _CANNED_MAILBOX2, predicate=lambda msg: msg.workflow_id == "WF_1", limit=5
+        )
+        assert [msg.message_id for msg in accepted] == [in_order[4].message_id]
+
+        assert await store.get_accepted_inbox_messages(_CANNED_MAILBOX2, limit=0) == []
+
+        await store.reset_mailbox(_CANNED_MAILBOX2)
+        assert await store.get_accepted_inbox_messages(_CANNED_MAILBOX2) == []
+
+
+def test_ordered_message_index_iterates_from_cursor_position():
+    start = datetime.utcnow()
+    messages = [_create_message(start + timedelta(seconds=offset)) for offset in range(5)]
+    index = OrderedMessageIndex()
+    for message in reversed(messages):
+        index.add(message)
+
+    cursor = message_position(messages[2])
+    assert list(index.iter_messages(after=cursor)) == messages[3:]
+    assert list(index.iter_messages(after=cursor, newest_first=True)) == [messages[1], messages[0]]
+    assert list(index.iter_messages(newest_first=True)) == list(reversed(messages))
+
+    # the cursor message does not need to still be in the index
+    index.discard(messages[2].message_id)
+    assert list(index.iter_messages(after=cursor)) == messages[3:]
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+async def test_store_ranges_resume_after_cursor(store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        store = get_store()
+        start = datetime.utcnow() - timedelta(minutes=10)
+        messages = [_create_message(start + timedelta(seconds=offset)) for offset in range(6)]
+        for message in messages:
+            await store.save_message(message)
+            await store.add_to_inbox(message)
+            await store.add_to_outbox(message)
+
+        ids = [message.message_id for message in messages]
+        cursor = message_position(messages[2])
+
+        page = await store.get_accepted_inbox_messages(_CANNED_MAILBOX2, limit=2, after=cursor)
+        assert [msg.message_id for msg in page] == ids[3:5]
+
+        page = await store.get_inbox_range(_CANNED_MAILBOX2, limit=2, after=cursor, newest_first=True)
+        assert [msg.message_id for msg in page] == [ids[1], ids[0]]
+
+        page = await store.get_inbox_range(_CANNED_MAILBOX2, after=cursor)
+        assert [msg.message_id for msg in page] == ids[3:]
+
+        page = await store.get_outbox_range(_CANNED_MAILBOX1, limit=3)
+        assert [msg.message_id for msg in page] == [ids[5], ids[4], ids[3]]
+
+        page = await store.get_outbox_range(_CANNED_MAILBOX1, after=message_position(page[-1]))
+        assert [msg.message_id for msg in page] == [ids[2], ids[1], ids[0]]
+
+
+def test_ordered_message_index_since_bound():
+    start = datetime.utcnow()
+    messages = [_create_message(start + timedelta(seconds=offset)) for offset in range(5)]
+    index = OrderedMessageIndex()
+    for message in messages:
+        index.add(message)
+
+    since = messages[1].created_timestamp
+    assert list(index.iter_messages(since=since)) == messages[2:]
+    assert list(index.iter_messages(since=since, newest_first=True)) == list(reversed(messages[2:]))
+    cursor = message_position(messages[3])
+    assert list(index.iter_messages(since=since, after=cursor, newest_first=True)) == [messages[2]]
+    assert list(index.iter_messages(since=since, after=message_position(messages[0]))) == messages[2:]
+    assert not list(index.iter_messages(since=messages[-1].created_timestamp))
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+async def test_store_ranges_since(store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        store = get_store()
+        start = datetime.utcnow() - timedelta(minutes=10)
+        messages = [_create_message(start + timedelta(seconds=offset)) for offset in range(6)]
+        for message in messages:
+            await store.save_message(message)
+            await store.add_to_inbox(message)
+            await store.add_to_outbox(message)
+
+        ids = [message.message_id for message in messages]
+        since = messages[2].created_timestamp
+
+        page = await store.get_inbox_range(_CANNED_MAILBOX2, newest_first=True, since=since)
+        assert [msg.message_id for msg in page] == list(reversed(ids[3:]))
+
+        page = await store.get_inbox_range(_CANNED_MAILBOX2, since=since.replace(tzinfo=timezone.utc), limit=2)
+        assert [msg.message_id for msg in page] == ids[3:5]
+
+        page = await store.get_outbox_range(_CANNED_MAILBOX1, since=since, after=message_position(messages[4]))
+        assert [msg.message_id for msg in page] == [ids[3]]
+
+
+@pytest.mark.parametrize(
+    ("workflow_filter", "expected"),
+    [
+        ("", None),
+        ("WF", WorkflowFilter("exact", "WF")),
+        ("!WF", WorkflowFilter("exact", "WF", negate=True)),
+        ("WF_*", WorkflowFilter("begins_with", "WF_")),
+        ("!WF_*", WorkflowFilter("begins_with", "WF_", negate=True)),
+        ("*_ACK*", WorkflowFilter("contains", "_ACK")),
+        ("!*_ACK*", WorkflowFilter("contains", "_ACK", negate=True)),
+    ],
+)
+def test_workflow_filter_parse(workflow_filter: str, expected: WorkflowFilter):
+    assert WorkflowFilter.parse(workflow_filter) == expected
+
+
+def test_workflow_index_merges_prefix_matches_in_position_order():
+    start = datetime.utcnow()
+    workflow_ids = ["WF_B", "WF_A", "OTHER", "WF_A", "WF", "WF_B"]
+    messages = [
+        _create_message(start + timedelta(seconds=offset), workflow_id=workflow_id)
+        for offset, workflow_id in enumerate(workflow_ids)
+    ]
+    index = WorkflowIndex()
+    for message in reversed(messages):
+        index.add(message)
+
+    prefix = WorkflowFilter("begins_with", "WF_")
+    assert list(index.iter_messages(prefix)) == [messages[0], messages[1], messages[3], messages[5]]
+    assert list(index.iter_messages(prefix, after=message_position(messages[1]))) == [messages[3], messages[5]]
+    assert list(index.iter_messages(WorkflowFilter("exact", "WF"))) == [messages[4]]
+    assert not list(index.iter_messages(WorkflowFilter("exact", "MISSING")))
+
+    index.discard(messages[4])
+    assert not list(index.iter_messages(WorkflowFilter("exact", "WF")))
+    assert list(index.iter_messages(WorkflowFilter("begins_with", "WF"))) == [
+        messages[0],
+        messages[1],
+        messages[3],
+        messages[5],
+    ]
+
+
+@pytest.mark.parametrize("store_mode", ["memory", "file", "sqlite"])
+async def test_accepted_inbox_workflow_filter(store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        store = get_store()
+        messaging = get_messaging()
+        start = datetime.utcnow() - timedelta(minutes=10)
+        workflow_ids = ["WF_A", "OTHER_ACK", "WF_B", "WF_A_ACK", "WF", "WF_B"]
+        messages = [
+            _create_message(start + timedelta(seconds=offset), workflow_id=workflow_id)
+            for offset, workflow_id in enumerate(workflow_ids)
+        ]
+        for message in messages:
+            await store.save_message(message)
+            await store.add_to_inbox(message)
+        await messaging.acknowledge_message(message=messages[2], background_tasks=BackgroundTasks())
+
+        async def _workflow_ids(workflow_filter: str, **kwargs) -> list[str]:
+            page = await store.get_accepted_inbox_messages(
+                _CANNED_MAILBOX2, workflow_filter=WorkflowFilter.parse(workflow_filter), **kwargs
+            )
+            return [msg.workflow_id for msg in page]
+
+        assert await _workflow_ids("WF_A") == ["WF_A"]
+        assert await _workflow_ids("WF_*") == ["WF_A", "WF_A_ACK", "WF_B"]
+        assert await _workflow_ids("WF_*", limit=2, after=message_position(messages[0])) == ["WF_A_ACK", "WF_B"]
+        assert await _workflow_ids("*_ACK*") == ["OTHER_ACK", "WF_A_ACK"]
+        assert await _workflow_ids("!WF*") == ["OTHER_ACK"]
+        assert await _workflow_ids("WF*", predicate=lambda msg: msg.workflow_id != "WF") == [
+            "WF_A",
+            "WF_A_ACK",
+            "WF_B",
+        ]
@@ -0,0 +1,92 @@
+from uuid import uuid4
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from . import _CANNED_MAILBOX1, _CANNED_MAILBOX2
+from .helpers import temp_env_vars
+from .mesh_api_helpers import (
+    mesh_api_get_inbox_size,
+    mesh_api_send_message_and_return_message_id,
+    mesh_api_track_message_by_local_id,
+    mesh_api_track_message_by_message_id,
+)
+
+_STORE_MODES = ["memory", "file", "sqlite"]
+
+
+@pytest.mark.parametrize("store_mode", _STORE_MODES)
+def test_track_own_message(app: TestClient, store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        local_id = uuid4().hex
+        message_id = mesh_api_send_message_and_return_message_id(
+            app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, extra_headers={"mex-localid": local_id}
+        )
+
+        res = mesh_api_track_message_by_message_id(app, _CANNED_MAILBOX1, message_id)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["messageId"] == message_id
+
+        res = mesh_api_track_message_by_local_id(app, _CANNED_MAILBOX1, local_id)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["messageId"] == message_id
+
+
+@pytest.mark.parametrize("store_mode", _STORE_MODES)
+def test_track_unknown_message_returns_404(app: TestClient, store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        res = mesh_api_track_message_by_message_id(app, _CANNED_MAILBOX1, uuid4().hex.upper())
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+        res = mesh_api_track_message_by_local_id(app, _CANNED_MAILBOX1, uuid4().hex)
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize("store_mode", _STORE_MODES)
+def test_track_message_sent_by_another_mailbox_returns_404(app: TestClient, store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        local_id = uuid4().hex
+        message_id = mesh_api_send_message_and_return_message_id(
+            app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, extra_headers={"mex-localid": local_id}
+        )
+
+        # the recipient can see the message, but it is not in their outbox
+        res = mesh_api_track_message_by_message_id(app, _CANNED_MAILBOX2, message_id)
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+        res = mesh_api_track_message_by_local_id(app, _CANNED_MAILBOX2, local_id)
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize("store_mode", _STORE_MODES)
+def test_track_message_after_sender_outbox_reset_returns_404(app: TestClient, store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        local_id = uuid4().hex
+        message_id = mesh_api_send_message_and_return_message_id(
+            app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, extra_headers={"mex-localid": local_id}
+        )
+
+        res = app.delete(f"/messageexchange/admin/reset/{_CANNED_MAILBOX1}")
+        assert res.status_code == status.HTTP_200_OK
+
+        # the message is still in the recipient's inbox, and still names the sender, but has left the sender's outbox
+        assert mesh_api_get_inbox_size(app, _CANNED_MAILBOX2) == 1
+        res = mesh_api_track_message_by_message_id(app, _CANNED_MAILBOX1, message_id)
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+        res = mesh_api_track_message_by_local_id(app, _CANNED_MAILBOX1, local_id)
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize("store_mode", _STORE_MODES)
+def test_track_duplicate_local_id_returns_300(app: TestClient, store_mode: str, tmp_path: str):
+    with temp_env_vars(STORE_MODE=store_mode, MAILBOXES_DATA_DIR=tmp_path):
+        local_id = uuid4().hex
+        for _ in range(2):
+            mesh_api_send_message_and_return_message_id(
+                app, _CANNED_MAILBOX1, _CANNED_MAILBOX2, extra_headers={"mex-localid": local_id}
+            )
+
+        res = mesh_api_track_message_by_local_id(app, _CANNED_MAILBOX1, local_id)
+        assert res.status_code == status.HTTP_300_MULTIPLE_CHOICES
@@ -0,0 +1,64 @@
+import gzip
+import os
+
+import pytest
+
+from ..common.transcoding import TRANSCODE_PIECE_BYTES, GzipCache, iter_chunk_pieces, transcode_gzip
+
+
+async def _transcode(chunk, compress: bool) -> bytes:
+    return b"".join([piece async for piece in transcode_gzip(iter_chunk_pieces(chunk), compress=compress)])
+
+
+async def test_transcode_gzip_round_trips_bytes_and_files(tmp_path: str):
+    data = os.urandom(TRANSCODE_PIECE_BYTES * 2 + 123)
+
+    compressed = await _transcode(data, compress=True)
+    assert gzip.decompress(compressed) == data
+
+    path = os.path.join(tmp_path, "1")
+    with open(path, "wb") as f:
+        f.write(compressed)
+    assert await _transcode(path, compress=False) == data
+
+
+async def test_transcode_gzip_decompresses_concatenated_members():
+    compressed = gzip.compress(b"first ") + gzip.compress(b"second")
+    assert await _transcode(compressed, compress=False) == b"first second"
+
+
+async def test_transcode_gzip_rejects_truncated_input():
+    with pytest.raises(EOFError):
+        await _transcode(gzip.compress(os.urandom(1000))[:-20], compress=False)
+
+
+async def test_gzip_cache_evicts_least_recently_used():
+    cache = GzipCache(max_bytes=10)
+    cache.put(("A", 1), b"1234")
+    cache.put(("B", 1), b"1234")
+    assert cache.get(("A", 1)) == b"1234"
+
+    cache.put(("C", 1), b"1234")
+    assert cache.get(("B", 1)) is None
+    assert (len(cache), cache.size, cache.hits, cache.misses) == (2, 8, 1, 1)
+
+    cache.put(("D", 1), b"too large to cache")
+    assert cache.get(("D", 1)) is None
+
+
+async def test_gzip_cache_fill_only_caches_complete_chunks_that_fit():
+    async def _pieces(*pieces: bytes):
+        for piece in pieces:
+            yield piece
+
+    cache = GzipCache(max_bytes=10)
+    assert [piece async for piece in cache.fill(("A", 1), _pieces(b"12", b"34"))] == [b"12", b"34"]
+    assert [piece async for piece in cache.fill(("B", 1), _pieces(b"123456", b"789012"))] == [b"123456", b"789012"]
+
+    assert cache.get(("A", 1)) == b"1234"
+    assert cache.get(("B", 1)) is None
+
+    disabled = GzipCache(max_bytes=0)
+    assert [piece async for piece in disabled.fill(("A", 1), _pieces(b"12"))] == [b"12"]
+    assert disabled.get(("A", 1)) is None
+    assert disabled.misses == 0
@@ -5,13 +5,17 @@ from typing import Final, Optional
 
 from pydantic import BaseModel, Field  # pylint: disable=no-name-in-module
 
-from mesh_sandbox.models.mailbox import Mailbox
+from mesh_sandbox.common.auth_cache import AuthCache
+from mesh_sandbox.common.plugin_engine import PluginQueueStats, PluginStats
+from mesh_sandbox.models.mailbox import InboxCounters, Mailbox
 from mesh_sandbox.models.message import (
     Message,
     MessageDeliveryStatus,
     MessageStatus,
     MessageType,
 )
+from mesh_sandbox.store.expiry import ExpiryStats
+from mesh_sandbox.store.metered_store import OperationStats, StoreInstrumentation
 
 _EMPTY: Final[str] = ""
 
@@ -58,6 +62,151 @@ class MailboxDetails(BaseModel):
         )
 
 
+class InboxCountersDetails(BaseModel):
+    accepted: int = Field(description="accepted messages in the inbox")
+    acknowledged: int = Field(description="acknowledged messages in the inbox")
+    uploading: int = Field(description="messages to this mailbox still being uploaded")
+    bytes: int = Field(description="total file size of the messages in the inbox")
+    scanned: Optional[InboxCountersDetails] = Field(
+        default=None, description="counts from a full scan of the inbox, if verify was requested"
+    )
+    consistent: Optional[bool] = Field(default=None, description="counters match the full scan")
+
+    @classmethod
+    def from_counters(cls, counters: InboxCounters, scanned: Optional[InboxCounters] = None) -> InboxCountersDetails:
+        return cls(
+            accepted=counters.accepted,
+            acknowledged=counters.acknowledged,
+            uploading=counters.uploading,
+            bytes=counters.bytes,
+            scanned=cls.from_counters(scanned) if scanned else None,
+            consistent=(scanned == counters) if scanned else None,
+        )
+
+
+class ExpiryDetails(BaseModel):
+    expired_messages: int = Field(description="messages removed after their message expiry")
+    expired_inbox_messages: int = Field(description="uncollected messages removed from the inbox after inbox expiry")
+    reclaimed_bytes: int = Field(description="message payload bytes released")
+    sweeps: int = Field(description="expiry sweeps run")
+    pending: int = Field(description="expiry entries waiting to fall due")
+    last_sweep: Optional[datetime] = Field(default=None, description="when the last sweep ran")
+
+    @classmethod
+    def from_stats(cls, stats: ExpiryStats) -> ExpiryDetails:
+        return cls(
+            expired_messages=stats.expired_messages,
+            expired_inbox_messages=stats.expired_inbox_messages,
+            reclaimed_bytes=stats.reclaimed_bytes,
+            sweeps=stats.sweeps,
+            pending=stats.pending,
+            last_sweep=stats.last_sweep,
+        )
+
+
+class PluginTimings(BaseModel):
+    calls: int = Field(description="on_event calls, including those that failed or timed out")
+    failures: int = Field(description="calls that raised or timed out")
+    timeouts: int = Field(description="calls cancelled after the plugin timeout")
+    mean_ms: float = Field(description="mean on_event duration in milliseconds")
+    max_ms: float = Field(description="longest on_event duration in milliseconds")
+
+    @classmethod
+    def from_stats(cls, stats: PluginStats) -> PluginTimings:
+        return cls(
+            calls=stats.calls,
+            failures=stats.failures,
+            timeouts=stats.timeouts,
+            mean_ms=round(1000 * stats.total_seconds / stats.calls, 3) if stats.calls else 0.0,
+            max_ms=round(1000 * stats.max_seconds, 3),
+        )
+
+
+class PluginDetails(BaseModel):
+    queued: int = Field(description="after / error events queued for the plugin workers")
+    dropped: int = Field(description="events dropped as the plugin queue was full")
+    pending: int = Field(description="events waiting in the plugin queue")
+    drop_policy: str = Field(description="what happens when the queue is full, drop_newest, drop_oldest or block")
+    plugins: dict[str, PluginTimings] = Field(description="timings by plugin class name")
+
+    @classmethod
+    def from_stats(cls, queue: PluginQueueStats, drop_policy: str, plugins: dict[str, PluginStats]) -> PluginDetails:
+        return cls(
+            queued=queue.queued,
+            dropped=queue.dropped,
+            pending=queue.pending,
+            drop_policy=drop_policy,
+            plugins={name: PluginTimings.from_stats(stats) for name, stats in plugins.items()},
+        )
+
+
+class AuthCacheDetails(BaseModel):
+    hits: int = Field(description="authorization headers accepted without recomputing the hmac")
+    misses: int = Field(description="authorization headers validated in full")
+    size: int = Field(description="validated authorization headers held")
+    reject_replays: bool = Field(description="whether a nonce and nonce count can only be used once")
+    replays: int = Field(description="authorization headers rejected as a nonce and nonce count was reused")
+    stale: int = Field(description="authorization headers rejected as their timestamp was outside the replay window")
+    nonces: int = Field(description="nonces held to detect replays")
+    max_nonces: int = Field(description="nonces that can be held before requests are refused")
+    nonces_full: int = Field(description="authorization headers refused as the nonce index was full")
+
+    @classmethod
+    def from_cache(cls, cache: AuthCache) -> AuthCacheDetails:
+        return cls(
+            hits=cache.hits,
+            misses=cache.misses,
+            size=cache.size,
+            reject_replays=cache.reject_replays,
+            replays=cache.replays,
+            stale=cache.stale,
+            nonces=cache.nonces,
+            max_nonces=cache.max_nonces,
+            nonces_full=cache.nonces_full,
+        )
+
+
+class StoreOperationTimings(BaseModel):
+    calls: int = Field(description="calls, including those that raised")
+    errors: int = Field(description="calls that raised")
+    mean_ms: float = Field(description="mean duration in milliseconds")
+    p50_ms: float = Field(description="median duration of the recent calls in milliseconds")
+    p95_ms: float = Field(description="95th percentile duration of the recent calls in milliseconds")
+    p99_ms: float = Field(description="99th percentile duration of the recent calls in milliseconds")
+    max_ms: float = Field(description="longest duration in milliseconds")
+    payload_bytes: int = Field(description="message chunk bytes saved / read")
+
+    @classmethod
+    def from_stats(cls, stats: OperationStats) -> StoreOperationTimings:
+        return cls(
+            calls=stats.calls,
+            errors=stats.errors,
+            mean_ms=round(1000 * stats.total_seconds / stats.calls, 3) if stats.calls else 0.0,
+            p50_ms=round(1000 * stats.percentile(50), 3),
+            p95_ms=round(1000 * stats.percentile(95), 3),
+            p99_ms=round(1000 * stats.percentile(99), 3),
+            max_ms=round(1000 * stats.max_seconds, 3),
+            payload_bytes=stats.payload_bytes,
+        )
+
+
+class StoreStatsDetails(BaseModel):
+    enabled: bool = Field(description="whether store instrumentation is on, see STORE_INSTRUMENTATION")
+    operations: dict[str, StoreOperationTimings] = Field(description="timings by store method name")
+
+    @classmethod
+    def from_stats(cls, instrumentation: Optional[StoreInstrumentation]) -> StoreStatsDetails:
+        if instrumentation is None:
+            return cls(enabled=False, operations={})
+        return cls(
+            enabled=True,
+            operations={
+                name: StoreOperationTimings.from_stats(stats)
+                for name, stats in sorted(instrumentation.operations.items())
+            },
+        )
+
+
 class MessageDetails(BaseModel):
     checksum: Optional[str] = Field(description="message status e.g. 'accepted' 'acknowledged'")
     chunk_count: Optional[int] = Field(description="number of message chunks")
@@ -68,6 +217,8 @@ class MessageDetails(BaseModel):
     failure_diagnostic: Optional[str] = None
     filename: Optional[str] = Field(description="local filename as supplied by the sender")
     file_size: Optional[int] = Field(description="the uploaded file size")
+    chunks_received: Optional[int] = Field(description="number of chunks received so far")
+    bytes_received: Optional[int] = Field(description="number of bytes received so far")
 
     is_compressed: Optional[bool] = False
     is_encrypted: Optional[bool] = False
@@ -132,6 +283,8 @@ class MessageDetails(BaseModel):
             failure_diagnostic=failure_description,
             filename=message.metadata.file_name or f"{message.message_id}.dat",
             file_size=message.file_size,
+            chunks_received=message.chunks_received,
+            bytes_received=message.bytes_received,
             is_compressed=message.metadata.compressed,
             is_encrypted=message.metadata.encrypted,
             linked_msg_id=message.error_event.linked_message_id if message.error_event else None,
@@ -21,7 +21,7 @@ class TrackingV1(BaseModel):
     failureDate: Optional[str] = None
     failureDiagnostic: Optional[str] = None
     fileName: Optional[str] = Field(description="local filename as supplied by the sender")
-    fileSize: int = Field(description="the uploaded file size")
+    fileSize: int = Field(description="the uploaded file size, or the bytes received so far while uploading")
 
     isCompressed: Optional[str] = _EMPTY
     linkedMsgId: Optional[str] = Field(description="related message id")
@@ -132,7 +132,7 @@ def create_tracking_response(message: Message, model_version: int = 1) -> Union[
             failureDate=failure_date,
             failureDiagnostic=failure_description,
             fileName=message.metadata.file_name or f"{message.message_id}.dat",
-            fileSize=message.file_size,
+            fileSize=message.bytes_received if message.status == MessageStatus.UPLOADING else message.file_size,
             isCompressed="Y" if message.metadata.compressed else _EMPTY,
             linkedMsgId=error_event.linked_message_id if error_event else None,
             localId=message.metadata.local_id,